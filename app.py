@@ -1,11 +1,48 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, stream_with_context, make_response, g, has_request_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session as FlaskSession
 from flask_cors import CORS
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import Session
+from werkzeug.security import generate_password_hash, check_password_hash, gen_salt
 import jwt
+import base64
+import bisect
+import csv
 import datetime
+import gzip
+import hashlib
+import hmac
+import io
+import itertools
+import json
+import math
 import os
+import pickle
+import random
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
+from operator import itemgetter
+
+try:
+    import orjson
+except ImportError:
+    # orjson es opcional; sin él se usa el codificador json estándar
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    # brotli es opcional; sin él las respuestas se comprimen solo con gzip
+    brotli = None
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key')
@@ -22,8 +59,173 @@ else:
 
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
-db = SQLAlchemy(app)
-CORS(app)
+# Tamaño de página para los listados paginados por cursor
+app.config['PAGE_SIZE'] = int(os.environ.get('PAGE_SIZE', 100))
+app.config['MAX_PAGE_SIZE'] = int(os.environ.get('MAX_PAGE_SIZE', 500))
+# Cachés: 'memory' (una por proceso worker) o 'sqlite' (un archivo compartido por
+# todos los workers del mismo servidor, que también reparte las invalidaciones)
+app.config['CACHE_BACKEND'] = os.environ.get('CACHE_BACKEND', 'memory')
+app.config['CACHE_PATH'] = os.environ.get('CACHE_PATH', os.path.join(app.instance_path, 'cache.sqlite3'))
+# Respuestas de listados, dashboard y analítica guardadas por versión de los datos
+app.config['RESPONSE_CACHE_SIZE'] = int(os.environ.get('RESPONSE_CACHE_SIZE', 4096))
+app.config['RESPONSE_CACHE_TTL'] = float(os.environ.get('RESPONSE_CACHE_TTL', 300))
+app.config['RESPONSE_CACHE_MAX_BYTES'] = int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', 1024 * 1024))
+# Límite del total de bytes de respuestas guardadas en cada worker
+app.config['RESPONSE_CACHE_MAX_TOTAL_BYTES'] = int(os.environ.get('RESPONSE_CACHE_MAX_TOTAL_BYTES', 64 * 1024 * 1024))
+# Compresión de respuestas (br si brotli está instalado, si no gzip) a partir de
+# este tamaño en bytes, y nivel de cada algoritmo
+app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+app.config['COMPRESS_GZIP_LEVEL'] = int(os.environ.get('COMPRESS_GZIP_LEVEL', 6))
+app.config['COMPRESS_BROTLI_QUALITY'] = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 5))
+# Usuarios autenticados recientes que token_required no vuelve a consultar
+app.config['AUTH_CACHE_SIZE'] = int(os.environ.get('AUTH_CACHE_SIZE', 4096))
+app.config['AUTH_CACHE_TTL'] = float(os.environ.get('AUTH_CACHE_TTL', 30))
+# Filas por transacción en las importaciones masivas
+app.config['IMPORT_BATCH_SIZE'] = int(os.environ.get('IMPORT_BATCH_SIZE', 1000))
+app.config['IMPORT_MAX_ERRORS'] = int(os.environ.get('IMPORT_MAX_ERRORS', 1000))
+# Filas leídas del cursor del servidor por cada bloque de exportación
+app.config['EXPORT_CHUNK_SIZE'] = int(os.environ.get('EXPORT_CHUNK_SIZE', 1000))
+# Máximo de operaciones aceptadas por /api/batch
+app.config['BATCH_MAX_OPERATIONS'] = int(os.environ.get('BATCH_MAX_OPERATIONS', 1000))
+# Clientes por solicitud a /api/customers/delete (más que eso, como trabajo en
+# segundo plano) y por cada grupo de sentencias DELETE
+app.config['CUSTOMER_DELETE_MAX_IDS'] = int(os.environ.get('CUSTOMER_DELETE_MAX_IDS', 1000))
+app.config['CUSTOMER_DELETE_CHUNK_SIZE'] = int(os.environ.get('CUSTOMER_DELETE_CHUNK_SIZE', 500))
+# Registros por entidad en cada respuesta de /api/sync y margen para
+# transacciones que todavía no confirmaron cambios con marca de tiempo anterior
+app.config['SYNC_PAGE_SIZE'] = int(os.environ.get('SYNC_PAGE_SIZE', 500))
+app.config['SYNC_LAG_SECONDS'] = float(os.environ.get('SYNC_LAG_SECONDS', 2))
+# Selector de clientes: sugerencias por defecto y máximas de /api/customers/lookup,
+# y por cuántos segundos y usuarios se guardan en memoria si no hubo cambios
+app.config['CUSTOMER_LOOKUP_LIMIT'] = int(os.environ.get('CUSTOMER_LOOKUP_LIMIT', 10))
+app.config['CUSTOMER_LOOKUP_MAX'] = int(os.environ.get('CUSTOMER_LOOKUP_MAX', 50))
+app.config['CUSTOMER_LOOKUP_CACHE_TTL'] = float(os.environ.get('CUSTOMER_LOOKUP_CACHE_TTL', 60))
+app.config['CUSTOMER_LOOKUP_CACHE_SIZE'] = int(os.environ.get('CUSTOMER_LOOKUP_CACHE_SIZE', 1024))
+# Trabajos en segundo plano (worker.py): broker de la cola, intentos y espera base
+# entre reintentos (se duplica en cada uno), segundos tras los cuales se reasigna un
+# trabajo cuyo worker no terminó, trabajos pendientes por usuario y tamaño máximo
+# de los archivos subidos para importar
+app.config['JOB_BROKER'] = os.environ.get('JOB_BROKER', 'database')
+app.config['JOB_MAX_ATTEMPTS'] = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+app.config['JOB_RETRY_DELAY'] = float(os.environ.get('JOB_RETRY_DELAY', 30))
+app.config['JOB_LEASE_SECONDS'] = float(os.environ.get('JOB_LEASE_SECONDS', 900))
+app.config['JOB_MAX_ACTIVE_PER_USER'] = int(os.environ.get('JOB_MAX_ACTIVE_PER_USER', 5))
+app.config['JOB_MAX_INPUT_BYTES'] = int(os.environ.get('JOB_MAX_INPUT_BYTES', 100 * 1024 * 1024))
+# Hilos por proceso worker y segundos entre consultas a la cola cuando está vacía
+app.config['JOB_WORKER_CONCURRENCY'] = int(os.environ.get('JOB_WORKER_CONCURRENCY', 2))
+app.config['JOB_POLL_INTERVAL'] = float(os.environ.get('JOB_POLL_INTERVAL', 1))
+# Perfilado por request: cabeceras Server-Timing y métricas Prometheus en /metrics
+app.config['PROFILING'] = os.environ.get('PROFILING', '').lower() in ('1', 'true', 'yes')
+# Las consultas SQL que superen este umbral (ms) se registran en el log; 0 lo desactiva
+app.config['SLOW_QUERY_MS'] = float(os.environ.get('SLOW_QUERY_MS', 500))
+# Algoritmo y costo de los hashes de contraseñas ('scrypt' o 'pbkdf2'); los
+# hashes antiguos se vuelven a generar con estos valores al iniciar sesión
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+app.config['PASSWORD_SCRYPT_N'] = int(os.environ.get('PASSWORD_SCRYPT_N', 2 ** 15))
+app.config['PASSWORD_PBKDF2_ITERATIONS'] = int(os.environ.get('PASSWORD_PBKDF2_ITERATIONS', 600000))
+# Hilos que calculan hashes y cuántas solicitudes pueden esperar antes de responder 503
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 2))
+app.config['PASSWORD_HASH_QUEUE'] = int(os.environ.get('PASSWORD_HASH_QUEUE', 16))
+# Modo ASGI (asgi.py): URL del motor asíncrono, por defecto la misma base de datos
+# con asyncpg o aiosqlite
+app.config['ASYNC_DATABASE_URI'] = os.environ.get('ASYNC_DATABASE_URL')
+
+# Pool de conexiones (por proceso) y tiempo máximo por sentencia en PostgreSQL
+app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 10))
+app.config['DB_MAX_OVERFLOW'] = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+app.config['DB_POOL_TIMEOUT'] = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+app.config['DB_POOL_RECYCLE'] = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+app.config['DB_POOL_PRE_PING'] = os.environ.get('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+app.config['DB_STATEMENT_TIMEOUT_MS'] = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 30000))
+# PRAGMAs de SQLite: WAL permite leer mientras otro worker escribe
+app.config['SQLITE_JOURNAL_MODE'] = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL').upper()
+app.config['SQLITE_SYNCHRONOUS'] = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL').upper()
+app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+app.config['SQLITE_MMAP_SIZE'] = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+# Réplicas de lectura (URLs separadas por comas) para los GET de listados, exportación,
+# dashboard y analítica, y segundos que un usuario sigue leyendo del primario tras escribir.
+# Requiere CACHE_BACKEND=sqlite para que todos los workers lo sepan
+app.config['DATABASE_REPLICA_URLS'] = [
+    url.strip().replace('postgres://', 'postgresql://', 1)
+    for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()
+]
+app.config['REPLICA_STICKY_SECONDS'] = float(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+
+# Engine Configuration
+SQLITE_JOURNAL_MODES = ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF')
+SQLITE_SYNCHRONOUS_LEVELS = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+def engine_options(url):
+    """Engine keyword arguments for url built from the DB_* settings; also used by asgi.py."""
+    url = make_url(url)
+    options = {'pool_pre_ping': app.config['DB_POOL_PRE_PING']}
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        # In-memory databases live in a single shared connection
+        return options
+    
+    options.update(
+        pool_size=app.config['DB_POOL_SIZE'],
+        max_overflow=app.config['DB_MAX_OVERFLOW'],
+        pool_timeout=app.config['DB_POOL_TIMEOUT'],
+        pool_recycle=app.config['DB_POOL_RECYCLE'],
+    )
+    
+    timeout = app.config['DB_STATEMENT_TIMEOUT_MS']
+    if url.get_backend_name() == 'postgresql' and timeout:
+        if url.get_driver_name() == 'asyncpg':
+            options['connect_args'] = {'server_settings': {'statement_timeout': str(timeout)}}
+        else:
+            options['connect_args'] = {'options': f'-c statement_timeout={timeout}'}
+    return options
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    # First, so switching the journal mode waits for other processes' locks
+    cursor.execute(f"PRAGMA busy_timeout={int(app.config['SQLITE_BUSY_TIMEOUT_MS'])}")
+    cursor.execute(f"PRAGMA journal_mode={app.config['SQLITE_JOURNAL_MODE']}")
+    cursor.execute(f"PRAGMA synchronous={app.config['SQLITE_SYNCHRONOUS']}")
+    cursor.execute(f"PRAGMA mmap_size={int(app.config['SQLITE_MMAP_SIZE'])}")
+    cursor.close()
+
+def configure_engine(engine):
+    """Apply per-connection settings to a newly created engine."""
+    if engine.dialect.name == 'sqlite':
+        if app.config['SQLITE_JOURNAL_MODE'] not in SQLITE_JOURNAL_MODES:
+            raise RuntimeError(f"Invalid SQLITE_JOURNAL_MODE {app.config['SQLITE_JOURNAL_MODE']}")
+        if app.config['SQLITE_SYNCHRONOUS'] not in SQLITE_SYNCHRONOUS_LEVELS:
+            raise RuntimeError(f"Invalid SQLITE_SYNCHRONOUS {app.config['SQLITE_SYNCHRONOUS']}")
+        event.listen(engine, 'connect', set_sqlite_pragmas)
+
+class RoutingSession(FlaskSession):
+    """Sends SELECTs to the read replica chosen for the request, if any.
+    
+    Flushes, DML and raw SQL keep going to the primary.
+    """
+    
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and getattr(clause, 'is_select', False):
+            replica = current_replica()
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+REPLICA_BINDS = [f'replica{index}' for index in range(len(app.config['DATABASE_REPLICA_URLS']))]
+if REPLICA_BINDS and app.config['CACHE_BACKEND'] != 'sqlite':
+    # Reads stick to the primary after a write only if every worker sees the marker
+    raise RuntimeError('DATABASE_REPLICA_URLS requires CACHE_BACKEND=sqlite')
+app.config['SQLALCHEMY_BINDS'] = {
+    key: {'url': url, **engine_options(url)} for key, url in zip(REPLICA_BINDS, app.config['DATABASE_REPLICA_URLS'])
+}
+
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
+
+with app.app_context():
+    configure_engine(db.engine)
+    for key in REPLICA_BINDS:
+        configure_engine(db.engines[key])
+
+CORS(app, expose_headers=['X-Next-Cursor', 'ETag'])
 # Database Models
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -37,19 +239,42 @@ class User(db.Model):
     deals = db.relationship('Deal', backref='user', lazy=True)
     tasks = db.relationship('Task', backref='user', lazy=True)
 
+def customer_name_key(name):
+    """Case-insensitive form of a customer name, as stored in Customer.name_key.
+    
+    Folded in Python rather than with SQL lower(), which on SQLite only
+    folds ASCII letters, so lookups match accented names in any case.
+    """
+    return name.casefold()
+
+def default_name_key(context):
+    return customer_name_key(context.get_current_parameters()['name'])
+
 class Customer(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
+    # Filled from name on insert, bulk inserts included; updates set it with the name.
+    # Compared in code point order, which prefix range scans rely on; Postgres
+    # collations such as en_US skip spaces and punctuation at first
+    name_key = db.Column(db.Text().with_variant(db.Text(collation='C'), 'postgresql'), default=default_name_key)
     company = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(100), nullable=False)
     phone = db.Column(db.String(20))
     status = db.Column(db.String(20), default='new')
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     
     contacts = db.relationship('Contact', backref='customer', lazy=True)
     deals = db.relationship('Deal', backref='customer', lazy=True)
+    
+    __table_args__ = (
+        db.Index('ix_customer_user_created', 'user_id', 'created_at', 'id'),
+        db.Index('ix_customer_user_updated', 'user_id', 'updated_at', 'id'),
+        db.Index('ix_customer_user_status', 'user_id', 'status'),
+        db.Index('ix_customer_user_name_key', 'user_id', 'name_key'),
+    )
 
 class Contact(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -59,8 +284,15 @@ class Contact(db.Model):
     phone = db.Column(db.String(20))
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
     customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_contact_user_created', 'user_id', 'created_at', 'id'),
+        db.Index('ix_contact_user_updated', 'user_id', 'updated_at', 'id'),
+        db.Index('ix_contact_customer', 'customer_id'),
+    )
 
 class Deal(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -70,8 +302,16 @@ class Deal(db.Model):
     close_date = db.Column(db.Date)
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
     customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_deal_user_created', 'user_id', 'created_at', 'id'),
+        db.Index('ix_deal_user_updated', 'user_id', 'updated_at', 'id'),
+        db.Index('ix_deal_user_stage_close', 'user_id', 'stage', 'close_date'),
+        db.Index('ix_deal_customer', 'customer_id'),
+    )
 
 class Task(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -83,7 +323,1357 @@ class Task(db.Model):
     status = db.Column(db.String(20), default='pending')
     description = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_task_user_created', 'user_id', 'created_at', 'id'),
+        db.Index('ix_task_user_updated', 'user_id', 'updated_at', 'id'),
+        db.Index('ix_task_user_status', 'user_id', 'status'),
+        db.Index('ix_task_user_related', 'user_id', 'related_type', 'related_id'),
+    )
+
+class DeletedRecord(db.Model):
+    """Tombstone left by every delete so /api/sync can report removals."""
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(20), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_deleted_record_user_deleted', 'user_id', 'deleted_at', 'id'),
+    )
+
+class CollectionVersion(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    collection = db.Column(db.String(20), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class PipelineSummary(db.Model):
+    """Deal count and value per user, stage and close month, kept in step with Deal writes."""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    stage = db.Column(db.String(20), primary_key=True)
+    # First day of the close month; UNDATED_MONTH for deals without close_date
+    close_month = db.Column(db.Date, primary_key=True)
+    deal_count = db.Column(db.Integer, nullable=False, default=0)
+    total_value = db.Column(db.Float, nullable=False, default=0)
+
+class Job(db.Model):
+    """Background work submitted through /api/jobs and run by worker.py."""
+    id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    kind = db.Column(db.String(40), nullable=False)
+    params = db.Column(db.Text, nullable=False, default='{}')
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+    locked_by = db.Column(db.String(100))
+    locked_at = db.Column(db.DateTime)
+    # Uploaded file and produced file, both gzip-compressed
+    input = db.deferred(db.Column(db.LargeBinary))
+    output = db.deferred(db.Column(db.LargeBinary))
+    output_type = db.Column(db.String(100))
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('ix_job_status_run_after', 'status', 'run_after', 'id'),
+        db.Index('ix_job_user_created', 'user_id', 'created_at', 'id'),
+    )
+
+class SchemaVersion(db.Model):
+    version = db.Column(db.Integer, primary_key=True)
+    applied_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+
+# Polymorphic task relations: related_type -> (model, column shown as related_name)
+RELATED_MODELS = {
+    'customer': (Customer, Customer.name),
+    'contact': (Contact, Contact.name),
+    'deal': (Deal, Deal.title),
+}
+
+def related_key(related_type, related_id):
+    """Normalize a task's (related_type, related_id) pair so ids sent as strings match."""
+    try:
+        return related_type, int(related_id)
+    except (TypeError, ValueError):
+        return related_type, None
+
+def resolve_related_names(user_id, pairs):
+    """Resolve many (related_type, related_id) pairs with one IN query per related type.
+    
+    Only entities owned by user_id are returned, so a missing key means the
+    related entity does not exist or belongs to someone else.
+    """
+    ids_by_type = {}
+    for pair in pairs:
+        related_type, related_id = related_key(*pair)
+        if related_type in RELATED_MODELS and related_id:
+            ids_by_type.setdefault(related_type, set()).add(related_id)
+    
+    names = {}
+    for related_type, ids in ids_by_type.items():
+        model, name_column = RELATED_MODELS[related_type]
+        rows = db.session.query(model.id, name_column).filter(
+            model.user_id == user_id,
+            model.id.in_(ids)
+        ).all()
+        for related_id, name in rows:
+            names[(related_type, related_id)] = name
+    
+    return names
+
+# Deletion Tombstones
+TOMBSTONE_ENTITIES = {Customer: 'customers', Contact: 'contacts', Deal: 'deals', Task: 'tasks'}
+
+def record_tombstone(mapper, connection, target):
+    connection.execute(db.insert(DeletedRecord).values(
+        entity=TOMBSTONE_ENTITIES[mapper.class_],
+        entity_id=target.id,
+        user_id=target.user_id,
+        deleted_at=datetime.datetime.utcnow()
+    ))
+
+for model in TOMBSTONE_ENTITIES:
+    event.listen(model, 'after_delete', record_tombstone)
+
+# Pipeline Summary
+# Every Deal insert, update and delete applies its difference to PipelineSummary
+# in the same transaction. Bulk inserts that bypass the ORM (imports) call
+# apply_pipeline_deltas themselves.
+UNDATED_MONTH = datetime.date(1, 1, 1)
+
+def pipeline_key(user_id, stage, close_date):
+    return (user_id, stage or '', close_date.replace(day=1) if close_date else UNDATED_MONTH)
+
+def add_pipeline_delta(deltas, key, count, value):
+    delta = deltas.setdefault(key, [0, 0.0])
+    delta[0] += count
+    delta[1] += value or 0
+
+def apply_pipeline_deltas(connection, deltas):
+    """Add {(user_id, stage, close_month): [count, value]} to the summary with one upsert."""
+    values = [
+        {'user_id': user_id, 'stage': stage, 'close_month': month, 'deal_count': count, 'total_value': value}
+        for (user_id, stage, month), (count, value) in deltas.items()
+        if count or value
+    ]
+    if not values:
+        return
+    
+    dialect = connection.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        statement = insert(PipelineSummary).values(values)
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=['user_id', 'stage', 'close_month'],
+            set_={
+                'deal_count': PipelineSummary.deal_count + statement.excluded.deal_count,
+                'total_value': PipelineSummary.total_value + statement.excluded.total_value,
+            }
+        ))
+    else:
+        table = PipelineSummary.__table__
+        for value in values:
+            key = (table.c.user_id == value['user_id']) & (table.c.stage == value['stage']) & (table.c.close_month == value['close_month'])
+            updated = connection.execute(table.update().where(key).values(
+                deal_count=table.c.deal_count + value['deal_count'],
+                total_value=table.c.total_value + value['total_value']
+            ))
+            if not updated.rowcount:
+                connection.execute(table.insert().values(value))
+
+def previous_value(target, name):
+    history = db.inspect(target).attrs[name].history
+    return history.deleted[0] if history.deleted else getattr(target, name)
+
+@event.listens_for(Deal, 'after_insert')
+def count_inserted_deal(mapper, connection, target):
+    deltas = {}
+    add_pipeline_delta(deltas, pipeline_key(target.user_id, target.stage, target.close_date), 1, target.value)
+    apply_pipeline_deltas(connection, deltas)
+
+@event.listens_for(Deal, 'after_update')
+def count_updated_deal(mapper, connection, target):
+    deltas = {}
+    old_key = pipeline_key(*(previous_value(target, name) for name in ('user_id', 'stage', 'close_date')))
+    add_pipeline_delta(deltas, old_key, -1, -(previous_value(target, 'value') or 0))
+    add_pipeline_delta(deltas, pipeline_key(target.user_id, target.stage, target.close_date), 1, target.value)
+    apply_pipeline_deltas(connection, deltas)
+
+@event.listens_for(Deal, 'after_delete')
+def count_deleted_deal(mapper, connection, target):
+    deltas = {}
+    add_pipeline_delta(deltas, pipeline_key(target.user_id, target.stage, target.close_date), -1, -(target.value or 0))
+    apply_pipeline_deltas(connection, deltas)
+
+def rebuild_pipeline_summary(connection, user_id=None):
+    """Recompute the summary from the deal table, for one user or everyone."""
+    delete = db.delete(PipelineSummary)
+    select = db.select(
+        Deal.user_id, Deal.stage, Deal.close_date, db.func.count(Deal.id), db.func.sum(Deal.value)
+    ).group_by(Deal.user_id, Deal.stage, Deal.close_date)
+    if user_id is not None:
+        delete = delete.where(PipelineSummary.user_id == user_id)
+        select = select.where(Deal.user_id == user_id)
+    
+    connection.execute(delete)
+    deltas = {}
+    rows = connection.execute(select)
+    for user_id, stage, close_date, count, value in rows:
+        add_pipeline_delta(deltas, pipeline_key(user_id, stage, close_date), count, value)
+    apply_pipeline_deltas(connection, deltas)
+
+# Query Counting
+class QueryCounter:
+    """Count the SQL statements executed on any engine while the block runs.
+    
+        with QueryCounter() as queries:
+            client.get('/api/deals', headers=headers)
+        assert queries.count == 2
+    
+    statements holds (statement, parameters) pairs, so a test can run
+    EXPLAIN on exactly what a request executed.
+    """
+    
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+    
+    def __enter__(self):
+        event.listen(Engine, 'before_cursor_execute', self._record)
+        return self
+    
+    def __exit__(self, *exc_info):
+        event.remove(Engine, 'before_cursor_execute', self._record)
+    
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+        self.statements.append((statement, parameters))
+
+# Profiling
+# Metrics live in process memory, so with several gunicorn workers each one
+# exposes its own series on /metrics.
+class Histogram:
+    """Prometheus histogram with one series per label set."""
+    
+    def __init__(self, name, description, buckets):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0}
+            series['counts'][bisect.bisect_left(self.buckets, value)] += 1
+            series['sum'] += value
+    
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {labels: (list(data['counts']), data['sum']) for labels, data in self._series.items()}
+        
+        for labels, (counts, total) in sorted(series.items()):
+            label_text = ','.join(f'{key}="{metric_label(value)}"' for key, value in labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{{{label_text},le="{le}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {total}')
+            lines.append(f'{self.name}_count{{{label_text}}} {cumulative}')
+        return '\n'.join(lines)
+
+def metric_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+REQUEST_METRICS = {
+    'duration': Histogram('crm_request_duration_seconds', 'Time to build the response.', TIME_BUCKETS),
+    'db_seconds': Histogram('crm_request_db_seconds', 'Time spent executing SQL per request.', TIME_BUCKETS),
+    'db_queries': Histogram('crm_request_db_queries', 'SQL statements executed per request.', (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)),
+    'serialize_seconds': Histogram('crm_request_serialize_seconds', 'Time spent encoding JSON per request.', TIME_BUCKETS),
+    'response_bytes': Histogram('crm_response_size_bytes', 'Response body size.', (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)),
+}
+
+def request_route():
+    """The URL rule of the current request, used to label metrics and slow queries."""
+    if not has_request_context():
+        return '-'
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+def current_profile():
+    return g.get('profile') if has_request_context() else None
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    context._query_start = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_start
+    
+    profile = current_profile()
+    if profile is not None:
+        profile['queries'] += 1
+        profile['db'] += elapsed
+    
+    threshold = app.config['SLOW_QUERY_MS']
+    if threshold and elapsed * 1000 >= threshold:
+        app.logger.warning('Slow query (%.1f ms) from %s: %s; parameters: %r', elapsed * 1000, request_route(), statement, parameters)
+
+@app.before_request
+def start_profile():
+    if app.config['PROFILING']:
+        g.profile = {'start': time.perf_counter(), 'queries': 0, 'db': 0.0, 'serialize': 0.0}
+
+@app.after_request
+def finish_profile(response):
+    """Report the request's SQL and serialization time as Server-Timing and record it in /metrics.
+    
+    Streamed responses (exports) are measured up to the first byte only.
+    """
+    profile = g.pop('profile', None)
+    if profile is None or request.endpoint == 'metrics':
+        return response
+    
+    total = time.perf_counter() - profile['start']
+    other = max(total - profile['db'] - profile['serialize'], 0)
+    response.headers['Server-Timing'] = ', '.join((
+        f'db;dur={profile["db"] * 1000:.2f};desc="{profile["queries"]} queries"',
+        f'serialize;dur={profile["serialize"] * 1000:.2f}',
+        f'app;dur={other * 1000:.2f}',
+        f'total;dur={total * 1000:.2f}',
+    ))
+    
+    labels = (('method', request.method), ('route', request_route()))
+    REQUEST_METRICS['duration'].observe(labels, total)
+    REQUEST_METRICS['db_seconds'].observe(labels, profile['db'])
+    REQUEST_METRICS['db_queries'].observe(labels, profile['queries'])
+    REQUEST_METRICS['serialize_seconds'].observe(labels, profile['serialize'])
+    if not response.is_streamed:
+        REQUEST_METRICS['response_bytes'].observe(labels, response.calculate_content_length() or 0)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    if not app.config['PROFILING']:
+        return jsonify({'error': 'Not found'}), 404
+    
+    parts = [histogram.render() for histogram in REQUEST_METRICS.values()]
+    parts.append(render_cache_metrics())
+    body = '\n'.join(parts) + '\n'
+    return app.response_class(body, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# Caching
+# Every cache is made by make_cache. With CACHE_BACKEND=memory each worker
+# process keeps its own LRU. With CACHE_BACKEND=sqlite values live in one
+# SQLite file shared by the workers on the host, so an entry stored or
+# dropped by one worker is seen by all. Caches of live objects (the customer
+# lookup tries) stay in process; with the shared backend their deletes are
+# logged in the same file and replayed by every worker before its next read.
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire ttl seconds after being set.
+    
+    With maxbytes set, least recently used entries are also evicted once the
+    sizeof() of the values held adds up to more than maxbytes.
+    """
+    
+    def __init__(self, maxsize=1024, ttl=60, maxbytes=None, sizeof=len):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+    
+    def _size(self, value):
+        return self.sizeof(value) if self.maxbytes is not None else 0
+    
+    def _pop(self, key):
+        item = self._data.pop(key, None)
+        if item is not None:
+            self._bytes -= item[2]
+    
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[1] < time.monotonic():
+                self._pop(key)
+                item = None
+            if item is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._data.move_to_end(key)
+            return item[0]
+    
+    def set(self, key, value):
+        with self._lock:
+            self._pop(key)
+            size = self._size(value)
+            self._data[key] = (value, time.monotonic() + self.ttl, size)
+            self._bytes += size
+            while len(self._data) > self.maxsize or (self.maxbytes is not None and self._bytes > self.maxbytes):
+                self._pop(next(iter(self._data)))
+    
+    def delete(self, key):
+        with self._lock:
+            self._pop(key)
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+class SharedCacheStore:
+    """The SQLite file behind the shared caches, with one connection per thread."""
+    
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.register_at_fork(after_in_child=self.reset)
+    
+    def reset(self):
+        self._local = threading.local()
+    
+    def connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache_entry (cache TEXT NOT NULL, key TEXT NOT NULL, '
+                'value BLOB NOT NULL, expires_at REAL NOT NULL, PRIMARY KEY (cache, key)) WITHOUT ROWID'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_cache_entry_expires ON cache_entry (cache, expires_at)')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache_invalidation (seq INTEGER PRIMARY KEY AUTOINCREMENT, '
+                'cache TEXT NOT NULL, key TEXT NOT NULL, created_at REAL NOT NULL)'
+            )
+            self._local.connection = connection
+        return connection
+
+class SQLiteCache:
+    """TTLCache's interface over a SharedCacheStore; values are pickled.
+    
+    Expiry uses wall-clock time, which every worker agrees on. Once the cache
+    outgrows maxsize entries, or maxbytes of pickled values, the entries
+    closest to expiring are evicted. Errors such as a locked file are logged
+    and counted rather than failing the request: a failed read is a miss, a
+    failed delete leaves the entry to expire.
+    """
+    
+    PRUNE_EVERY = 256
+    
+    def __init__(self, name, store, maxsize=1024, ttl=60, maxbytes=None):
+        self.name = name
+        self.store = store
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._sets = 0
+        self._lock = threading.Lock()
+    
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+    
+    def _failed(self, action):
+        app.logger.exception('Shared cache %s %s failed', self.name, action)
+        with self._lock:
+            self.errors += 1
+    
+    def get(self, key, default=None):
+        try:
+            row = self.store.connection().execute(
+                'SELECT value FROM cache_entry WHERE cache = ? AND key = ? AND expires_at > ?',
+                (self.name, repr(key), time.time())
+            ).fetchone()
+        except sqlite3.Error:
+            self._failed('read')
+            row = None
+        
+        self._count(row is not None)
+        return pickle.loads(row[0]) if row is not None else default
+    
+    def set(self, key, value):
+        try:
+            connection = self.store.connection()
+            connection.execute(
+                'INSERT OR REPLACE INTO cache_entry (cache, key, value, expires_at) VALUES (?, ?, ?, ?)',
+                (self.name, repr(key), pickle.dumps(value, pickle.HIGHEST_PROTOCOL), time.time() + self.ttl)
+            )
+            with self._lock:
+                self._sets += 1
+                prune = self._sets % self.PRUNE_EVERY == 0
+            if prune:
+                self.prune(connection)
+        except sqlite3.Error:
+            self._failed('write')
+    
+    def prune(self, connection):
+        connection.execute('DELETE FROM cache_entry WHERE cache = ? AND expires_at <= ?', (self.name, time.time()))
+        connection.execute(
+            'DELETE FROM cache_entry WHERE cache = ? AND key IN (SELECT key FROM cache_entry WHERE cache = ? '
+            'ORDER BY expires_at DESC LIMIT -1 OFFSET ?)',
+            (self.name, self.name, self.maxsize)
+        )
+        if self.maxbytes is not None:
+            connection.execute(
+                'DELETE FROM cache_entry WHERE cache = ? AND key IN (SELECT key FROM (SELECT key, '
+                'sum(length(value)) OVER (ORDER BY expires_at DESC) AS total FROM cache_entry WHERE cache = ?) '
+                'WHERE total > ?)',
+                (self.name, self.name, self.maxbytes)
+            )
+    
+    def delete(self, key):
+        try:
+            self.store.connection().execute('DELETE FROM cache_entry WHERE cache = ? AND key = ?', (self.name, repr(key)))
+        except sqlite3.Error:
+            self._failed('delete')
+    
+    def clear(self):
+        try:
+            self.store.connection().execute('DELETE FROM cache_entry WHERE cache = ?', (self.name,))
+        except sqlite3.Error:
+            self._failed('clear')
+
+class BroadcastCache(TTLCache):
+    """In-process TTLCache whose deletes reach the same cache in every worker.
+    
+    Deletes are appended to the store's invalidation log; each read first
+    applies the entries logged since the previous read.
+    """
+    
+    def __init__(self, name, store, maxsize=1024, ttl=60, maxbytes=None, sizeof=len):
+        super().__init__(maxsize, ttl, maxbytes, sizeof)
+        self.name = name
+        self.store = store
+        self._seen = None
+    
+    def _replay(self):
+        connection = self.store.connection()
+        if self._seen is None:
+            # Entries logged before this worker started concern nothing it holds
+            self._seen = connection.execute('SELECT coalesce(max(seq), 0) FROM cache_invalidation').fetchone()[0]
+            return
+        
+        rows = connection.execute(
+            'SELECT seq, key FROM cache_invalidation WHERE seq > ? AND cache = ?', (self._seen, self.name)
+        ).fetchall()
+        if rows:
+            with self._lock:
+                for _, key in rows:
+                    self._pop(key)
+            self._seen = max(self._seen, rows[-1][0])
+    
+    def get(self, key, default=None):
+        try:
+            self._replay()
+        except sqlite3.Error:
+            # Without the log this worker cannot tell what is stale
+            app.logger.exception('Cache %s could not read invalidations', self.name)
+            self.clear()
+            with self._lock:
+                self.errors += 1
+        return super().get(repr(key), default)
+    
+    def set(self, key, value):
+        # Keys are held by repr, the form the log names them in
+        super().set(repr(key), value)
+    
+    def delete(self, key):
+        super().delete(repr(key))
+        now = time.time()
+        try:
+            connection = self.store.connection()
+            connection.execute(
+                'INSERT INTO cache_invalidation (cache, key, created_at) VALUES (?, ?, ?)', (self.name, repr(key), now)
+            )
+            # Log entries older than the TTL only concern entries that have expired anyway
+            connection.execute('DELETE FROM cache_invalidation WHERE cache = ? AND created_at < ?', (self.name, now - self.ttl))
+        except sqlite3.Error:
+            # Called after the write committed; other workers keep the entry until it expires
+            app.logger.exception('Cache %s could not log an invalidation', self.name)
+            with self._lock:
+                self.errors += 1
+
+CACHES = {}
+
+cache_store = SharedCacheStore(app.config['CACHE_PATH']) if app.config['CACHE_BACKEND'] == 'sqlite' else None
+
+def make_cache(name, maxsize, ttl, shareable=True, maxbytes=None, sizeof=len):
+    """Create and register a cache; shareable values must be picklable.
+    
+    maxbytes bounds the total sizeof() of the values held in memory; the
+    shared backend bounds the size of the pickled values instead.
+    """
+    if cache_store is None:
+        cache = TTLCache(maxsize=maxsize, ttl=ttl, maxbytes=maxbytes, sizeof=sizeof)
+    elif shareable:
+        cache = SQLiteCache(name, cache_store, maxsize=maxsize, ttl=ttl, maxbytes=maxbytes)
+    else:
+        cache = BroadcastCache(name, cache_store, maxsize=maxsize, ttl=ttl, maxbytes=maxbytes, sizeof=sizeof)
+    CACHES[name] = cache
+    return cache
+
+def render_cache_metrics():
+    lines = [
+        '# HELP crm_cache_requests_total Cache lookups in this process by result.',
+        '# TYPE crm_cache_requests_total counter',
+    ]
+    for name, cache in sorted(CACHES.items()):
+        lines.append(f'crm_cache_requests_total{{cache="{name}",result="hit"}} {cache.hits}')
+        lines.append(f'crm_cache_requests_total{{cache="{name}",result="miss"}} {cache.misses}')
+    lines += ['# HELP crm_cache_hit_ratio Share of cache lookups in this process that hit.', '# TYPE crm_cache_hit_ratio gauge']
+    for name, cache in sorted(CACHES.items()):
+        lookups = cache.hits + cache.misses
+        lines.append(f'crm_cache_hit_ratio{{cache="{name}"}} {cache.hits / lookups if lookups else 0}')
+    lines += ['# HELP crm_cache_errors_total Shared cache operations in this process that failed.', '# TYPE crm_cache_errors_total counter']
+    for name, cache in sorted(CACHES.items()):
+        lines.append(f'crm_cache_errors_total{{cache="{name}"}} {cache.errors}')
+    return '\n'.join(lines)
+
+# Responses of versioned GET endpoints, keyed by their ETag and query string.
+# A write changes the ETag, so entries never need to be invalidated. Values
+# are (body, headers); the body is what takes up the byte budget.
+response_cache = make_cache(
+    'responses', app.config['RESPONSE_CACHE_SIZE'], app.config['RESPONSE_CACHE_TTL'],
+    maxbytes=app.config['RESPONSE_CACHE_MAX_TOTAL_BYTES'], sizeof=lambda value: len(value[0])
+)
+
+# Authenticated users, keyed by id. Routes only read id, name and email, so a
+# plain tuple is cached instead of a session-bound User instance.
+AuthUser = namedtuple('AuthUser', ['id', 'name', 'email'])
+
+auth_cache = make_cache('auth', app.config['AUTH_CACHE_SIZE'], app.config['AUTH_CACHE_TTL'])
+
+def load_auth_user(user_id):
+    """Return the AuthUser for user_id, or None if the user no longer exists."""
+    user = auth_cache.get(user_id)
+    if user is None:
+        row = db.session.query(User.id, User.name, User.email).filter(User.id == user_id).first()
+        if row is None:
+            return None
+        user = tuple(row)
+        auth_cache.set(user_id, user)
+    return AuthUser(*user)
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def invalidate_auth_user(mapper, connection, target):
+    auth_cache.delete(target.id)
+
+class TrieNode:
+    __slots__ = ('children', 'rows', 'complete')
+    
+    def __init__(self):
+        self.children = {}
+        self.rows = None
+        self.complete = False
+
+class PrefixTrie:
+    """Thread-safe cache of lookup results by prefix, for one user's customers.
+    
+    A node holds the first rows matching its prefix, in result order, and
+    whether those are every match. Rows are tuples whose first item is the
+    name key. A complete node answers all longer prefixes by filtering,
+    so typing past it needs no more queries.
+    """
+    
+    def __init__(self, max_nodes=512):
+        self.max_nodes = max_nodes
+        self._root = TrieNode()
+        self._nodes = 1
+        self._lock = threading.Lock()
+    
+    def get(self, prefix, limit):
+        """Return up to limit rows for prefix, or None if they are not cached."""
+        with self._lock:
+            node = self._root
+            for char in prefix:
+                if node.complete:
+                    return [row for row in node.rows if row[0].startswith(prefix)][:limit]
+                node = node.children.get(char)
+                if node is None:
+                    return None
+            
+            if node.rows is not None and (node.complete or len(node.rows) >= limit):
+                return node.rows[:limit]
+            return None
+    
+    def put(self, prefix, rows, complete):
+        with self._lock:
+            if len(prefix) >= self.max_nodes:
+                return
+            if self._nodes + len(prefix) > self.max_nodes:
+                self._root = TrieNode()
+                self._nodes = 1
+            
+            node = self._root
+            for char in prefix:
+                child = node.children.get(char)
+                if child is None:
+                    child = node.children[char] = TrieNode()
+                    self._nodes += 1
+                node = child
+            node.rows = rows
+            node.complete = complete
+
+# Per-user customer picker tries, dropped by every customer write
+customer_lookup_cache = make_cache(
+    'customer_lookup',
+    app.config['CUSTOMER_LOOKUP_CACHE_SIZE'],
+    app.config['CUSTOMER_LOOKUP_CACHE_TTL'],
+    shareable=False
+)
+
+# Collection Versions
+# Every write bumps a per-user version for the collections it touches, in the
+# same transaction. GET responses carry an ETag built from those versions, so
+# an unchanged collection is answered with 304 from one primary-key lookup.
+# Lists that show names from other collections depend on those as well.
+COLLECTION_DEPENDENCIES = {
+    'customers': ('customers',),
+    'contacts': ('contacts', 'customers'),
+    'deals': ('deals', 'customers'),
+    'tasks': ('tasks', 'customers', 'contacts', 'deals'),
+    'dashboard': ('customers', 'deals', 'tasks'),
+    'pipeline': ('deals',),
+}
+
+def mark_changed(user_id, *collections):
+    """Record that the current transaction modifies the user's collections."""
+    values = [{'user_id': user_id, 'collection': collection, 'version': 1} for collection in collections]
+    dialect = db.session.get_bind().dialect.name
+    
+    if dialect in ('postgresql', 'sqlite'):
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        statement = insert(CollectionVersion).values(values)
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=['user_id', 'collection'],
+            set_={'version': CollectionVersion.version + 1}
+        ))
+    else:
+        for value in values:
+            updated = db.session.query(CollectionVersion).filter_by(
+                user_id=user_id, collection=value['collection']
+            ).update({'version': CollectionVersion.version + 1}, synchronize_session=False)
+            if not updated:
+                db.session.add(CollectionVersion(**value))
+    
+    db.session.info.setdefault('changed', set()).update((user_id, collection) for collection in collections)
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_changed(session):
+    changed = session.info.pop('changed', ())
+    for user_id in {user_id for user_id, collection in changed if collection == 'customers'}:
+        customer_lookup_cache.delete(user_id)
+    if REPLICA_BINDS:
+        for user_id in {user_id for user_id, _ in changed}:
+            primary_sticky_cache.set(user_id, True)
+
+@event.listens_for(Session, 'after_rollback')
+def discard_changed(session):
+    session.info.pop('changed', None)
+
+# Read Replicas
+# Views decorated with replica_reads run their SELECTs on a randomly chosen
+# replica. A user who just wrote reads from the primary for
+# REPLICA_STICKY_SECONDS (set by invalidate_changed), so they see their own
+# writes despite replication lag. Replicas require the sqlite cache backend,
+# so that holds across the workers of a server.
+primary_sticky_cache = make_cache('primary_sticky', app.config['AUTH_CACHE_SIZE'], app.config['REPLICA_STICKY_SECONDS'])
+
+def current_replica():
+    return g.get('replica') if has_request_context() else None
+
+def replica_reads(f):
+    """Read from a replica unless the user wrote recently.
+    
+    Must be applied inside token_required, which supplies current_user.
+    """
+    @wraps(f)
+    def decorated(current_user, *args, **kwargs):
+        if REPLICA_BINDS and primary_sticky_cache.get(current_user.id) is None:
+            g.replica = db.engines[random.choice(REPLICA_BINDS)]
+        return f(current_user, *args, **kwargs)
+    
+    return decorated
+
+def collection_etag(user_id, name):
+    """Weak ETag for one user's view of a collection, including the query string."""
+    dependencies = COLLECTION_DEPENDENCIES[name]
+    versions = dict(db.session.query(CollectionVersion.collection, CollectionVersion.version).filter(
+        CollectionVersion.user_id == user_id,
+        CollectionVersion.collection.in_(dependencies)
+    ).all())
+    
+    # The date is part of the tag because the dashboard's month revenue depends on it
+    parts = [str(user_id), name, datetime.date.today().isoformat()]
+    parts += [str(versions.get(collection, 0)) for collection in dependencies]
+    parts.append(format(zlib.crc32(request.query_string), 'x'))
+    return '-'.join(parts)
+
+def versioned(name):
+    """Answer GET requests whose If-None-Match matches the collection's ETag with 304.
+    
+    Must be applied inside token_required, which supplies current_user.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(current_user, *args, **kwargs):
+            etag = collection_etag(current_user.id, name)
+            
+            if request.if_none_match.contains_weak(etag):
+                response = app.response_class(status=304)
+            else:
+                cache_key = (etag, request.query_string)
+                cached = response_cache.get(cache_key)
+                if cached is not None:
+                    body, headers = cached
+                    response = app.response_class(body, headers=headers)
+                else:
+                    response = make_response(f(current_user, *args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    
+                    body = response.get_data()
+                    if len(body) <= app.config['RESPONSE_CACHE_MAX_BYTES']:
+                        headers = [(key, value) for key, value in response.headers if key in ('Content-Type', 'X-Next-Cursor')]
+                        response_cache.set(cache_key, (body, headers))
+            
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        
+        return decorated
+    
+    return decorator
+
+# API Errors
+class ApiError(Exception):
+    """Raised by request helpers to abort with a JSON error response."""
+    
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+@app.errorhandler(ApiError)
+def handle_api_error(error):
+    return jsonify({'error': error.message}), error.status
+
+# List Helpers
+# Fields returned by each list endpoint, in response order. Fields that are
+# not columns of the model (DERIVED_FIELDS) are computed per route.
+DERIVED_FIELDS = ('customer_name', 'related_name')
+CUSTOMER_FIELDS = ('id', 'name', 'company', 'email', 'phone', 'status', 'notes', 'created_at', 'updated_at')
+CONTACT_FIELDS = ('id', 'name', 'position', 'email', 'phone', 'notes', 'customer_id', 'customer_name', 'created_at', 'updated_at')
+DEAL_FIELDS = ('id', 'title', 'value', 'stage', 'close_date', 'notes', 'customer_id', 'customer_name', 'created_at', 'updated_at')
+TASK_FIELDS = ('id', 'title', 'related_type', 'related_id', 'related_name', 'due_date', 'priority', 'status', 'description', 'created_at', 'updated_at')
+
+def requested_fields(allowed):
+    """Return the ?fields= projection, defaulting to every allowed field."""
+    value = request.args.get('fields')
+    if not value:
+        return allowed
+    
+    fields = tuple(dict.fromkeys(field.strip() for field in value.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in allowed]
+    if unknown or not fields:
+        raise ApiError('Unknown fields: ' + ', '.join(unknown))
+    return fields
+
+def encode_cursor(created_at, row_id):
+    raw = f'{created_at.isoformat()}|{row_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.split('|')
+        return datetime.datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ApiError('Invalid cursor')
+
+def parse_date(value):
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise ApiError('Invalid date format')
+
+def date_arg(name):
+    """Parse an optional YYYY-MM-DD query string argument."""
+    value = request.args.get(name)
+    return parse_date(value) if value else None
+
+def int_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ApiError(f'Invalid {name}')
+
+def paginate(query, model):
+    """Fetch one keyset page of query ordered by (created_at, id).
+    
+    Reads ?cursor= and ?limit= from the request and returns the rows of the
+    page plus the cursor of the next one (None on the last page). The page
+    is fetched with LIMIT n + 1 so no COUNT query is needed.
+    """
+    limit = int_arg('limit') or app.config['PAGE_SIZE']
+    limit = max(1, min(limit, app.config['MAX_PAGE_SIZE']))
+    
+    cursor = request.args.get('cursor')
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.filter(db.tuple_(model.created_at, model.id) > db.tuple_(created_at, row_id))
+    
+    rows = query.order_by(model.created_at, model.id).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].id)
+
+def compact_list(serializer, rows, fields, computed=None):
+    """Build the ?format=compact body: column names once, then one array of values per row.
+    
+    When both customer_id and customer_name are requested, the names move to
+    a "customers" table of customer_id -> name sent once per page, since many
+    rows usually share a customer.
+    """
+    data = {'columns': fields}
+    if 'customer_name' in fields and 'customer_id' in fields:
+        data['columns'] = tuple(field for field in fields if field != 'customer_name')
+        data['customers'] = {str(row.customer_id): row.customer_name for row in rows}
+    
+    data['rows'] = serializer.rows(rows, data['columns'], computed)
+    return data
+
+def list_response(serializer, rows, fields, next_cursor, computed=None):
+    """Serialize a page of rows to JSON, exposing the next cursor as a header.
+    
+    The body is an array of objects, or with ?format=compact the columnar
+    layout of compact_list.
+    """
+    list_format = request.args.get('format', 'json')
+    if list_format == 'compact':
+        response = json_response(compact_list(serializer, rows, fields, computed))
+    elif list_format == 'json':
+        response = json_response(serializer.dicts(rows, fields, computed))
+    else:
+        raise ApiError('Unsupported format')
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response, 200
+
+# Serialization
+def dumps(data):
+    """Encode data as compact JSON bytes, using orjson when it is installed."""
+    start = time.perf_counter()
+    if orjson:
+        encoded = orjson.dumps(data)
+    else:
+        encoded = json.dumps(data, separators=(',', ':')).encode()
+    
+    profile = current_profile()
+    if profile is not None:
+        profile['serialize'] += time.perf_counter() - start
+    return encoded
+
+def json_response(data, status=200):
+    return app.response_class(dumps(data), status=status, mimetype='application/json')
+
+def iso_value(value):
+    return value.isoformat() if value is not None else None
+
+class Serializer:
+    """Builds the response values of one model from row tuples.
+    
+    Reading a row is planned once per (fields, row layout): every field maps
+    to a tuple position and, for date columns, an isoformat conversion. The
+    conversion is skipped for JSON when orjson encodes dates itself, and is
+    always applied for text output such as CSV. ?fields= can be any ordering
+    of any subset, so only the most recently used PLAN_CACHE_SIZE plans are kept.
+    """
+    
+    PLAN_CACHE_SIZE = 256
+    
+    def __init__(self, model, fields, requires=None):
+        self.model = model
+        self.fields = fields
+        # computed field -> model columns it is computed from
+        self.requires = requires or {}
+        table_columns = model.__table__.columns
+        self.date_fields = frozenset(
+            field for field in fields
+            if field in table_columns and isinstance(table_columns[field].type, (db.Date, db.DateTime))
+        )
+        self._plans = TTLCache(maxsize=self.PLAN_CACHE_SIZE, ttl=float('inf'))
+    
+    def columns(self, fields):
+        """Columns of the model needed to build fields, always including the (created_at, id) keyset."""
+        table_columns = self.model.__table__.columns
+        names = ['id', 'created_at']
+        for field in fields:
+            if field in table_columns:
+                names.append(field)
+            names.extend(self.requires.get(field, ()))
+        return [getattr(self.model, name) for name in dict.fromkeys(names)]
+    
+    def _plan(self, fields, layout, text):
+        key = (fields, layout, text)
+        plan = self._plans.get(key)
+        if plan is None:
+            convert = self.date_fields if text or not orjson else ()
+            plan = tuple(
+                (field, layout.index(field) if field in layout else None, field in convert)
+                for field in fields
+            )
+            self._plans.set(key, plan)
+        return plan
+    
+    def rows(self, rows, fields, computed=None, text=False):
+        """Return the values of fields for each row, in field order."""
+        if not rows:
+            return []
+        
+        computed = computed or {}
+        plan = self._plan(fields, tuple(rows[0]._fields), text)
+        if not computed and not any(convert for _, _, convert in plan):
+            # Plain columns only: a single C-level getter per row
+            getter = itemgetter(*(index for _, index, _ in plan))
+            if len(plan) == 1:
+                return [(getter(row),) for row in rows]
+            return [getter(row) for row in rows]
+        
+        getters = []
+        for field, index, convert in plan:
+            if field in computed:
+                getters.append(computed[field])
+            elif convert:
+                getters.append(lambda row, index=index: iso_value(row[index]))
+            else:
+                getters.append(itemgetter(index))
+        return [[get(row) for get in getters] for row in rows]
+    
+    def dicts(self, rows, fields, computed=None):
+        return [dict(zip(fields, values)) for values in self.rows(rows, fields, computed)]
+    
+    def instance(self, obj, **computed):
+        """Serialize a single model instance, e.g. after a create or update."""
+        result = {}
+        for field in self.fields:
+            if field in computed:
+                result[field] = computed[field]
+            elif field in self.date_fields and not orjson:
+                result[field] = iso_value(getattr(obj, field))
+            else:
+                result[field] = getattr(obj, field)
+        return result
+
+CUSTOMER_SERIALIZER = Serializer(Customer, CUSTOMER_FIELDS)
+CONTACT_SERIALIZER = Serializer(Contact, CONTACT_FIELDS)
+DEAL_SERIALIZER = Serializer(Deal, DEAL_FIELDS)
+TASK_SERIALIZER = Serializer(Task, TASK_FIELDS, requires={'related_name': ('related_type', 'related_id')})
+
+# Response Compression
+# Responses of these types are encoded with the best coding the client
+# accepts: br when brotli is installed, otherwise gzip. Bodies shorter than
+# COMPRESS_MIN_SIZE are sent as is, since the headers would outweigh the
+# savings; streamed responses (exports) are compressed chunk by chunk as
+# they are produced. Registered after finish_profile, so it runs first and
+# the response_bytes metric counts compressed bytes.
+COMPRESSIBLE_MIMETYPES = frozenset((
+    'application/json', 'application/x-ndjson', 'text/csv', 'text/html', 'text/plain',
+    'text/css', 'text/javascript', 'application/javascript',
+))
+
+class BrotliEncoder:
+    """Brotli's streaming compressor behind zlib's compress/flush interface."""
+    
+    def __init__(self, quality):
+        self.compressor = brotli.Compressor(quality=quality)
+    
+    def compress(self, data):
+        return self.compressor.process(data)
+    
+    def flush(self):
+        return self.compressor.finish()
+
+def content_encoder(coding):
+    if coding == 'br':
+        return BrotliEncoder(app.config['COMPRESS_BROTLI_QUALITY'])
+    return zlib.compressobj(app.config['COMPRESS_GZIP_LEVEL'], zlib.DEFLATED, 31)
+
+def encoded_chunks(chunks, app_iter, encoder):
+    """Compress the encoded chunks of a streamed response, closing its iterator when done."""
+    try:
+        for chunk in chunks:
+            data = encoder.compress(chunk)
+            if data:
+                yield data
+        yield encoder.flush()
+    finally:
+        # Closing the original iterator ends stream_with_context's request context
+        if hasattr(app_iter, 'close'):
+            app_iter.close()
+
+@app.after_request
+def compress_response(response):
+    if (response.status_code != 200 or response.direct_passthrough
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES or 'Content-Encoding' in response.headers):
+        return response
+    
+    response.vary.add('Accept-Encoding')
+    coding = request.accept_encodings.best_match(['br', 'gzip'] if brotli else ['gzip'])
+    if coding is None:
+        return response
+    
+    if response.is_streamed:
+        response.response = encoded_chunks(response.iter_encoded(), response.response, content_encoder(coding))
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < app.config['COMPRESS_MIN_SIZE']:
+            return response
+        encoder = content_encoder(coding)
+        response.set_data(encoder.compress(body) + encoder.flush())
+    response.headers['Content-Encoding'] = coding
+    return response
+
+# Payload Validation
+# Shared by the create routes and bulk import: each returns the column values
+# for a new record or raises ApiError. Ownership of customer_id is checked by
+# the caller so imports can verify a whole batch at once.
+def customer_values(data):
+    if not data or not data.get('name') or not data.get('company') or not data.get('email'):
+        raise ApiError('Missing required fields')
+    
+    return {
+        'name': data.get('name'),
+        'company': data.get('company'),
+        'email': data.get('email'),
+        'phone': data.get('phone', ''),
+        'status': data.get('status') or 'new',
+        'notes': data.get('notes', '')
+    }
+
+def contact_values(data):
+    if not data or not data.get('name') or not data.get('email') or not data.get('customer_id'):
+        raise ApiError('Missing required fields')
+    
+    return {
+        'name': data.get('name'),
+        'position': data.get('position', ''),
+        'email': data.get('email'),
+        'phone': data.get('phone', ''),
+        'notes': data.get('notes', ''),
+        'customer_id': parse_id(data.get('customer_id'), 'customer_id')
+    }
+
+def deal_values(data):
+    if not data or not data.get('title') or not data.get('value') or not data.get('customer_id'):
+        raise ApiError('Missing required fields')
+    
+    return {
+        'title': data.get('title'),
+        'value': parse_value(data.get('value')),
+        'stage': data.get('stage') or 'prospect',
+        'close_date': parse_date(data.get('close_date')) if data.get('close_date') else None,
+        'notes': data.get('notes', ''),
+        'customer_id': parse_id(data.get('customer_id'), 'customer_id')
+    }
+
+def task_values(data):
+    if not data or not data.get('title') or not data.get('due_date'):
+        raise ApiError('Missing required fields')
+    
+    related_type = data.get('related_type', '')
+    return {
+        'title': data.get('title'),
+        'related_type': related_type,
+        'related_id': related_key(related_type, data.get('related_id'))[1],
+        'due_date': parse_date(data.get('due_date')),
+        'priority': data.get('priority') or 'medium',
+        'status': data.get('status') or 'pending',
+        'description': data.get('description', '')
+    }
+
+# Partial updates, shared by the PUT routes and the batch API. Ownership of a
+# new customer_id or related entity must be verified before calling these.
+def apply_customer_changes(customer, data):
+    if data.get('name'):
+        customer.name = data.get('name')
+        customer.name_key = customer_name_key(customer.name)
+    if data.get('company'):
+        customer.company = data.get('company')
+    if data.get('email'):
+        customer.email = data.get('email')
+    if data.get('phone') is not None:
+        customer.phone = data.get('phone')
+    if data.get('status'):
+        customer.status = data.get('status')
+    if data.get('notes') is not None:
+        customer.notes = data.get('notes')
+
+def apply_contact_changes(contact, data):
+    if data.get('name'):
+        contact.name = data.get('name')
+    if data.get('position') is not None:
+        contact.position = data.get('position')
+    if data.get('email'):
+        contact.email = data.get('email')
+    if data.get('phone') is not None:
+        contact.phone = data.get('phone')
+    if data.get('notes') is not None:
+        contact.notes = data.get('notes')
+    if data.get('customer_id'):
+        contact.customer_id = parse_id(data.get('customer_id'), 'customer_id')
+
+def apply_deal_changes(deal, data):
+    if data.get('title'):
+        deal.title = data.get('title')
+    if data.get('value') is not None:
+        deal.value = parse_value(data.get('value'))
+    if data.get('stage'):
+        deal.stage = data.get('stage')
+    if data.get('close_date'):
+        deal.close_date = parse_date(data.get('close_date'))
+    if data.get('notes') is not None:
+        deal.notes = data.get('notes')
+    if data.get('customer_id'):
+        deal.customer_id = parse_id(data.get('customer_id'), 'customer_id')
+
+def task_related_change(task, data):
+    """Return the (related_type, related_id) a task update sets, or None if unchanged."""
+    if data.get('related_type') is None and data.get('related_id') is None:
+        return None
+    return data.get('related_type', task.related_type), data.get('related_id', task.related_id)
+
+def apply_task_changes(task, data):
+    if data.get('title'):
+        task.title = data.get('title')
+    
+    related = task_related_change(task, data)
+    if related:
+        task.related_type = related[0]
+        task.related_id = related_key(*related)[1]
+    
+    if data.get('due_date'):
+        task.due_date = parse_date(data.get('due_date'))
+    if data.get('priority'):
+        task.priority = data.get('priority')
+    if data.get('status'):
+        task.status = data.get('status')
+    if data.get('description') is not None:
+        task.description = data.get('description')
+
+def parse_id(value, name):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ApiError(f'Invalid {name}')
+
+def parse_value(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise ApiError('Invalid value')
+    # nan and inf parse as floats but cannot be stored or summed
+    if not math.isfinite(value):
+        raise ApiError('Invalid value')
+    return value
+
+def owned_customer_ids(user_id, customer_ids):
+    """Return the subset of customer_ids that belong to user_id, in one IN query."""
+    if not customer_ids:
+        return set()
+    rows = db.session.query(Customer.id).filter(
+        Customer.user_id == user_id,
+        Customer.id.in_(customer_ids)
+    )
+    return {customer_id for customer_id, in rows}
+
+# Password Hashing
+# Hashes are stored as '<method>$<salt>$<hash>', the format werkzeug uses.
+# scrypt is computed here because werkzeug 2.2 only supports pbkdf2; the
+# strings match what newer werkzeug releases produce and verify.
+def password_method():
+    """The method string new hashes are created with, including its cost parameters."""
+    if app.config['PASSWORD_HASH_METHOD'] == 'pbkdf2':
+        return f"pbkdf2:sha256:{app.config['PASSWORD_PBKDF2_ITERATIONS']}"
+    return f"scrypt:{app.config['PASSWORD_SCRYPT_N']}:8:1"
+
+def scrypt_hex(password, salt, method):
+    n, r, p = (int(value) for value in method.split(':')[1:])
+    return hashlib.scrypt(password.encode(), salt=salt.encode(), n=n, r=r, p=p, maxmem=132 * n * r * p).hex()
+
+def hash_password(password):
+    method = password_method()
+    if method.startswith('scrypt:'):
+        salt = gen_salt(16)
+        return f'{method}${salt}${scrypt_hex(password, salt, method)}'
+    return generate_password_hash(password, method=method, salt_length=16)
+
+def verify_password(stored, password):
+    """Check password against a stored hash of any supported method, including legacy sha256."""
+    method, _, rest = stored.partition('$')
+    if not method.startswith('scrypt:'):
+        return check_password_hash(stored, password)
+    
+    salt, _, expected = rest.partition('$')
+    try:
+        return hmac.compare_digest(scrypt_hex(password, salt, method), expected)
+    except ValueError:
+        return False
+
+def password_needs_rehash(stored):
+    return stored.partition('$')[0] != password_method()
+
+# hashlib releases the GIL while hashing, so a thread pool is enough to use
+# several cores. The semaphore bounds running plus waiting hashes: a burst of
+# logins gets 503s instead of piling up behind each other.
+password_pool = ThreadPoolExecutor(app.config['PASSWORD_HASH_WORKERS'], thread_name_prefix='password-hash')
+password_slots = threading.BoundedSemaphore(app.config['PASSWORD_HASH_WORKERS'] + app.config['PASSWORD_HASH_QUEUE'])
+
+def wait_for_result(future):
+    """Block until a pool future is done; asgi.py swaps in a wait that keeps the event loop running."""
+    return future.result()
+
+def run_password_work(f, *args):
+    if not password_slots.acquire(blocking=False):
+        raise ApiError('Too many login attempts, try again shortly', 503)
+    try:
+        return wait_for_result(password_pool.submit(f, *args))
+    finally:
+        password_slots.release()
 
 # Token Required Decorator
 def token_required(f):
@@ -102,10 +1692,13 @@ def token_required(f):
         
         try:
             data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
-            current_user = User.query.filter_by(id=data['user_id']).first()
+            current_user = load_auth_user(data['user_id'])
         except:
             return jsonify({'error': 'Token is invalid!'}), 401
         
+        if not current_user:
+            return jsonify({'error': 'Token is invalid!'}), 401
+        
         return f(current_user, *args, **kwargs)
     
     return decorated
@@ -132,7 +1725,12 @@ def login():
     if not user:
         return jsonify({'error': 'Email or password is incorrect'}), 401
     
-    if check_password_hash(user.password, data.get('password')):
+    if run_password_work(verify_password, user.password, data.get('password')):
+        # Upgrade hashes made with an older method or cost
+        if password_needs_rehash(user.password):
+            user.password = run_password_work(hash_password, data.get('password'))
+            db.session.commit()
+        
         token = jwt.encode({
             'user_id': user.id,
             'exp': datetime.datetime.utcnow() + datetime.timedelta(days=7)
@@ -154,7 +1752,7 @@ def register():
     if existing_user:
         return jsonify({'error': 'Email already in use'}), 409
     
-    hashed_password = generate_password_hash(data.get('password'), method='sha256')
+    hashed_password = run_password_work(hash_password, data.get('password'))
     
     new_user = User(
         name=data.get('name'),
@@ -177,57 +1775,74 @@ def get_user(current_user):
     }), 200
 
 # Customer API Routes
+def customer_list_query(user_id, fields):
+    """Customers of user_id with the request's filters applied, selecting only fields."""
+    query = db.session.query(*CUSTOMER_SERIALIZER.columns(fields)).filter(Customer.user_id == user_id)
+    
+    if request.args.get('status'):
+        query = query.filter(Customer.status == request.args.get('status'))
+    
+    return query
+
 @app.route('/api/customers', methods=['GET'])
 @token_required
+@replica_reads
+@versioned('customers')
 def get_customers(current_user):
-    customers = Customer.query.filter_by(user_id=current_user.id).all()
-    result = []
-    
-    for customer in customers:
-        result.append({
-            'id': customer.id,
-            'name': customer.name,
-            'company': customer.company,
-            'email': customer.email,
-            'phone': customer.phone,
-            'status': customer.status,
-            'notes': customer.notes,
-            'created_at': customer.created_at.isoformat()
-        })
+    fields = requested_fields(CUSTOMER_FIELDS)
+    customers, next_cursor = paginate(customer_list_query(current_user.id, fields), Customer)
     
-    return jsonify(result), 200
+    return list_response(CUSTOMER_SERIALIZER, customers, fields, next_cursor)
+
+def customer_lookup_query(user_id, prefix, limit):
+    """First limit (name key, id, name, company) rows of user_id whose name key starts with prefix."""
+    key = Customer.name_key
+    query = db.session.query(key, Customer.id, Customer.name, Customer.company).filter(Customer.user_id == user_id)
+    
+    if prefix:
+        # The range is what ix_customer_user_name_key can seek on; LIKE keeps the
+        # matches exact under collations that do not sort by code point
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        query = query.filter(key >= prefix, key < upper, key.startswith(prefix, autoescape=True))
+    
+    return [tuple(row) for row in query.order_by(key, Customer.id).limit(limit)]
+
+@app.route('/api/customers/lookup', methods=['GET'])
+@token_required
+def lookup_customers(current_user):
+    prefix = customer_name_key(request.args.get('prefix', '').lstrip())
+    limit = int_arg('limit') or app.config['CUSTOMER_LOOKUP_LIMIT']
+    limit = max(1, min(limit, app.config['CUSTOMER_LOOKUP_MAX']))
+    
+    # Taken before querying: a write committed meanwhile drops this trie, so
+    # results read before it never land in the one that replaces it
+    trie = customer_lookup_cache.get(current_user.id)
+    if trie is None:
+        trie = PrefixTrie()
+        customer_lookup_cache.set(current_user.id, trie)
+    
+    rows = trie.get(prefix, limit)
+    if rows is None:
+        # Fetch the largest allowed page so narrower prefixes can be served from it
+        depth = app.config['CUSTOMER_LOOKUP_MAX']
+        rows = customer_lookup_query(current_user.id, prefix, depth)
+        trie.put(prefix, rows, complete=len(rows) < depth)
+        rows = rows[:limit]
+    
+    return json_response([{'id': row_id, 'name': name, 'company': company} for _, row_id, name, company in rows])
 
 @app.route('/api/customers', methods=['POST'])
 @token_required
 def create_customer(current_user):
-    data = request.get_json()
+    values = customer_values(request.get_json())
     
-    if not data or not data.get('name') or not data.get('company') or not data.get('email'):
-        return jsonify({'error': 'Missing required fields'}), 400
-    
-    new_customer = Customer(
-        name=data.get('name'),
-        company=data.get('company'),
-        email=data.get('email'),
-        phone=data.get('phone', ''),
-        status=data.get('status', 'new'),
-        notes=data.get('notes', ''),
-        user_id=current_user.id
-    )
+    new_customer = Customer(**values, user_id=current_user.id)
     
     db.session.add(new_customer)
+    mark_changed(current_user.id, 'customers')
     db.session.commit()
     
-    return jsonify({
-        'id': new_customer.id,
-        'name': new_customer.name,
-        'company': new_customer.company,
-        'email': new_customer.email,
-        'phone': new_customer.phone,
-        'status': new_customer.status,
-        'notes': new_customer.notes,
-        'created_at': new_customer.created_at.isoformat()
-    }), 201
+    return json_response(CUSTOMER_SERIALIZER.instance(new_customer), 201)
 
 @app.route('/api/customers/<int:customer_id>', methods=['PUT'])
 @token_required
@@ -237,375 +1852,305 @@ def update_customer(current_user, customer_id):
     if not customer:
         return jsonify({'error': 'Customer not found'}), 404
     
-    data = request.get_json()
-    
-    if data.get('name'):
-        customer.name = data.get('name')
-    if data.get('company'):
-        customer.company = data.get('company')
-    if data.get('email'):
-        customer.email = data.get('email')
-    if data.get('phone') is not None:
-        customer.phone = data.get('phone')
-    if data.get('status'):
-        customer.status = data.get('status')
-    if data.get('notes') is not None:
-        customer.notes = data.get('notes')
+    apply_customer_changes(customer, request.get_json())
     
+    mark_changed(current_user.id, 'customers')
     db.session.commit()
     
-    return jsonify({
-        'id': customer.id,
-        'name': customer.name,
-        'company': customer.company,
-        'email': customer.email,
-        'phone': customer.phone,
-        'status': customer.status,
-        'notes': customer.notes,
-        'created_at': customer.created_at.isoformat()
-    }), 200
+    return json_response(CUSTOMER_SERIALIZER.instance(customer))
+
+def delete_customer_records(user_id, customer_ids):
+    """Delete the user's customers in customer_ids with their contacts, deals and related tasks.
+    
+    Runs a few set-based statements per chunk of ids in the current
+    transaction and never loads the rows, so the ORM delete events do not
+    fire: tombstones and pipeline deltas are written here instead. Marks the
+    affected collections changed; the caller commits. Returns the number of
+    rows deleted per entity.
+    """
+    connection = db.session.connection()
+    now = datetime.datetime.utcnow()
+    counts = dict.fromkeys(TOMBSTONE_ENTITIES.values(), 0)
+    ids = sorted(set(customer_ids))
+    chunk_size = app.config['CUSTOMER_DELETE_CHUNK_SIZE']
+    
+    for start in range(0, len(ids), chunk_size):
+        customers = (Customer.user_id == user_id) & Customer.id.in_(ids[start:start + chunk_size])
+        contacts = (Contact.user_id == user_id) & Contact.customer_id.in_(db.select(Customer.id).where(customers))
+        deals = (Deal.user_id == user_id) & Deal.customer_id.in_(db.select(Customer.id).where(customers))
+        tasks = (Task.user_id == user_id) & db.or_(
+            (Task.related_type == 'customer') & Task.related_id.in_(db.select(Customer.id).where(customers)),
+            (Task.related_type == 'contact') & Task.related_id.in_(db.select(Contact.id).where(contacts)),
+            (Task.related_type == 'deal') & Task.related_id.in_(db.select(Deal.id).where(deals)),
+        )
+        
+        deltas = {}
+        totals = connection.execute(db.select(
+            Deal.stage, Deal.close_date, db.func.count(Deal.id), db.func.sum(Deal.value)
+        ).where(deals).group_by(Deal.stage, Deal.close_date))
+        for stage, close_date, count, value in totals:
+            add_pipeline_delta(deltas, pipeline_key(user_id, stage, close_date), -count, -(value or 0))
+        apply_pipeline_deltas(connection, deltas)
+        
+        # Tasks go first because they are matched through contacts and deals,
+        # and customers last because contacts and deals reference them
+        for model, condition in ((Task, tasks), (Contact, contacts), (Deal, deals), (Customer, customers)):
+            entity = TOMBSTONE_ENTITIES[model]
+            connection.execute(db.insert(DeletedRecord).from_select(
+                ['entity', 'entity_id', 'user_id', 'deleted_at'],
+                db.select(db.literal(entity), model.id, model.user_id, db.literal(now, db.DateTime)).where(condition)
+            ))
+            counts[entity] += connection.execute(db.delete(model).where(condition)).rowcount
+    
+    changed = [entity for entity, count in counts.items() if count]
+    if changed:
+        mark_changed(user_id, *changed)
+    return counts
 
 @app.route('/api/customers/<int:customer_id>', methods=['DELETE'])
 @token_required
 def delete_customer(current_user, customer_id):
-    customer = Customer.query.filter_by(id=customer_id, user_id=current_user.id).first()
+    counts = delete_customer_records(current_user.id, [customer_id])
     
-    if not customer:
+    if not counts['customers']:
+        db.session.rollback()
         return jsonify({'error': 'Customer not found'}), 404
     
-    db.session.delete(customer)
     db.session.commit()
     
-    return jsonify({'message': 'Customer deleted'}), 200
+    return jsonify({'message': 'Customer deleted', 'deleted': counts}), 200
+
+def requested_customer_ids(data):
+    ids = data.get('ids') if isinstance(data, dict) else None
+    if not isinstance(ids, list) or not ids:
+        raise ApiError('Missing ids')
+    return [parse_id(value, 'ids') for value in ids]
+
+@app.route('/api/customers/delete', methods=['POST'])
+@token_required
+def delete_customers(current_user):
+    ids = requested_customer_ids(request.get_json())
+    if len(ids) > app.config['CUSTOMER_DELETE_MAX_IDS']:
+        return jsonify({'error': 'Too many ids; submit a delete_customers job instead'}), 400
+    
+    owned = owned_customer_ids(current_user.id, set(ids))
+    counts = delete_customer_records(current_user.id, owned)
+    db.session.commit()
+    
+    return jsonify({
+        'deleted': counts,
+        'not_found': sorted(set(ids) - owned)
+    }), 200
 
 # Contact API Routes
+def contact_list_query(user_id, fields):
+    """Contacts of user_id with the request's filters applied, selecting only fields."""
+    query = db.session.query(*CONTACT_SERIALIZER.columns(fields)).filter(Contact.user_id == user_id)
+    
+    if 'customer_name' in fields:
+        query = query.join(Customer, Contact.customer_id == Customer.id).add_columns(Customer.name.label('customer_name'))
+    if int_arg('customer_id'):
+        query = query.filter(Contact.customer_id == int_arg('customer_id'))
+    
+    return query
+
 @app.route('/api/contacts', methods=['GET'])
 @token_required
+@replica_reads
+@versioned('contacts')
 def get_contacts(current_user):
-    contacts = Contact.query.filter_by(user_id=current_user.id).all()
-    result = []
-    
-    for contact in contacts:
-        result.append({
-            'id': contact.id,
-            'name': contact.name,
-            'position': contact.position,
-            'email': contact.email,
-            'phone': contact.phone,
-            'notes': contact.notes,
-            'customer_id': contact.customer_id,
-            'customer_name': contact.customer.name,
-            'created_at': contact.created_at.isoformat()
-        })
+    fields = requested_fields(CONTACT_FIELDS)
+    contacts, next_cursor = paginate(contact_list_query(current_user.id, fields), Contact)
     
-    return jsonify(result), 200
+    return list_response(CONTACT_SERIALIZER, contacts, fields, next_cursor)
 
 @app.route('/api/contacts', methods=['POST'])
 @token_required
 def create_contact(current_user):
-    data = request.get_json()
-    
-    if not data or not data.get('name') or not data.get('email') or not data.get('customer_id'):
-        return jsonify({'error': 'Missing required fields'}), 400
+    values = contact_values(request.get_json())
     
     # Verify customer belongs to current user
-    customer = Customer.query.filter_by(id=data.get('customer_id'), user_id=current_user.id).first()
+    customer = Customer.query.filter_by(id=values['customer_id'], user_id=current_user.id).first()
     if not customer:
         return jsonify({'error': 'Customer not found'}), 404
     
-    new_contact = Contact(
-        name=data.get('name'),
-        position=data.get('position', ''),
-        email=data.get('email'),
-        phone=data.get('phone', ''),
-        notes=data.get('notes', ''),
-        customer_id=data.get('customer_id'),
-        user_id=current_user.id
-    )
+    new_contact = Contact(**values, user_id=current_user.id)
     
     db.session.add(new_contact)
+    mark_changed(current_user.id, 'contacts')
     db.session.commit()
     
-    return jsonify({
-        'id': new_contact.id,
-        'name': new_contact.name,
-        'position': new_contact.position,
-        'email': new_contact.email,
-        'phone': new_contact.phone,
-        'notes': new_contact.notes,
-        'customer_id': new_contact.customer_id,
-        'customer_name': customer.name,
-        'created_at': new_contact.created_at.isoformat()
-    }), 201
+    return json_response(CONTACT_SERIALIZER.instance(new_contact, customer_name=customer.name), 201)
 
 @app.route('/api/contacts/<int:contact_id>', methods=['PUT', 'DELETE'])
 @token_required
 def manage_contact(current_user, contact_id):
-    contact = Contact.query.filter_by(id=contact_id, user_id=current_user.id).first()
+    # Load the customer name in the same query; the PUT response needs it
+    contact = Contact.query.options(
+        db.joinedload(Contact.customer).load_only(Customer.name)
+    ).filter_by(id=contact_id, user_id=current_user.id).first()
     
     if not contact:
         return jsonify({'error': 'Contact not found'}), 404
     
     if request.method == 'PUT':
         data = request.get_json()
+        customer_name = contact.customer.name
         
-        if data.get('name'):
-            contact.name = data.get('name')
-        if data.get('position') is not None:
-            contact.position = data.get('position')
-        if data.get('email'):
-            contact.email = data.get('email')
-        if data.get('phone') is not None:
-            contact.phone = data.get('phone')
-        if data.get('notes') is not None:
-            contact.notes = data.get('notes')
         if data.get('customer_id'):
             # Verify customer belongs to current user
             customer = Customer.query.filter_by(id=data.get('customer_id'), user_id=current_user.id).first()
             if not customer:
                 return jsonify({'error': 'Customer not found'}), 404
-            contact.customer_id = data.get('customer_id')
+            customer_name = customer.name
         
+        apply_contact_changes(contact, data)
+        mark_changed(current_user.id, 'contacts')
         db.session.commit()
         
-        return jsonify({
-            'id': contact.id,
-            'name': contact.name,
-            'position': contact.position,
-            'email': contact.email,
-            'phone': contact.phone,
-            'notes': contact.notes,
-            'customer_id': contact.customer_id,
-            'customer_name': contact.customer.name,
-            'created_at': contact.created_at.isoformat()
-        }), 200
+        return json_response(CONTACT_SERIALIZER.instance(contact, customer_name=customer_name))
     
     elif request.method == 'DELETE':
         db.session.delete(contact)
+        mark_changed(current_user.id, 'contacts')
         db.session.commit()
         
         return jsonify({'message': 'Contact deleted'}), 200
 
 # Deal API Routes
+def deal_list_query(user_id, fields):
+    """Deals of user_id with the request's filters applied, selecting only fields."""
+    query = db.session.query(*DEAL_SERIALIZER.columns(fields)).filter(Deal.user_id == user_id)
+    
+    if 'customer_name' in fields:
+        query = query.join(Customer, Deal.customer_id == Customer.id).add_columns(Customer.name.label('customer_name'))
+    if request.args.get('stage'):
+        query = query.filter(Deal.stage == request.args.get('stage'))
+    if int_arg('customer_id'):
+        query = query.filter(Deal.customer_id == int_arg('customer_id'))
+    
+    return query
+
 @app.route('/api/deals', methods=['GET'])
 @token_required
+@replica_reads
+@versioned('deals')
 def get_deals(current_user):
-    deals = Deal.query.filter_by(user_id=current_user.id).all()
-    result = []
-    
-    for deal in deals:
-        close_date = deal.close_date.isoformat() if deal.close_date else None
-        result.append({
-            'id': deal.id,
-            'title': deal.title,
-            'value': deal.value,
-            'stage': deal.stage,
-            'close_date': close_date,
-            'notes': deal.notes,
-            'customer_id': deal.customer_id,
-            'customer_name': deal.customer.name,
-            'created_at': deal.created_at.isoformat()
-        })
+    fields = requested_fields(DEAL_FIELDS)
+    deals, next_cursor = paginate(deal_list_query(current_user.id, fields), Deal)
     
-    return jsonify(result), 200
+    return list_response(DEAL_SERIALIZER, deals, fields, next_cursor)
 
 @app.route('/api/deals', methods=['POST'])
 @token_required
 def create_deal(current_user):
-    data = request.get_json()
-    
-    if not data or not data.get('title') or not data.get('value') or not data.get('customer_id'):
-        return jsonify({'error': 'Missing required fields'}), 400
+    values = deal_values(request.get_json())
     
     # Verify customer belongs to current user
-    customer = Customer.query.filter_by(id=data.get('customer_id'), user_id=current_user.id).first()
+    customer = Customer.query.filter_by(id=values['customer_id'], user_id=current_user.id).first()
     if not customer:
         return jsonify({'error': 'Customer not found'}), 404
     
-    close_date = None
-    if data.get('close_date'):
-        try:
-            close_date = datetime.datetime.strptime(data.get('close_date'), '%Y-%m-%d').date()
-        except ValueError:
-            return jsonify({'error': 'Invalid date format'}), 400
-    
-    new_deal = Deal(
-        title=data.get('title'),
-        value=data.get('value'),
-        stage=data.get('stage', 'prospect'),
-        close_date=close_date,
-        notes=data.get('notes', ''),
-        customer_id=data.get('customer_id'),
-        user_id=current_user.id
-    )
+    new_deal = Deal(**values, user_id=current_user.id)
     
     db.session.add(new_deal)
+    mark_changed(current_user.id, 'deals')
     db.session.commit()
     
-    return jsonify({
-        'id': new_deal.id,
-        'title': new_deal.title,
-        'value': new_deal.value,
-        'stage': new_deal.stage,
-        'close_date': new_deal.close_date.isoformat() if new_deal.close_date else None,
-        'notes': new_deal.notes,
-        'customer_id': new_deal.customer_id,
-        'customer_name': customer.name,
-        'created_at': new_deal.created_at.isoformat()
-    }), 201
+    return json_response(DEAL_SERIALIZER.instance(new_deal, customer_name=customer.name), 201)
 
 @app.route('/api/deals/<int:deal_id>', methods=['PUT', 'DELETE'])
 @token_required
 def manage_deal(current_user, deal_id):
-    deal = Deal.query.filter_by(id=deal_id, user_id=current_user.id).first()
+    # Load the customer name in the same query; the PUT response needs it
+    deal = Deal.query.options(
+        db.joinedload(Deal.customer).load_only(Customer.name)
+    ).filter_by(id=deal_id, user_id=current_user.id).first()
     
     if not deal:
         return jsonify({'error': 'Deal not found'}), 404
     
     if request.method == 'PUT':
         data = request.get_json()
+        customer_name = deal.customer.name
         
-        if data.get('title'):
-            deal.title = data.get('title')
-        if data.get('value') is not None:
-            deal.value = data.get('value')
-        if data.get('stage'):
-            deal.stage = data.get('stage')
-        if data.get('close_date'):
-            try:
-                deal.close_date = datetime.datetime.strptime(data.get('close_date'), '%Y-%m-%d').date()
-            except ValueError:
-                return jsonify({'error': 'Invalid date format'}), 400
-        if data.get('notes') is not None:
-            deal.notes = data.get('notes')
         if data.get('customer_id'):
             # Verify customer belongs to current user
             customer = Customer.query.filter_by(id=data.get('customer_id'), user_id=current_user.id).first()
             if not customer:
                 return jsonify({'error': 'Customer not found'}), 404
-            deal.customer_id = data.get('customer_id')
+            customer_name = customer.name
         
+        apply_deal_changes(deal, data)
+        mark_changed(current_user.id, 'deals')
         db.session.commit()
         
-        return jsonify({
-            'id': deal.id,
-            'title': deal.title,
-            'value': deal.value,
-            'stage': deal.stage,
-            'close_date': deal.close_date.isoformat() if deal.close_date else None,
-            'notes': deal.notes,
-            'customer_id': deal.customer_id,
-            'customer_name': deal.customer.name,
-            'created_at': deal.created_at.isoformat()
-        }), 200
+        return json_response(DEAL_SERIALIZER.instance(deal, customer_name=customer_name))
     
     elif request.method == 'DELETE':
         db.session.delete(deal)
+        mark_changed(current_user.id, 'deals')
         db.session.commit()
         
         return jsonify({'message': 'Deal deleted'}), 200
 
 # Task API Routes
+def task_list_query(user_id, fields):
+    """Tasks of user_id with the request's filters applied, selecting only fields."""
+    query = db.session.query(*TASK_SERIALIZER.columns(fields)).filter(Task.user_id == user_id)
+    
+    if request.args.get('status'):
+        query = query.filter(Task.status == request.args.get('status'))
+    if request.args.get('priority'):
+        query = query.filter(Task.priority == request.args.get('priority'))
+    if request.args.get('related_type'):
+        query = query.filter(Task.related_type == request.args.get('related_type'))
+    if date_arg('due_before'):
+        query = query.filter(Task.due_date < date_arg('due_before'))
+    
+    return query
+
+def task_computed_fields(user_id, tasks, fields):
+    """Resolve related_name for a batch of task rows with one query per related type."""
+    if 'related_name' not in fields:
+        return {}
+    
+    related_names = resolve_related_names(user_id, [(task.related_type, task.related_id) for task in tasks])
+    return {'related_name': lambda task: related_names.get(related_key(task.related_type, task.related_id), "")}
+
 @app.route('/api/tasks', methods=['GET'])
 @token_required
+@replica_reads
+@versioned('tasks')
 def get_tasks(current_user):
-    tasks = Task.query.filter_by(user_id=current_user.id).all()
-    result = []
-    
-    for task in tasks:
-        related_name = ""
-        if task.related_type == 'customer' and task.related_id:
-            related = Customer.query.filter_by(id=task.related_id, user_id=current_user.id).first()
-            related_name = related.name if related else ""
-        elif task.related_type == 'contact' and task.related_id:
-            related = Contact.query.filter_by(id=task.related_id, user_id=current_user.id).first()
-            related_name = related.name if related else ""
-        elif task.related_type == 'deal' and task.related_id:
-            related = Deal.query.filter_by(id=task.related_id, user_id=current_user.id).first()
-            related_name = related.title if related else ""
-        
-        result.append({
-            'id': task.id,
-            'title': task.title,
-            'related_type': task.related_type,
-            'related_id': task.related_id,
-            'related_name': related_name,
-            'due_date': task.due_date.isoformat(),
-            'priority': task.priority,
-            'status': task.status,
-            'description': task.description,
-            'created_at': task.created_at.isoformat()
-        })
+    fields = requested_fields(TASK_FIELDS)
+    tasks, next_cursor = paginate(task_list_query(current_user.id, fields), Task)
     
-    return jsonify(result), 200
+    return list_response(TASK_SERIALIZER, tasks, fields, next_cursor, task_computed_fields(current_user.id, tasks, fields))
 
 @app.route('/api/tasks', methods=['POST'])
 @token_required
 def create_task(current_user):
     data = request.get_json()
-    
-    if not data or not data.get('title') or not data.get('due_date'):
-        return jsonify({'error': 'Missing required fields'}), 400
-    
-    related_id = data.get('related_id')
-    related_type = data.get('related_type', '')
+    values = task_values(data)
     
     # Verify related entity belongs to current user if provided
-    if related_type and related_id:
-        if related_type == 'customer':
-            related = Customer.query.filter_by(id=related_id, user_id=current_user.id).first()
-        elif related_type == 'contact':
-            related = Contact.query.filter_by(id=related_id, user_id=current_user.id).first()
-        elif related_type == 'deal':
-            related = Deal.query.filter_by(id=related_id, user_id=current_user.id).first()
-        else:
-            related = None
+    related_name = ""
+    if values['related_type'] and data.get('related_id'):
+        key = related_key(values['related_type'], data.get('related_id'))
+        related_names = resolve_related_names(current_user.id, [key])
         
-        if not related:
+        if key not in related_names:
             return jsonify({'error': 'Related entity not found'}), 404
+        related_name = related_names[key]
     
-    try:
-        due_date = datetime.datetime.strptime(data.get('due_date'), '%Y-%m-%d').date()
-    except ValueError:
-        return jsonify({'error': 'Invalid date format'}), 400
-    
-    new_task = Task(
-        title=data.get('title'),
-        related_type=related_type,
-        related_id=related_id,
-        due_date=due_date,
-        priority=data.get('priority', 'medium'),
-        status=data.get('status', 'pending'),
-        description=data.get('description', ''),
-        user_id=current_user.id
-    )
+    new_task = Task(**values, user_id=current_user.id)
     
     db.session.add(new_task)
+    mark_changed(current_user.id, 'tasks')
     db.session.commit()
     
-    related_name = ""
-    if related_type == 'customer' and related_id:
-        related = Customer.query.filter_by(id=related_id).first()
-        related_name = related.name if related else ""
-    elif related_type == 'contact' and related_id:
-        related = Contact.query.filter_by(id=related_id).first()
-        related_name = related.name if related else ""
-    elif related_type == 'deal' and related_id:
-        related = Deal.query.filter_by(id=related_id).first()
-        related_name = related.title if related else ""
-    
-    return jsonify({
-        'id': new_task.id,
-        'title': new_task.title,
-        'related_type': new_task.related_type,
-        'related_id': new_task.related_id,
-        'related_name': related_name,
-        'due_date': new_task.due_date.isoformat(),
-        'priority': new_task.priority,
-        'status': new_task.status,
-        'description': new_task.description,
-        'created_at': new_task.created_at.isoformat()
-    }), 201
+    return json_response(TASK_SERIALIZER.instance(new_task, related_name=related_name), 201)
 
 @app.route('/api/tasks/<int:task_id>', methods=['PUT', 'DELETE'])
 @token_required
@@ -618,73 +2163,24 @@ def manage_task(current_user, task_id):
     if request.method == 'PUT':
         data = request.get_json()
         
-        if data.get('title'):
-            task.title = data.get('title')
-        
-        if data.get('related_type') is not None or data.get('related_id') is not None:
-            related_type = data.get('related_type', task.related_type)
-            related_id = data.get('related_id', task.related_id)
-            
-            # Verify related entity belongs to current user if provided
-            if related_type and related_id:
-                if related_type == 'customer':
-                    related = Customer.query.filter_by(id=related_id, user_id=current_user.id).first()
-                elif related_type == 'contact':
-                    related = Contact.query.filter_by(id=related_id, user_id=current_user.id).first()
-                elif related_type == 'deal':
-                    related = Deal.query.filter_by(id=related_id, user_id=current_user.id).first()
-                else:
-                    related = None
-                
-                if not related:
-                    return jsonify({'error': 'Related entity not found'}), 404
-            
-            task.related_type = related_type
-            task.related_id = related_id
-        
-        if data.get('due_date'):
-            try:
-                task.due_date = datetime.datetime.strptime(data.get('due_date'), '%Y-%m-%d').date()
-            except ValueError:
-                return jsonify({'error': 'Invalid date format'}), 400
-        
-        if data.get('priority'):
-            task.priority = data.get('priority')
-        
-        if data.get('status'):
-            task.status = data.get('status')
-        
-        if data.get('description') is not None:
-            task.description = data.get('description')
+        # Verify related entity belongs to current user if provided
+        related = task_related_change(task, data)
+        if related and related[0] and related[1]:
+            if related_key(*related) not in resolve_related_names(current_user.id, [related]):
+                return jsonify({'error': 'Related entity not found'}), 404
         
+        apply_task_changes(task, data)
+        mark_changed(current_user.id, 'tasks')
         db.session.commit()
         
-        related_name = ""
-        if task.related_type == 'customer' and task.related_id:
-            related = Customer.query.filter_by(id=task.related_id).first()
-            related_name = related.name if related else ""
-        elif task.related_type == 'contact' and task.related_id:
-            related = Contact.query.filter_by(id=task.related_id).first()
-            related_name = related.name if related else ""
-        elif task.related_type == 'deal' and task.related_id:
-            related = Deal.query.filter_by(id=task.related_id).first()
-            related_name = related.title if related else ""
+        key = related_key(task.related_type, task.related_id)
+        related_name = resolve_related_names(current_user.id, [key]).get(key, "")
         
-        return jsonify({
-            'id': task.id,
-            'title': task.title,
-            'related_type': task.related_type,
-            'related_id': task.related_id,
-            'related_name': related_name,
-            'due_date': task.due_date.isoformat(),
-            'priority': task.priority,
-            'status': task.status,
-            'description': task.description,
-            'created_at': task.created_at.isoformat()
-        }), 200
+        return json_response(TASK_SERIALIZER.instance(task, related_name=related_name))
     
     elif request.method == 'DELETE':
         db.session.delete(task)
+        mark_changed(current_user.id, 'tasks')
         db.session.commit()
         
         return jsonify({'message': 'Task deleted'}), 200
@@ -692,69 +2188,1034 @@ def manage_task(current_user, task_id):
 # Dashboard API
 @app.route('/api/dashboard', methods=['GET'])
 @token_required
+@replica_reads
+@versioned('dashboard')
 def get_dashboard(current_user):
-    # Get customer count
-    customer_count = Customer.query.filter_by(user_id=current_user.id).count()
-    
-    # Get open deals count
-    open_deals = Deal.query.filter(
-        Deal.user_id == current_user.id,
-        Deal.stage.in_(['prospect', 'negotiation', 'proposal'])
-    ).count()
-    
-    # Get current month's revenue
-    current_date = datetime.datetime.now()
-    start_of_month = datetime.datetime(current_date.year, current_date.month, 1)
-    end_of_month = (start_of_month.replace(month=start_of_month.month % 12 + 1, day=1) if start_of_month.month < 12 
-                   else start_of_month.replace(year=start_of_month.year + 1, month=1, day=1)) - datetime.timedelta(days=1)
-    
-    month_revenue = db.session.query(db.func.sum(Deal.value)).filter(
-        Deal.user_id == current_user.id,
-        Deal.stage == 'won',
-        Deal.close_date.between(start_of_month.date(), end_of_month.date())
-    ).scalar() or 0
-    
-    # Get pending tasks count
-    pending_tasks = Task.query.filter(
-        Task.user_id == current_user.id,
+    return json_response(build_dashboard(current_user.id))
+
+def build_dashboard(user_id):
+    """Compute the dashboard summary in two queries: the totals and the recent activity."""
+    today = datetime.date.today()
+    start_of_month = today.replace(day=1)
+    start_of_next_month = (start_of_month + datetime.timedelta(days=32)).replace(day=1)
+    
+    customer_count = db.select(db.func.count(Customer.id)).where(
+        Customer.user_id == user_id
+    ).scalar_subquery()
+    pending_tasks = db.select(db.func.count(Task.id)).where(
+        Task.user_id == user_id,
         Task.status.in_(['pending', 'in_progress'])
-    ).count()
+    ).scalar_subquery()
+    
+    # Open deals and the current month's revenue share one pass over the deals
+    totals = db.session.query(
+        customer_count.label('customer_count'),
+        pending_tasks.label('pending_tasks'),
+        db.func.count(db.case((Deal.stage.in_(['prospect', 'negotiation', 'proposal']), 1))).label('open_deals'),
+        db.func.sum(db.case((db.and_(
+            Deal.stage == 'won',
+            Deal.close_date >= start_of_month,
+            Deal.close_date < start_of_next_month
+        ), Deal.value))).label('month_revenue')
+    ).filter(Deal.user_id == user_id).one()
+    
+    # Recent activity: the latest 3 customers and 3 deals in one UNION ALL
+    recent_customers = db.select(
+        db.literal_column("'customer'").label('type'),
+        Customer.name.label('label'),
+        db.null().label('value'),
+        Customer.created_at
+    ).where(Customer.user_id == user_id).order_by(Customer.created_at.desc()).limit(3).subquery()
+    recent_deals = db.select(
+        db.literal_column("'deal'").label('type'),
+        Deal.title.label('label'),
+        Deal.value.label('value'),
+        Deal.created_at
+    ).where(Deal.user_id == user_id).order_by(Deal.created_at.desc()).limit(3).subquery()
+    recent = db.session.execute(db.union_all(
+        db.select(recent_customers),
+        db.select(recent_deals)
+    )).all()
     
-    # Get recent activity
     recent_activities = []
-    
-    # Recent customers
-    recent_customers = Customer.query.filter_by(user_id=current_user.id).order_by(Customer.created_at.desc()).limit(3).all()
-    for customer in recent_customers:
-        recent_activities.append({
-            'type': 'customer',
-            'message': f'Se agregó el cliente {customer.name}',
-            'time': customer.created_at.isoformat()
-        })
-    
-    # Recent deals
-    recent_deals = Deal.query.filter_by(user_id=current_user.id).order_by(Deal.created_at.desc()).limit(3).all()
-    for deal in recent_deals:
+    for activity in recent:
+        if activity.type == 'customer':
+            message = f'Se agregó el cliente {activity.label}'
+        else:
+            message = f'Se creó la oportunidad {activity.label} por ${activity.value}'
         recent_activities.append({
-            'type': 'deal',
-            'message': f'Se creó la oportunidad {deal.title} por ${deal.value}',
-            'time': deal.created_at.isoformat()
+            'type': activity.type,
+            'message': message,
+            'time': activity.created_at.isoformat()
         })
     
     # Sort activities by time
     recent_activities.sort(key=lambda x: x['time'], reverse=True)
     recent_activities = recent_activities[:5]  # Limit to 5 activities
     
-    return jsonify({
-        'customer_count': customer_count,
-        'open_deals': open_deals,
-        'month_revenue': month_revenue,
-        'pending_tasks': pending_tasks,
+    return {
+        'customer_count': totals.customer_count,
+        'open_deals': totals.open_deals,
+        'month_revenue': totals.month_revenue or 0,
+        'pending_tasks': totals.pending_tasks,
         'recent_activities': recent_activities
+    }
+
+# Analytics API
+# Win probability per stage for the weighted forecast
+STAGE_PROBABILITIES = {'prospect': 0.1, 'proposal': 0.4, 'negotiation': 0.6, 'won': 1.0, 'lost': 0.0}
+OPEN_STAGES = ('prospect', 'negotiation', 'proposal')
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+@app.route('/api/analytics/pipeline', methods=['GET'])
+@token_required
+@replica_reads
+@versioned('pipeline')
+def get_pipeline(current_user):
+    """Pipeline value per stage, won revenue per month and the weighted forecast by close month.
+    
+    Reads only PipelineSummary, so the cost does not grow with the number of deals.
+    """
+    won_months = max(1, min(int_arg('months') or 24, 120))
+    forecast_months = max(1, min(int_arg('forecast_months') or 12, 60))
+    this_month = datetime.date.today().replace(day=1)
+    
+    rows = db.session.query(
+        PipelineSummary.stage, PipelineSummary.close_month, PipelineSummary.deal_count, PipelineSummary.total_value
+    ).filter(PipelineSummary.user_id == current_user.id, PipelineSummary.deal_count != 0).all()
+    
+    def bucket():
+        return {'count': 0, 'value': 0.0, 'weighted_value': 0.0}
+    
+    stages = {stage: bucket() for stage in STAGE_PROBABILITIES}
+    won = {add_months(this_month, -offset): bucket() for offset in reversed(range(won_months))}
+    forecast = {add_months(this_month, offset): bucket() for offset in range(forecast_months)}
+    overdue = bucket()
+    undated = bucket()
+    
+    for stage, month, count, value in rows:
+        probability = STAGE_PROBABILITIES.get(stage, 0)
+        targets = [stages.setdefault(stage, bucket())]
+        if stage == 'won' and month in won:
+            targets.append(won[month])
+        elif stage in OPEN_STAGES:
+            if month == UNDATED_MONTH:
+                targets.append(undated)
+            elif month < this_month:
+                targets.append(overdue)
+            elif month in forecast:
+                targets.append(forecast[month])
+        
+        for target in targets:
+            target['count'] += count
+            target['value'] += value
+            target['weighted_value'] += value * probability
+    
+    def totals(values):
+        return {
+            'count': values['count'],
+            'value': round(values['value'], 2),
+            'weighted_value': round(values['weighted_value'], 2)
+        }
+    
+    return json_response({
+        'stages': [
+            {'stage': stage, 'probability': STAGE_PROBABILITIES.get(stage, 0), **totals(values)}
+            for stage, values in stages.items()
+        ],
+        'won_by_month': [
+            {'month': month.strftime('%Y-%m'), 'count': values['count'], 'revenue': round(values['value'], 2)}
+            for month, values in won.items()
+        ],
+        'forecast': {
+            'months': [{'month': month.strftime('%Y-%m'), **totals(values)} for month, values in forecast.items()],
+            'overdue': totals(overdue),
+            'undated': totals(undated)
+        }
+    })
+
+# Import API
+IMPORT_ENTITIES = {
+    'customers': (Customer, customer_values),
+    'contacts': (Contact, contact_values),
+    'deals': (Deal, deal_values),
+}
+
+def read_import_rows(import_format, stream):
+    """Yield the uploaded rows one at a time straight from a binary stream.
+    
+    Rows that cannot be decoded are yielded as ApiError instances so they
+    show up in the error report instead of aborting the import. CSV that is
+    not valid UTF-8 or breaks the CSV syntax cannot be read past that point,
+    so it raises ApiError, naming the row; batches before it stay imported.
+    """
+    if import_format == 'csv':
+        # Decoded a line at a time, so a decoding error is raised at its own row
+        lines = (line.decode('utf-8-sig' if index == 0 else 'utf-8') for index, line in enumerate(stream))
+        reader = csv.DictReader(lines)
+        for row_number in itertools.count(1):
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except UnicodeDecodeError:
+                raise ApiError(f'Row {row_number}: invalid UTF-8')
+            except csv.Error as error:
+                raise ApiError(f'Row {row_number}: {error}')
+            yield row
+    
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield ApiError('Invalid JSON')
+            continue
+        yield row if isinstance(row, dict) else ApiError('Row must be a JSON object')
+
+def request_import_format():
+    import_format = request.args.get('format') or ('csv' if request.mimetype == 'text/csv' else 'ndjson')
+    if import_format not in ('csv', 'ndjson'):
+        raise ApiError('Unsupported format')
+    return import_format
+
+def import_rows(user_id, entity, rows, progress=None, checkpoint=None):
+    """Validate and insert rows in batches of one transaction each; return the report.
+    
+    progress is the report of an interrupted run: the rows it counted are
+    skipped and its totals carried on. checkpoint, if given, is called with
+    the report before each commit so it can be saved in the same transaction.
+    """
+    model, to_values = IMPORT_ENTITIES[entity]
+    progress = dict(progress or {'rows': 0, 'imported': 0, 'error_count': 0, 'errors': []})
+    rows = itertools.islice(enumerate(rows, start=1), progress['rows'], None)
+    
+    def report(row_number, message):
+        progress['error_count'] += 1
+        if len(progress['errors']) < app.config['IMPORT_MAX_ERRORS']:
+            progress['errors'].append({'row': row_number, 'error': message})
+    
+    # Each batch is validated, ownership-checked and inserted in its own transaction
+    while True:
+        batch = list(itertools.islice(rows, app.config['IMPORT_BATCH_SIZE']))
+        if not batch:
+            break
+        
+        valid = []
+        for row_number, data in batch:
+            try:
+                if isinstance(data, ApiError):
+                    raise data
+                valid.append((row_number, to_values(data)))
+            except ApiError as error:
+                report(row_number, error.message)
+        
+        progress['rows'] = batch[-1][0]
+        
+        if 'customer_id' in model.__table__.columns:
+            owned = owned_customer_ids(user_id, {values['customer_id'] for _, values in valid})
+            for row_number, values in valid:
+                if values['customer_id'] not in owned:
+                    report(row_number, 'Customer not found')
+            valid = [(row_number, values) for row_number, values in valid if values['customer_id'] in owned]
+        
+        if valid:
+            now = datetime.datetime.utcnow()
+            db.session.execute(db.insert(model), [
+                dict(values, user_id=user_id, created_at=now, updated_at=now)
+                for _, values in valid
+            ])
+            if model is Deal:
+                deltas = {}
+                for _, values in valid:
+                    key = pipeline_key(user_id, values.get('stage'), values.get('close_date'))
+                    add_pipeline_delta(deltas, key, 1, values['value'])
+                apply_pipeline_deltas(db.session.connection(), deltas)
+            mark_changed(user_id, entity)
+            progress['imported'] += len(valid)
+        
+        if valid or checkpoint:
+            if checkpoint:
+                checkpoint(progress)
+            db.session.commit()
+    
+    return progress
+
+@app.route('/api/import/<entity>', methods=['POST'])
+@token_required
+def import_records(current_user, entity):
+    if entity not in IMPORT_ENTITIES:
+        return jsonify({'error': 'Unknown entity'}), 404
+    
+    import_format = request_import_format()
+    report = import_rows(current_user.id, entity, read_import_rows(import_format, request.stream))
+    
+    return jsonify({
+        'imported': report['imported'],
+        'error_count': report['error_count'],
+        'errors': report['errors']
     }), 200
 
+# Export API
+# entity -> (model, serializer, list query builder, computed fields builder)
+EXPORT_ENTITIES = {
+    'customers': (Customer, CUSTOMER_SERIALIZER, customer_list_query, None),
+    'contacts': (Contact, CONTACT_SERIALIZER, contact_list_query, None),
+    'deals': (Deal, DEAL_SERIALIZER, deal_list_query, None),
+    'tasks': (Task, TASK_SERIALIZER, task_list_query, task_computed_fields),
+}
+
+def encode_csv(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue().encode()
+
+def encode_ndjson(records):
+    return b''.join(dumps(record) + b'\n' for record in records)
+
+EXPORT_MIMETYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+def export_chunks(user_id, entity, export_format):
+    """Check the request's export options and return a generator of encoded chunks."""
+    model, serializer, build_query, build_computed = EXPORT_ENTITIES[entity]
+    fields = requested_fields(serializer.fields)
+    chunk_size = app.config['EXPORT_CHUNK_SIZE']
+    # yield_per streams through a server-side cursor where the driver supports one
+    query = build_query(user_id, fields).order_by(model.created_at, model.id).yield_per(chunk_size)
+    
+    def generate():
+        if export_format == 'csv':
+            yield encode_csv([fields])
+        
+        rows = iter(query)
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if not chunk:
+                break
+            computed = build_computed(user_id, chunk, fields) if build_computed else None
+            if export_format == 'csv':
+                yield encode_csv(serializer.rows(chunk, fields, computed, text=True))
+            else:
+                yield encode_ndjson(serializer.dicts(chunk, fields, computed))
+    
+    return generate()
+
+@app.route('/api/export/<entity>', methods=['GET'])
+@token_required
+@replica_reads
+def export_records(current_user, entity):
+    if entity not in EXPORT_ENTITIES:
+        return jsonify({'error': 'Unknown entity'}), 404
+    
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_MIMETYPES:
+        return jsonify({'error': 'Unsupported format'}), 400
+    
+    # Compressed as it streams by compress_response
+    chunks = export_chunks(current_user.id, entity, export_format)
+    response = app.response_class(stream_with_context(chunks), mimetype=EXPORT_MIMETYPES[export_format])
+    response.headers['Content-Disposition'] = f'attachment; filename={entity}.{export_format}'
+    return response
+
+# Batch API
+# entity -> (model, create values builder, partial update applier)
+BATCH_ENTITIES = {
+    'customers': (Customer, customer_values, apply_customer_changes),
+    'contacts': (Contact, contact_values, apply_contact_changes),
+    'deals': (Deal, deal_values, apply_deal_changes),
+    'tasks': (Task, task_values, apply_task_changes),
+}
+
+def parse_batch_operation(operation):
+    if not isinstance(operation, dict):
+        raise ApiError('Invalid operation')
+    if operation.get('entity') not in BATCH_ENTITIES:
+        raise ApiError('Unknown entity')
+    if operation.get('op') not in ('create', 'update', 'delete'):
+        raise ApiError('Unknown op')
+    
+    data = operation.get('data') or {}
+    if not isinstance(data, dict):
+        raise ApiError('Invalid data')
+    
+    parsed = {'op': operation['op'], 'entity': operation['entity'], 'data': data, 'id': None, 'values': None}
+    if parsed['op'] == 'create':
+        parsed['values'] = BATCH_ENTITIES[parsed['entity']][1](data)
+    else:
+        parsed['id'] = parse_id(operation.get('id'), 'id')
+    return parsed
+
+@app.route('/api/batch', methods=['POST'])
+@token_required
+def batch_write(current_user):
+    """Apply create/update/delete operations across entities in one transaction.
+    
+    Ownership of every referenced record, customer and related entity is
+    checked up front with one IN query per entity type. If any operation
+    fails nothing is written and the failing operations are reported.
+    """
+    data = request.get_json()
+    operations = data.get('operations') if isinstance(data, dict) else None
+    
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'error': 'Missing operations'}), 400
+    if len(operations) > app.config['BATCH_MAX_OPERATIONS']:
+        return jsonify({'error': 'Too many operations'}), 400
+    
+    parsed = {}
+    errors = {}
+    for index, operation in enumerate(operations):
+        try:
+            parsed[index] = parse_batch_operation(operation)
+        except ApiError as error:
+            errors[index] = error
+    
+    # Load every record targeted by an update or delete, one query per entity
+    records = {}
+    for entity, (model, _, _) in BATCH_ENTITIES.items():
+        ids = {op['id'] for op in parsed.values() if op['entity'] == entity and op['id'] is not None}
+        if ids:
+            for record in model.query.filter(model.user_id == current_user.id, model.id.in_(ids)):
+                records[(entity, record.id)] = record
+    
+    for index, op in parsed.items():
+        if op['id'] is not None and (op['entity'], op['id']) not in records:
+            errors[index] = ApiError(f"{BATCH_ENTITIES[op['entity']][0].__name__} not found", 404)
+    
+    # Verify customer and related-entity references in bulk
+    customer_refs = {}
+    related_refs = {}
+    for index, op in parsed.items():
+        if index in errors:
+            continue
+        if op['entity'] in ('contacts', 'deals'):
+            customer_id = op['values']['customer_id'] if op['values'] else op['data'].get('customer_id')
+            if customer_id and op['op'] != 'delete':
+                try:
+                    customer_refs[index] = parse_id(customer_id, 'customer_id')
+                except ApiError as error:
+                    errors[index] = error
+        elif op['entity'] == 'tasks' and op['op'] != 'delete':
+            if op['op'] == 'create':
+                related = (op['values']['related_type'], op['data'].get('related_id'))
+            else:
+                related = task_related_change(records[('tasks', op['id'])], op['data'])
+            if related and related[0] and related[1]:
+                related_refs[index] = related_key(*related)
+    
+    owned_customers = owned_customer_ids(current_user.id, set(customer_refs.values()))
+    related_names = resolve_related_names(current_user.id, related_refs.values())
+    for index, customer_id in customer_refs.items():
+        if customer_id not in owned_customers:
+            errors[index] = ApiError('Customer not found', 404)
+    for index, key in related_refs.items():
+        if key not in related_names:
+            errors[index] = ApiError('Related entity not found', 404)
+    
+    # Apply the operations; nothing reaches the database until the flush
+    created = {}
+    deleted_customers = set()
+    if not errors:
+        for index, op in parsed.items():
+            model, _, apply_changes = BATCH_ENTITIES[op['entity']]
+            try:
+                if op['op'] == 'create':
+                    created[index] = model(**op['values'], user_id=current_user.id)
+                    db.session.add(created[index])
+                elif op['op'] == 'update':
+                    apply_changes(records[(op['entity'], op['id'])], op['data'])
+                elif op['entity'] == 'customers':
+                    # Cascaded after the flush, with the rest of the batch written
+                    deleted_customers.add(op['id'])
+                else:
+                    db.session.delete(records[(op['entity'], op['id'])])
+            except ApiError as error:
+                errors[index] = error
+    
+    if errors:
+        db.session.rollback()
+        return jsonify({
+            'error': 'Batch rejected',
+            'errors': [
+                {'index': index, 'error': errors[index].message, 'status': errors[index].status}
+                for index in sorted(errors)
+            ]
+        }), 400
+    
+    db.session.flush()
+    results = []
+    for index, op in parsed.items():
+        results.append({
+            'index': index,
+            'op': op['op'],
+            'entity': op['entity'],
+            'id': created[index].id if index in created else op['id'],
+            'status': 201 if op['op'] == 'create' else 200
+        })
+    if deleted_customers:
+        for customer_id in deleted_customers:
+            db.session.expunge(records[('customers', customer_id)])
+        delete_customer_records(current_user.id, deleted_customers)
+    mark_changed(current_user.id, *{op['entity'] for op in parsed.values()})
+    db.session.commit()
+    
+    return jsonify({'results': results}), 200
+
+# Search API
+# Searchable tables -> (column returned as label, columns indexed for search).
+# Postgres keeps a generated tsvector column with a GIN index on each table;
+# SQLite keeps an external-content FTS5 table per table, synced by triggers.
+# Both live in the database, so every write path stays indexed.
+SEARCH_TABLES = {
+    'customer': ('name', ('name', 'company', 'email', 'notes')),
+    'contact': ('name', ('name', 'position', 'email', 'notes')),
+    'deal': ('title', ('title', 'notes')),
+    'task': ('title', ('title', 'description')),
+}
+
+def search_sql(dialect, table, label):
+    """Ranked match query for one table; lower rank sorts first."""
+    if dialect == 'postgresql':
+        return (
+            f"SELECT '{table}' AS type, {table}.id AS id, {table}.{label} AS label, "
+            f"-ts_rank({table}.search_vector, to_tsquery('simple', :query)) AS rank "
+            f"FROM {table} WHERE {table}.user_id = :user_id "
+            f"AND {table}.search_vector @@ to_tsquery('simple', :query)"
+        )
+    # CROSS JOIN makes SQLite run the MATCH first and look rows up by rowid.
+    # Left to choose, the planner starts from the user's rows in a user_id
+    # index and queries the FTS table once per row, which is far slower
+    return (
+        f"SELECT '{table}' AS type, {table}.id AS id, {table}.{label} AS label, "
+        f"bm25({table}_search) AS rank "
+        f"FROM {table}_search CROSS JOIN {table} ON {table}.id = {table}_search.rowid "
+        f"WHERE {table}_search MATCH :query AND {table}.user_id = :user_id"
+    )
+
+def search_query_text(dialect, q):
+    """Turn free text into a prefix-matching query every term must satisfy."""
+    terms = re.findall(r'\w+', q)
+    if dialect == 'postgresql':
+        return ' & '.join(f'{term}:*' for term in terms)
+    return ' '.join(f'"{term}"*' for term in terms)
+
+@app.route('/api/search', methods=['GET'])
+@token_required
+def search(current_user):
+    dialect = db.engine.dialect.name
+    if dialect not in ('postgresql', 'sqlite'):
+        return jsonify({'error': 'Search is not available on this database'}), 501
+    
+    query_text = search_query_text(dialect, request.args.get('q', ''))
+    if not query_text:
+        return jsonify([]), 200
+    
+    types = request.args.get('types')
+    tables = [table for table in SEARCH_TABLES if not types or table in types.split(',')]
+    if not tables:
+        return jsonify({'error': 'Unknown types'}), 400
+    
+    limit = max(1, min(int_arg('limit') or app.config['PAGE_SIZE'], app.config['MAX_PAGE_SIZE']))
+    offset = int_arg('cursor') or 0
+    if offset < 0:
+        raise ApiError('Invalid cursor')
+    
+    sql = ' UNION ALL '.join(search_sql(dialect, table, SEARCH_TABLES[table][0]) for table in tables)
+    rows = db.session.execute(
+        db.text(f'SELECT type, id, label FROM ({sql}) AS matches ORDER BY rank, type, id LIMIT :limit OFFSET :offset'),
+        {'query': query_text, 'user_id': current_user.id, 'limit': limit + 1, 'offset': offset}
+    ).all()
+    
+    response = jsonify([{'type': row.type, 'id': row.id, 'label': row.label} for row in rows[:limit]])
+    if len(rows) > limit:
+        response.headers['X-Next-Cursor'] = str(offset + limit)
+    return response, 200
+
+# Sync API
+def encode_sync_cursor(positions):
+    raw = json.dumps({entity: [moment.isoformat(), row_id] for entity, (moment, row_id) in positions.items()})
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_sync_cursor(cursor):
+    """Per-entity (timestamp, id) positions; everything starts at the epoch."""
+    positions = {entity: (datetime.datetime.min, 0) for entity in list(EXPORT_ENTITIES) + ['deleted']}
+    if not cursor:
+        return positions
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        for entity, (moment, row_id) in raw.items():
+            if entity in positions:
+                positions[entity] = (datetime.datetime.fromisoformat(moment), int(row_id))
+    except (ValueError, TypeError, AttributeError):
+        raise ApiError('Invalid cursor')
+    return positions
+
+@app.route('/api/sync', methods=['GET'])
+@token_required
+def sync(current_user):
+    """Return records created, updated or deleted since the ?since= cursor.
+    
+    Each entity is read in (updated_at, id) order from its own position in
+    the cursor, up to SYNC_PAGE_SIZE rows, and only up to a watermark a few
+    seconds in the past so rows from transactions still in flight are not
+    skipped. Call again with the returned cursor while has_more is true.
+    
+    Names derived from other records (DERIVED_FIELDS) are left out: renaming
+    a customer does not touch the rows showing its name, so a synced copy
+    would keep the old one. Clients join them from the synced records.
+    """
+    positions = decode_sync_cursor(request.args.get('since'))
+    until = datetime.datetime.utcnow() - datetime.timedelta(seconds=app.config['SYNC_LAG_SECONDS'])
+    page_size = app.config['SYNC_PAGE_SIZE']
+    result = {}
+    has_more = False
+    
+    def read_page(query, moment_column, id_column, entity):
+        nonlocal has_more
+        rows = query.filter(
+            db.tuple_(moment_column, id_column) > db.tuple_(*positions[entity]),
+            moment_column < until
+        ).order_by(moment_column, id_column).limit(page_size + 1).all()
+        
+        if len(rows) > page_size:
+            has_more = True
+            rows = rows[:page_size]
+            last = rows[-1]._mapping
+            positions[entity] = (last[moment_column.key], last[id_column.key])
+        else:
+            positions[entity] = (until, 0)
+        return rows
+    
+    for entity, (model, serializer, build_query, build_computed) in EXPORT_ENTITIES.items():
+        fields = tuple(field for field in serializer.fields if field not in DERIVED_FIELDS)
+        rows = read_page(build_query(current_user.id, fields), model.updated_at, model.id, entity)
+        computed = build_computed(current_user.id, rows, fields) if build_computed else None
+        result[entity] = serializer.dicts(rows, fields, computed)
+    
+    tombstones = read_page(
+        db.session.query(DeletedRecord.id, DeletedRecord.entity, DeletedRecord.entity_id, DeletedRecord.deleted_at).filter(
+            DeletedRecord.user_id == current_user.id
+        ),
+        DeletedRecord.deleted_at, DeletedRecord.id, 'deleted'
+    )
+    result['deleted'] = [
+        {'entity': row.entity, 'id': row.entity_id, 'deleted_at': row.deleted_at.isoformat()}
+        for row in tombstones
+    ]
+    
+    result['cursor'] = encode_sync_cursor(positions)
+    result['has_more'] = has_more
+    return json_response(result)
+
+# Background Jobs
+# Job rows hold each job's parameters, state and results. The broker only
+# delivers job ids to workers: the database broker reads them straight from
+# the job table, so no outside service is needed. Another broker can be
+# registered in JOB_BROKERS and selected with JOB_BROKER.
+JOB_HANDLERS = {}
+
+def job_handler(kind, check_params=None):
+    """Register f(job, params) -> result as the runner of kind.
+    
+    check_params(params) validates a submission to /api/jobs and returns the
+    params to store; kinds without it cannot be submitted there.
+    """
+    def register(f):
+        JOB_HANDLERS[kind] = (f, check_params)
+        return f
+    return register
+
+class DatabaseBroker:
+    """Hands out due jobs from the job table.
+    
+    Postgres workers skip rows another worker is claiming; on SQLite the
+    claim is one UPDATE, which the database write lock makes atomic.
+    """
+    
+    def publish(self, job_id):
+        # The committed job row is the message
+        pass
+    
+    def claim(self, worker_id):
+        """Mark the next due job as running for worker_id and return its id, or None."""
+        now = datetime.datetime.utcnow()
+        lease_expired = now - datetime.timedelta(seconds=app.config['JOB_LEASE_SECONDS'])
+        due = db.or_(
+            db.and_(Job.status == 'queued', Job.run_after <= now),
+            # Jobs whose worker died or hung are handed out again
+            db.and_(Job.status == 'running', Job.locked_at < lease_expired)
+        )
+        candidate = db.select(Job.id).where(due).order_by(Job.run_after, Job.id).limit(1)
+        if db.session.get_bind().dialect.name == 'postgresql':
+            candidate = candidate.with_for_update(skip_locked=True)
+        
+        statement = db.update(Job).where(Job.id == candidate.scalar_subquery(), due).values(
+            status='running', locked_by=worker_id, locked_at=now, started_at=now, attempts=Job.attempts + 1
+        ).returning(Job.id)
+        job_id = db.session.execute(statement, execution_options={'synchronize_session': False}).scalar()
+        db.session.commit()
+        return job_id
+
+JOB_BROKERS = {'database': DatabaseBroker}
+
+job_broker = JOB_BROKERS[app.config['JOB_BROKER']]()
+
+def job_dict(job):
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'params': json.loads(job.params),
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'result': json.loads(job.result) if job.result else None,
+        'error': job.error,
+        'has_output': job.output_type is not None,
+        'created_at': iso_value(job.created_at),
+        'started_at': iso_value(job.started_at),
+        'finished_at': iso_value(job.finished_at),
+    }
+
+def enqueue_job(user_id, kind, params, input_data=None):
+    """Queue a job for user_id, refusing with 429 while too many of theirs are pending."""
+    active = db.session.query(db.func.count(Job.id)).filter(
+        Job.user_id == user_id, Job.status.in_(('queued', 'running'))
+    ).scalar()
+    if active >= app.config['JOB_MAX_ACTIVE_PER_USER']:
+        raise ApiError('Too many jobs in progress', 429)
+    
+    job = Job(
+        user_id=user_id,
+        kind=kind,
+        params=json.dumps(params),
+        input=input_data,
+        max_attempts=app.config['JOB_MAX_ATTEMPTS']
+    )
+    db.session.add(job)
+    db.session.commit()
+    job_broker.publish(job.id)
+    return job
+
+def run_job(job_id):
+    """Run a claimed job and record how it ended.
+    
+    ApiError means the job can never succeed and fails it at once; any other
+    exception is retried with exponential backoff until max_attempts.
+    """
+    job = db.session.get(Job, job_id)
+    if job is None or job.status != 'running':
+        return
+    
+    now = datetime.datetime.utcnow()
+    if job.attempts > job.max_attempts:
+        # Claimed again after its lease expired on the last attempt
+        job.status, job.error, job.finished_at = 'failed', 'Job did not finish in time', now
+        db.session.commit()
+        return
+    
+    handler, _ = JOB_HANDLERS[job.kind]
+    try:
+        result = handler(job, json.loads(job.params))
+    except Exception as error:
+        db.session.rollback()
+        job = db.session.get(Job, job_id)
+        now = datetime.datetime.utcnow()
+        if isinstance(error, ApiError):
+            job.error = error.message
+        else:
+            app.logger.exception('Job %s (%s) failed on attempt %s', job.id, job.kind, job.attempts)
+            job.error = f'{type(error).__name__}: {error}'
+        
+        if isinstance(error, ApiError) or job.attempts >= job.max_attempts:
+            job.status, job.finished_at = 'failed', now
+        else:
+            delay = app.config['JOB_RETRY_DELAY'] * 2 ** (job.attempts - 1)
+            job.status, job.run_after = 'queued', now + datetime.timedelta(seconds=delay)
+        db.session.commit()
+        return
+    
+    job.status, job.error, job.finished_at = 'succeeded', None, datetime.datetime.utcnow()
+    job.result = json.dumps(result)
+    db.session.commit()
+
+def check_import_params(entity, import_format):
+    if entity not in IMPORT_ENTITIES:
+        raise ApiError('Unknown entity', 404)
+    return {'entity': entity, 'format': import_format}
+
+@job_handler('import')
+def import_job(job, params):
+    # A retry resumes after the last batch the previous attempt committed
+    progress = json.loads(job.result) if job.result else None
+    
+    def checkpoint(report):
+        job.result = json.dumps(report)
+        # Renews the lease so a long import is not handed to another worker
+        job.locked_at = datetime.datetime.utcnow()
+    
+    with gzip.GzipFile(fileobj=io.BytesIO(job.input)) as stream:
+        rows = read_import_rows(params['format'], stream)
+        report = import_rows(job.user_id, params['entity'], rows, progress, checkpoint)
+    return {key: report[key] for key in ('imported', 'error_count', 'errors')}
+
+def check_export_params(params):
+    if params.get('entity') not in EXPORT_ENTITIES:
+        raise ApiError('Unknown entity', 404)
+    export_format = params.get('format', 'csv')
+    if export_format not in EXPORT_MIMETYPES:
+        raise ApiError('Unsupported format')
+    query = params.get('query') or {}
+    if not isinstance(query, dict) or not all(isinstance(value, str) for value in query.values()):
+        raise ApiError('query must be an object of strings')
+    return {'entity': params['entity'], 'format': export_format, 'query': query}
+
+@job_handler('export', check_export_params)
+def export_job(job, params):
+    # The list filters and ?fields= read the query string, as for GET /api/export
+    with app.test_request_context(query_string=params['query']):
+        compressor = zlib.compressobj(wbits=31)
+        parts = []
+        size = 0
+        for chunk in export_chunks(job.user_id, params['entity'], params['format']):
+            size += len(chunk)
+            parts.append(compressor.compress(chunk))
+        parts.append(compressor.flush())
+    
+    job.output = b''.join(parts)
+    job.output_type = EXPORT_MIMETYPES[params['format']]
+    return {'bytes': size, 'filename': f"{params['entity']}.{params['format']}"}
+
+def check_delete_customers_params(params):
+    return {'ids': requested_customer_ids(params)}
+
+@job_handler('delete_customers', check_delete_customers_params)
+def delete_customers_job(job, params):
+    counts = delete_customer_records(job.user_id, params['ids'])
+    return {'deleted': counts}
+
+@job_handler('rebuild_pipeline', lambda params: {})
+def rebuild_pipeline_job(job, params):
+    rebuild_pipeline_summary(db.session.connection(), job.user_id)
+    # Bumps the pipeline ETag in case the rebuilt summary differs
+    mark_changed(job.user_id, 'deals')
+    return {'rows': db.session.query(PipelineSummary).filter(PipelineSummary.user_id == job.user_id).count()}
+
+# Jobs API
+@app.route('/api/jobs', methods=['POST'])
+@token_required
+def submit_job(current_user):
+    data = request.get_json() or {}
+    kind = data.get('kind')
+    if kind not in JOB_HANDLERS:
+        return jsonify({'error': 'Unknown job kind'}), 400
+    
+    _, check_params = JOB_HANDLERS[kind]
+    if check_params is None:
+        return jsonify({'error': f'Submit {kind} jobs to /api/jobs/{kind}/<entity>'}), 400
+    
+    params = data.get('params') or {}
+    if not isinstance(params, dict):
+        return jsonify({'error': 'params must be an object'}), 400
+    
+    job = enqueue_job(current_user.id, kind, check_params(params))
+    return json_response(job_dict(job), 202)
+
+@app.route('/api/jobs/import/<entity>', methods=['POST'])
+@token_required
+def submit_import_job(current_user, entity):
+    params = check_import_params(entity, request_import_format())
+    
+    # Stored compressed; the upload is read in chunks so an oversized one is refused early
+    compressor = zlib.compressobj(wbits=31)
+    parts = []
+    size = 0
+    while True:
+        chunk = request.stream.read(64 * 1024)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > app.config['JOB_MAX_INPUT_BYTES']:
+            return jsonify({'error': 'Upload too large'}), 413
+        parts.append(compressor.compress(chunk))
+    parts.append(compressor.flush())
+    
+    job = enqueue_job(current_user.id, 'import', params, b''.join(parts))
+    return json_response(job_dict(job), 202)
+
+@app.route('/api/jobs', methods=['GET'])
+@token_required
+def get_jobs(current_user):
+    query = Job.query.filter(Job.user_id == current_user.id)
+    if request.args.get('status'):
+        query = query.filter(Job.status == request.args.get('status'))
+    
+    jobs, next_cursor = paginate(query, Job)
+    response = json_response([job_dict(job) for job in jobs])
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+@app.route('/api/jobs/<int:job_id>', methods=['GET'])
+@token_required
+def get_job(current_user, job_id):
+    job = Job.query.filter_by(id=job_id, user_id=current_user.id).first()
+    
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    return json_response(job_dict(job))
+
+@app.route('/api/jobs/<int:job_id>/output', methods=['GET'])
+@token_required
+def get_job_output(current_user, job_id):
+    job = Job.query.filter_by(id=job_id, user_id=current_user.id).first()
+    
+    if not job or job.status != 'succeeded' or job.output_type is None:
+        return jsonify({'error': 'Job output not found'}), 404
+    
+    # Stored gzip-compressed; sent as is to clients that accept gzip
+    if request.accept_encodings['gzip'] > 0:
+        response = app.response_class(job.output, mimetype=job.output_type)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = app.response_class(gzip.decompress(job.output), mimetype=job.output_type)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Content-Disposition'] = f"attachment; filename={json.loads(job.result)['filename']}"
+    return response
+
+# Schema Migrations
+# db.create_all() only creates missing tables, so changes to tables that already
+# exist are applied as numbered, idempotent steps recorded in schema_version.
+MIGRATIONS = {}
+SCHEMA_LOCK_TIMEOUT_MS = 10 * 60 * 1000
+
+def migration(version):
+    def register(f):
+        MIGRATIONS[version] = f
+        return f
+    return register
+
+# Indexes are spelled out rather than read from the models, which gain
+# indexes on columns that only later migrations add
+ACCESS_PATTERN_INDEXES = (
+    ('ix_customer_user_created', 'customer', 'user_id, created_at, id'),
+    ('ix_customer_user_status', 'customer', 'user_id, status'),
+    ('ix_contact_user_created', 'contact', 'user_id, created_at, id'),
+    ('ix_contact_customer', 'contact', 'customer_id'),
+    ('ix_deal_user_created', 'deal', 'user_id, created_at, id'),
+    ('ix_deal_user_stage_close', 'deal', 'user_id, stage, close_date'),
+    ('ix_deal_customer', 'deal', 'customer_id'),
+    ('ix_task_user_created', 'task', 'user_id, created_at, id'),
+    ('ix_task_user_status', 'task', 'user_id, status'),
+    ('ix_task_user_related', 'task', 'user_id, related_type, related_id'),
+)
+
+@migration(1)
+def add_access_pattern_indexes(connection):
+    for name, table, columns in ACCESS_PATTERN_INDEXES:
+        connection.execute(db.text(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})'))
+
+@migration(2)
+def add_full_text_search(connection):
+    for table, (_, columns) in SEARCH_TABLES.items():
+        if connection.dialect.name == 'postgresql':
+            document = " || ' ' || ".join(f"coalesce({column}, '')" for column in columns)
+            connection.execute(db.text(
+                f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+                f"GENERATED ALWAYS AS (to_tsvector('simple', {document})) STORED"
+            ))
+            connection.execute(db.text(f'CREATE INDEX IF NOT EXISTS ix_{table}_search ON {table} USING GIN (search_vector)'))
+        elif connection.dialect.name == 'sqlite':
+            names = ', '.join(columns)
+            new_values = ', '.join(f'new.{column}' for column in columns)
+            old_values = ', '.join(f'old.{column}' for column in columns)
+            insert = f'INSERT INTO {table}_search (rowid, {names}) VALUES (new.id, {new_values});'
+            delete = f"INSERT INTO {table}_search ({table}_search, rowid, {names}) VALUES ('delete', old.id, {old_values});"
+            
+            connection.execute(db.text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {table}_search USING fts5({names}, content='{table}', content_rowid='id')"
+            ))
+            connection.execute(db.text(f'CREATE TRIGGER IF NOT EXISTS {table}_search_insert AFTER INSERT ON {table} BEGIN {insert} END'))
+            connection.execute(db.text(f'CREATE TRIGGER IF NOT EXISTS {table}_search_update AFTER UPDATE ON {table} BEGIN {delete} {insert} END'))
+            connection.execute(db.text(f'CREATE TRIGGER IF NOT EXISTS {table}_search_delete AFTER DELETE ON {table} BEGIN {delete} END'))
+            connection.execute(db.text(f"INSERT INTO {table}_search ({table}_search) VALUES ('rebuild')"))
+
+@migration(3)
+def add_updated_at(connection):
+    for model in TOMBSTONE_ENTITIES:
+        table = model.__tablename__
+        columns = {column['name'] for column in db.inspect(connection).get_columns(table)}
+        if 'updated_at' not in columns:
+            connection.execute(db.text(f'ALTER TABLE {table} ADD COLUMN updated_at TIMESTAMP'))
+            connection.execute(db.text(f'UPDATE {table} SET updated_at = created_at'))
+        connection.execute(db.text(f'CREATE INDEX IF NOT EXISTS ix_{table}_user_updated ON {table} (user_id, updated_at, id)'))
+
+@migration(4)
+def build_pipeline_summary(connection):
+    PipelineSummary.__table__.create(connection, checkfirst=True)
+    rebuild_pipeline_summary(connection)
+
+@migration(5)
+def add_customer_name_key(connection):
+    columns = {column['name'] for column in db.inspect(connection).get_columns('customer')}
+    if 'name_key' not in columns:
+        collation = ' COLLATE "C"' if connection.dialect.name == 'postgresql' else ''
+        connection.execute(db.text(f'ALTER TABLE customer ADD COLUMN name_key TEXT{collation}'))
+    
+    # Folded in Python to match new writes, in batches to bound memory
+    select = db.text('SELECT id, name FROM customer WHERE name_key IS NULL ORDER BY id LIMIT 1000')
+    update = db.text('UPDATE customer SET name_key = :name_key WHERE id = :id')
+    while True:
+        rows = connection.execute(select).all()
+        if not rows:
+            break
+        connection.execute(update, [{'id': row_id, 'name_key': customer_name_key(name)} for row_id, name in rows])
+    
+    connection.execute(db.text('CREATE INDEX IF NOT EXISTS ix_customer_user_name_key ON customer (user_id, name_key)'))
+
+def lock_schema(connection):
+    """Hold the schema lock until connection's transaction ends.
+    
+    gunicorn workers starting together each set up the schema on import;
+    the first one to get the lock does the work and the rest find it done.
+    """
+    if connection.dialect.name == 'postgresql':
+        # Until the transaction ends, so the lock wait and the migrations
+        # run under it may outlast DB_STATEMENT_TIMEOUT_MS
+        connection.execute(db.text(f'SET LOCAL statement_timeout = {SCHEMA_LOCK_TIMEOUT_MS}'))
+        connection.execute(db.text('SELECT pg_advisory_xact_lock(4242)'))
+    elif connection.dialect.name == 'sqlite':
+        # The write lock on the whole file. Waiting workers allow for a long
+        # migration, then go back to the usual busy timeout
+        connection.exec_driver_sql(f'PRAGMA busy_timeout = {SCHEMA_LOCK_TIMEOUT_MS}')
+        connection.exec_driver_sql('BEGIN IMMEDIATE')
+        connection.exec_driver_sql(f"PRAGMA busy_timeout = {int(app.config['SQLITE_BUSY_TIMEOUT_MS'])}")
+
+def run_migrations():
+    """Create missing tables and apply every migration newer than the recorded schema version."""
+    with db.engine.begin() as connection:
+        lock_schema(connection)
+        # Checked under the lock, after any other worker's setup has committed
+        db.metadata.create_all(connection)
+        
+        current = connection.execute(db.select(db.func.max(SchemaVersion.version))).scalar() or 0
+        for version in sorted(MIGRATIONS):
+            if version > current:
+                MIGRATIONS[version](connection)
+                connection.execute(db.insert(SchemaVersion).values(version=version, applied_at=datetime.datetime.utcnow()))
+
+@app.cli.command('migrate')
+def migrate_command():
+    """Create missing tables and apply pending schema migrations."""
+    run_migrations()
+
 with app.app_context():
-    db.create_all()
+    run_migrations()
 
 # Configuración para Render - usa el puerto asignado por la plataforma
 if __name__ == '__main__':
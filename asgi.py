@@ -0,0 +1,177 @@
+"""ASGI entry point: serves the same Flask app on an async database engine.
+
+    pip install -r requirements.txt -r requirements-async.txt
+    uvicorn asgi:application --host 0.0.0.0 --port $PORT --workers 4
+
+Every request runs the ordinary Flask view code inside SQLAlchemy's greenlet
+bridge (the mechanism behind AsyncSession.run_sync). db.session is bound to
+an AsyncSession for the duration of the request, so each database round trip
+awaits asyncpg or aiosqlite and the worker's event loop keeps serving other
+requests in the meantime, instead of a whole sync worker blocking on it.
+Request bodies are read and response bodies sent through the same bridge,
+so imports and exports keep streaming. Password hashing already runs in a
+thread pool; here the request awaits that pool instead of blocking the loop.
+
+The WSGI entry point (gunicorn app:app) is unchanged and remains the default.
+"""
+import asyncio
+import io
+import sys
+
+from flask_sqlalchemy.query import Query
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.util import await_only
+
+import app as crm
+
+ASYNC_DRIVERS = {'postgresql': 'postgresql+asyncpg', 'sqlite': 'sqlite+aiosqlite'}
+
+def async_database_url():
+    if crm.app.config['ASYNC_DATABASE_URI']:
+        return crm.app.config['ASYNC_DATABASE_URI']
+    
+    # The sync engine's URL, where Flask-SQLAlchemy has already resolved relative SQLite paths
+    with crm.app.app_context():
+        url = crm.db.engine.url
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise RuntimeError(f'No async driver configured for {backend}; set ASYNC_DATABASE_URL')
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+def create_engine():
+    url = make_url(async_database_url())
+    async_engine = create_async_engine(url, **crm.engine_options(url))
+    crm.configure_engine(async_engine.sync_engine)
+    return async_engine
+
+engine = create_engine()
+
+def wait_in_event_loop(future):
+    return await_only(asyncio.wrap_future(future))
+
+crm.wait_for_result = wait_in_event_loop
+
+class RequestBody(io.RawIOBase):
+    """wsgi.input that pulls http.request messages from the ASGI receive channel as it is read."""
+    
+    def __init__(self, receive):
+        self.receive = receive
+        self.pending = b''
+        self.finished = False
+    
+    def readable(self):
+        return True
+    
+    def readinto(self, buffer):
+        while not self.pending and not self.finished:
+            message = await_only(self.receive())
+            if message['type'] == 'http.disconnect':
+                self.finished = True
+            else:
+                self.pending = message.get('body', b'')
+                self.finished = not message.get('more_body', False)
+        
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+def wsgi_environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin-1'),
+        'PATH_INFO': scope['path'].encode().decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BufferedReader(body),
+        'wsgi.input_terminated': True,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'], environ['REMOTE_PORT'] = scope['client'][0], str(scope['client'][1])
+    
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        key = name if name in ('CONTENT_TYPE', 'CONTENT_LENGTH') else 'HTTP_' + name
+        environ[key] = environ[key] + ',' + value if key in environ else value
+    return environ
+
+def handle_request(session, scope, receive, send):
+    """Run one request through the Flask app; called inside the greenlet bridge."""
+    started = {}
+    
+    def start_response(status, headers, exc_info=None):
+        started['status'] = int(status.split(' ', 1)[0])
+        started['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+    
+    def send_start():
+        await_only(send({'type': 'http.response.start', 'status': started['status'], 'headers': started['headers']}))
+    
+    environ = wsgi_environ(scope, RequestBody(receive))
+    with crm.app.app_context():
+        # The request context reuses this app context, so db.session is this session throughout
+        crm.db.session.registry.set(session)
+        body = crm.app(environ, start_response)
+        try:
+            if isinstance(body, list) and len(body) <= 1:
+                send_start()
+                await_only(send({'type': 'http.response.body', 'body': body[0] if body else b''}))
+                return
+            
+            sent_start = False
+            for chunk in body:
+                if not sent_start:
+                    send_start()
+                    sent_start = True
+                if chunk:
+                    await_only(send({'type': 'http.response.body', 'body': chunk, 'more_body': True}))
+            if not sent_start:
+                send_start()
+            await_only(send({'type': 'http.response.body', 'body': b''}))
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # Schema setup already ran when app was imported
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            try:
+                await engine.dispose()
+            except Exception as error:
+                await send({'type': 'lifespan.shutdown.failed', 'message': repr(error)})
+            else:
+                await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def refuse_websocket(receive, send):
+    """Reject a WebSocket handshake; the server answers it with 403."""
+    message = await receive()
+    if message['type'] == 'websocket.connect':
+        await send({'type': 'websocket.close', 'code': 1003})
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] == 'websocket':
+        await refuse_websocket(receive, send)
+        return
+    if scope['type'] != 'http':
+        raise NotImplementedError(f'Unsupported ASGI scope type {scope["type"]}')
+    
+    async with AsyncSession(engine, query_cls=Query) as session:
+        await session.run_sync(handle_request, scope, receive, send)
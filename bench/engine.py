@@ -0,0 +1,151 @@
+"""Compare concurrent read/write throughput with default and tuned SQLite settings.
+
+Each configuration gets a fresh database file, seeded once, then several
+worker processes (standing in for gunicorn sync workers) each import the app
+with that configuration's environment and run a mixed workload through their
+own test client: mostly customer list reads with customer creates in between.
+It reports throughput, latency percentiles and failed requests, which on the
+default rollback journal are mostly "database is locked" errors from writers
+and readers colliding:
+
+    python bench/engine.py --workers 4 --seconds 10 --write-ratio 0.3
+
+Settings not overridden by a configuration (pool size, etc.) come from the
+usual DB_* and SQLITE_* environment variables.
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..'))
+
+import seed as seeding
+from load import git_commit, percentile
+
+CONFIGURATIONS = {
+    # SQLite's own defaults, and what the app ran with before the engine settings existed
+    'default': {'SQLITE_JOURNAL_MODE': 'DELETE', 'SQLITE_SYNCHRONOUS': 'FULL',
+                'SQLITE_BUSY_TIMEOUT_MS': '0', 'SQLITE_MMAP_SIZE': '0'},
+    'tuned': {'SQLITE_JOURNAL_MODE': 'WAL', 'SQLITE_SYNCHRONOUS': 'NORMAL',
+              'SQLITE_BUSY_TIMEOUT_MS': '5000', 'SQLITE_MMAP_SIZE': str(256 * 1024 * 1024)},
+}
+
+def configure(database, settings):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + database
+    os.environ.update(settings)
+
+def prepare(database, settings, seed_options):
+    configure(database, settings)
+    from app import app
+    with app.app_context():
+        return seeding.seed(**seed_options)
+
+def work(database, settings, email, write_ratio, start_at, deadline, index):
+    """One worker process: mixed reads and writes until deadline; returns latencies and failures."""
+    configure(database, settings)
+    from app import app
+    
+    client = app.test_client()
+    response = client.post('/api/auth/login', json={'email': email, 'password': seeding.BENCH_PASSWORD})
+    headers = {'Authorization': 'Bearer ' + response.get_json()['token']}
+    
+    rng = random.Random(index)
+    time.sleep(max(start_at - time.time(), 0))
+    latencies = {'read': [], 'write': []}
+    errors = {'read': 0, 'write': 0}
+    while time.time() < deadline:
+        kind = 'write' if rng.random() < write_ratio else 'read'
+        start = time.perf_counter()
+        if kind == 'write':
+            status = client.post('/api/customers', headers=headers, json={
+                'name': f'Bench {index}-{rng.randrange(10 ** 9)}', 'company': 'Bench',
+                'email': f'bench{index}@example.com', 'status': 'new'
+            }).status_code
+        else:
+            status = client.get('/api/customers?limit=20', headers=headers).status_code
+        if status >= 400:
+            errors[kind] += 1
+        else:
+            latencies[kind].append(time.perf_counter() - start)
+    return latencies, errors
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies) + errors,
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+    }
+
+def run(name, settings, args, context):
+    database = os.path.join(tempfile.mkdtemp(prefix='crm-bench-'), 'bench.db')
+    with context.Pool(1) as pool:
+        tenants = pool.apply(prepare, (database, settings, seeding.seed_options(args)))
+    
+    # Everyone writes to the same database file; the busiest tenant keeps the reads realistic
+    email = tenants[0]['email']
+    start_at = time.time() + 10
+    deadline = start_at + args.seconds
+    with context.Pool(args.workers) as pool:
+        results = pool.starmap(work, [(database, settings, email, args.write_ratio, start_at, deadline, index)
+                                      for index in range(args.workers)])
+    elapsed = args.seconds
+    
+    stats = {}
+    for kind in ('read', 'write'):
+        stats[kind] = summarize([value for latencies, _ in results for value in latencies[kind]],
+                                sum(errors[kind] for _, errors in results), elapsed)
+    stats['total'] = summarize([value for latencies, _ in results for kind in latencies for value in latencies[kind]],
+                               stats['read']['errors'] + stats['write']['errors'], elapsed)
+    stats['settings'] = settings
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    seeding.add_arguments(parser)
+    parser.set_defaults(users=5, customers=5000, contacts=2000, deals=2000, tasks=2000)
+    parser.add_argument('--configurations', default=','.join(CONFIGURATIONS))
+    parser.add_argument('--workers', type=int, default=4, help='worker processes sharing the database')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--write-ratio', type=float, default=0.3)
+    parser.add_argument('--output', help='result file (default bench/results/engine-<commit>.json)')
+    args = parser.parse_args()
+    
+    # Workers are started fresh so each one reads its configuration at import time, like a gunicorn worker
+    context = multiprocessing.get_context('spawn')
+    results = {
+        'commit': git_commit(),
+        'timestamp': datetime.datetime.utcnow().isoformat(),
+        'workers': args.workers,
+        'seconds': args.seconds,
+        'write_ratio': args.write_ratio,
+        'configurations': {},
+    }
+    
+    print(f'{"config":8} {"kind":6} {"req/s":>9} {"p50":>9} {"p95":>9} {"p99":>9} {"errors":>7}')
+    for name in args.configurations.split(','):
+        stats = run(name, CONFIGURATIONS[name], args, context)
+        results['configurations'][name] = stats
+        for kind in ('read', 'write', 'total'):
+            row = stats[kind]
+            print(f'{name:8} {kind:6} {row["throughput_rps"]:9.1f} {row["p50_ms"] or 0:9.1f} '
+                  f'{row["p95_ms"] or 0:9.1f} {row["p99_ms"] or 0:9.1f} {row["errors"]:7}')
+    
+    output = args.output or os.path.join(BENCH_DIR, 'results', f'engine-{results["commit"]}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'\nSaved {output}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,420 @@
+"""Load test every /api/* route and record latency, throughput and query counts.
+
+By default the app runs in-process through Flask's test client against a
+freshly seeded database, and the SQL statements of each request are counted:
+
+    python bench/load.py --requests 200
+    DATABASE_URL=postgresql://localhost/crm_bench python bench/load.py
+
+With --url the requests go over HTTP to a running server instead (query
+counts are then not available). Seed the same database first and start the
+server against it, e.g.:
+
+    DATABASE_URL=sqlite:////tmp/bench.db python bench/seed.py
+    DATABASE_URL=sqlite:////tmp/bench.db gunicorn app:app -w 4 &
+    DATABASE_URL=sqlite:////tmp/bench.db python bench/load.py --url http://127.0.0.1:8000 --no-seed --concurrency 8
+
+Every GET carries a query parameter no endpoint reads, different for each
+request, so the versioned response cache never answers it and the timings
+cover the queries behind each route. --cached leaves it off to measure
+cache hits instead. The customer lookup is left as is: its per-user prefix
+cache is part of what it measures.
+
+Job submissions are refused with 429 once a tenant has JOB_MAX_ACTIVE_PER_USER
+jobs pending. In-process the limit is lifted, since no worker drains the
+queue; against a server, run worker.py next to it or raise the limit.
+
+Results are written as JSON (bench/results/<commit>.json by default) and
+--compare prints the p95 change per endpoint against an earlier result file.
+"""
+import argparse
+import concurrent.futures
+import datetime
+import json
+import os
+import random
+import itertools
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..'))
+
+import seed as seeding
+
+REQUEST_NUMBERS = itertools.count(1)
+
+def uncached(path):
+    """path with a query parameter of its own, so no cached response matches it."""
+    return f'{path}{"&" if "?" in path else "?"}_={next(REQUEST_NUMBERS)}'
+
+# Drivers
+class TestClientDriver:
+    """Send requests through Flask's test client, counting SQL statements per request."""
+    
+    def __init__(self, app, query_counter):
+        self.client = app.test_client()
+        self.query_counter = query_counter
+    
+    def request(self, method, path, headers, body=None, content_type=None):
+        with self.query_counter() as queries:
+            response = self.client.open(path, method=method, headers=headers, data=body, content_type=content_type)
+            response.get_data()
+        return response.status_code, response.get_data(), queries.count
+
+class HttpDriver:
+    """Send requests to a running server over HTTP."""
+    
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+    
+    def request(self, method, path, headers, body=None, content_type=None):
+        headers = dict(headers)
+        if content_type:
+            headers['Content-Type'] = content_type
+        req = urllib.request.Request(self.base_url + path, data=body, method=method, headers=headers)
+        try:
+            with urllib.request.urlopen(req) as response:
+                return response.status, response.read(), None
+        except urllib.error.HTTPError as error:
+            return error.code, error.read(), None
+
+# Scenarios
+class Context:
+    """Tenants, their tokens and the ids the scenarios can read and write."""
+    
+    def __init__(self, driver, tenants, rng, cached=False):
+        self.driver = driver
+        self.tenants = tenants
+        self.rng = rng
+        self.cached = cached
+        # Heavier tenants get proportionally more traffic
+        self.weights = [tenant['customers'] + tenant['deals'] + tenant['tasks'] for tenant in tenants]
+        self.ids = {}
+        for tenant in tenants:
+            tenant['headers'] = {'Authorization': 'Bearer ' + self.login(tenant)}
+            for entity in ('customers', 'contacts', 'deals', 'tasks'):
+                self.ids[tenant['id'], entity] = self.list_ids(tenant, entity)
+    
+    def login(self, tenant):
+        status, body, _ = self.send('POST', '/api/auth/login', {}, {'email': tenant['email'], 'password': seeding.BENCH_PASSWORD})
+        if status != 200:
+            raise SystemExit(f'Login failed for {tenant["email"]}: {status} {body[:200]!r}')
+        return json.loads(body)['token']
+    
+    def list_ids(self, tenant, entity):
+        ids = []
+        path = f'/api/{entity}?fields=id&limit=500'
+        status, body, _ = self.send('GET', path, tenant['headers'])
+        if status == 200:
+            ids = [row['id'] for row in json.loads(body)]
+        return ids
+    
+    def send(self, method, path, headers, payload=None, body=None, content_type=None):
+        if payload is not None:
+            body, content_type = json.dumps(payload).encode(), 'application/json'
+        return self.driver.request(method, path, headers, body, content_type)
+    
+    def tenant(self):
+        return self.rng.choices(self.tenants, self.weights)[0]
+    
+    def read_path(self, path):
+        return path if self.cached else uncached(path)
+    
+    def some_id(self, tenant, entity):
+        ids = self.ids[tenant['id'], entity]
+        return self.rng.choice(ids) if ids else 0
+    
+    def create(self, tenant, entity, payload):
+        """Create a record outside of the timed request, e.g. for a DELETE to remove."""
+        status, body, _ = self.send('POST', f'/api/{entity}', tenant['headers'], payload)
+        return json.loads(body)['id'] if status in (201, 202) else 0
+
+def customer_payload(ctx):
+    n = ctx.rng.randrange(10 ** 6)
+    return {'name': f'Bench {n}', 'company': 'Bench Co', 'email': f'bench{n}@example.com', 'status': 'new'}
+
+def contact_payload(ctx, tenant):
+    return {'name': 'Bench contact', 'email': 'contact@example.com', 'customer_id': ctx.some_id(tenant, 'customers')}
+
+def deal_payload(ctx, tenant):
+    return {'title': 'Bench deal', 'value': ctx.rng.randrange(100, 10000), 'stage': 'prospect',
+            'close_date': datetime.date.today().isoformat(), 'customer_id': ctx.some_id(tenant, 'customers')}
+
+def task_payload(ctx, tenant):
+    return {'title': 'Bench task', 'related_type': 'customer', 'related_id': ctx.some_id(tenant, 'customers'),
+            'due_date': datetime.date.today().isoformat(), 'priority': 'medium', 'status': 'pending'}
+
+def import_body(ctx):
+    n = ctx.rng.randrange(10 ** 6)
+    lines = ['name,company,email,status'] + [f'Import {n}-{i},Import Co,import{n}-{i}@example.com,new' for i in range(50)]
+    return ('\n'.join(lines) + '\n').encode()
+
+def scenarios():
+    """name -> function(ctx) returning (method, path, headers, payload/body kwargs).
+    
+    Each function may do untimed setup (e.g. create the record a DELETE removes).
+    """
+    def get(path):
+        def build(ctx):
+            return 'GET', ctx.read_path(path), ctx.tenant()['headers'], {}
+        return build
+    
+    def create(entity, payload):
+        def build(ctx):
+            tenant = ctx.tenant()
+            return 'POST', f'/api/{entity}', tenant['headers'], {'payload': payload(ctx, tenant)}
+        return build
+    
+    def update(entity, payload):
+        def build(ctx):
+            tenant = ctx.tenant()
+            return 'PUT', f'/api/{entity}/{ctx.some_id(tenant, entity)}', tenant['headers'], {'payload': payload(ctx, tenant)}
+        return build
+    
+    def delete(entity, payload):
+        def build(ctx):
+            tenant = ctx.tenant()
+            record_id = ctx.create(tenant, entity, payload(ctx, tenant))
+            return 'DELETE', f'/api/{entity}/{record_id}', tenant['headers'], {}
+        return build
+    
+    def register(ctx):
+        n = ctx.rng.randrange(10 ** 9)
+        return 'POST', '/api/auth/register', {}, {'payload': {'name': 'Bench', 'email': f'register-{n}@example.com', 'password': 'x'}}
+    
+    def login(ctx):
+        tenant = ctx.tenant()
+        return 'POST', '/api/auth/login', {}, {'payload': {'email': tenant['email'], 'password': seeding.BENCH_PASSWORD}}
+    
+    def import_customers(ctx):
+        return 'POST', '/api/import/customers', ctx.tenant()['headers'], {'body': import_body(ctx), 'content_type': 'text/csv'}
+    
+    def batch(ctx):
+        tenant = ctx.tenant()
+        operations = [
+            {'entity': 'deals', 'op': 'create', 'data': deal_payload(ctx, tenant)},
+            {'entity': 'tasks', 'op': 'update', 'id': ctx.some_id(tenant, 'tasks'), 'data': {'status': 'in_progress'}},
+            {'entity': 'customers', 'op': 'update', 'id': ctx.some_id(tenant, 'customers'), 'data': {'status': 'contacted'}},
+        ]
+        return 'POST', '/api/batch', tenant['headers'], {'payload': {'operations': operations}}
+    
+    def lookup(ctx):
+        prefix = ctx.rng.choice(seeding.FIRST_NAMES)[:ctx.rng.randint(1, 4)]
+        return 'GET', f'/api/customers/lookup?prefix={urllib.request.quote(prefix)}', ctx.tenant()['headers'], {}
+    
+    def delete_customers(ctx):
+        # Each customer brings a contact and a deal, so the cascade has rows to remove
+        tenant = ctx.tenant()
+        ids = []
+        for _ in range(3):
+            customer_id = ctx.create(tenant, 'customers', customer_payload(ctx))
+            ctx.create(tenant, 'contacts', {**contact_payload(ctx, tenant), 'customer_id': customer_id})
+            ctx.create(tenant, 'deals', {**deal_payload(ctx, tenant), 'customer_id': customer_id})
+            ids.append(customer_id)
+        return 'POST', '/api/customers/delete', tenant['headers'], {'payload': {'ids': ids}}
+    
+    def submit_export_job(ctx):
+        payload = {'kind': 'export', 'params': {'entity': 'deals', 'format': 'csv'}}
+        return 'POST', '/api/jobs', ctx.tenant()['headers'], {'payload': payload}
+    
+    def submit_import_job(ctx):
+        return 'POST', '/api/jobs/import/customers', ctx.tenant()['headers'], {'body': import_body(ctx), 'content_type': 'text/csv'}
+    
+    def get_job(ctx):
+        tenant = ctx.tenant()
+        job_id = ctx.create(tenant, 'jobs', {'kind': 'rebuild_pipeline'})
+        return 'GET', ctx.read_path(f'/api/jobs/{job_id}'), tenant['headers'], {}
+    
+    def search(ctx):
+        term = ctx.rng.choice(seeding.LAST_NAMES + seeding.COMPANY_WORDS + seeding.DEAL_WORDS)
+        return 'GET', ctx.read_path(f'/api/search?q={urllib.request.quote(term)}'), ctx.tenant()['headers'], {}
+    
+    customer_update = lambda ctx, tenant: {'status': ctx.rng.choice(('new', 'contacted', 'qualified'))}
+    
+    return {
+        'POST /api/auth/register': register,
+        'POST /api/auth/login': login,
+        'GET /api/auth/user': get('/api/auth/user'),
+        'GET /api/customers': get('/api/customers'),
+        'GET /api/customers?status': get('/api/customers?status=qualified'),
+        'GET /api/customers/lookup': lookup,
+        'POST /api/customers': create('customers', lambda ctx, tenant: customer_payload(ctx)),
+        'PUT /api/customers/<id>': update('customers', customer_update),
+        'DELETE /api/customers/<id>': delete('customers', lambda ctx, tenant: customer_payload(ctx)),
+        'POST /api/customers/delete': delete_customers,
+        'GET /api/contacts': get('/api/contacts'),
+        'POST /api/contacts': create('contacts', contact_payload),
+        'PUT /api/contacts/<id>': update('contacts', lambda ctx, tenant: {'position': 'Gerente'}),
+        'DELETE /api/contacts/<id>': delete('contacts', contact_payload),
+        'GET /api/deals': get('/api/deals'),
+        'GET /api/deals?stage': get('/api/deals?stage=negotiation'),
+        'POST /api/deals': create('deals', deal_payload),
+        'PUT /api/deals/<id>': update('deals', lambda ctx, tenant: {'stage': 'won'}),
+        'DELETE /api/deals/<id>': delete('deals', deal_payload),
+        'GET /api/tasks': get('/api/tasks'),
+        'GET /api/tasks?status': get('/api/tasks?status=pending'),
+        'POST /api/tasks': create('tasks', task_payload),
+        'PUT /api/tasks/<id>': update('tasks', lambda ctx, tenant: {'status': 'completed'}),
+        'DELETE /api/tasks/<id>': delete('tasks', task_payload),
+        'GET /api/dashboard': get('/api/dashboard'),
+        'GET /api/analytics/pipeline': get('/api/analytics/pipeline'),
+        'POST /api/import/customers': import_customers,
+        'GET /api/export/deals': get('/api/export/deals'),
+        'POST /api/batch': batch,
+        'GET /api/search': search,
+        'GET /api/sync': get('/api/sync'),
+        'POST /api/jobs': submit_export_job,
+        'POST /api/jobs/import/customers': submit_import_job,
+        'GET /api/jobs': get('/api/jobs'),
+        'GET /api/jobs/<id>': get_job,
+    }
+
+# Password hashing dominates these; run fewer of them
+SLOW_SCENARIOS = {'POST /api/auth/register': 10, 'POST /api/auth/login': 10}
+
+# Measurement
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+def run_scenario(ctx, build, requests, concurrency):
+    # Build every request first so untimed setup does not skew the timings
+    prepared = [build(ctx) for _ in range(requests)]
+    
+    def timed(request_spec):
+        method, path, headers, kwargs = request_spec
+        start = time.perf_counter()
+        status, _, queries = ctx.send(method, path, headers, **kwargs)
+        return time.perf_counter() - start, status, queries
+    
+    start = time.perf_counter()
+    if concurrency > 1:
+        with concurrent.futures.ThreadPoolExecutor(concurrency) as pool:
+            samples = list(pool.map(timed, prepared))
+    else:
+        samples = [timed(request_spec) for request_spec in prepared]
+    elapsed = time.perf_counter() - start
+    
+    latencies = sorted(latency for latency, _, _ in samples)
+    errors = sum(1 for _, status, _ in samples if status >= 400)
+    queries = [count for _, _, count in samples if count is not None]
+    
+    def ms(value):
+        return round(value * 1000, 3) if value is not None else None
+    
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'p50_ms': ms(percentile(latencies, 0.50)),
+        'p95_ms': ms(percentile(latencies, 0.95)),
+        'p99_ms': ms(percentile(latencies, 0.99)),
+        'mean_ms': ms(sum(latencies) / len(latencies)),
+        'throughput_rps': round(len(samples) / elapsed, 1),
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+        'max_queries': max(queries) if queries else None,
+    }
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    
+    print(f'\np95 vs {baseline.get("commit")} ({baseline_path})')
+    for name, current in results['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(name)
+        if not previous or not previous.get('p95_ms'):
+            print(f'  {name:32} new')
+            continue
+        change = (current['p95_ms'] - previous['p95_ms']) / previous['p95_ms'] * 100
+        queries = ''
+        if current['queries_per_request'] is not None and previous.get('queries_per_request') is not None:
+            queries = f'  queries {previous["queries_per_request"]} -> {current["queries_per_request"]}'
+        print(f'  {name:32} {previous["p95_ms"]:9.2f} -> {current["p95_ms"]:9.2f} ms  {change:+6.1f}%{queries}')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    seeding.add_arguments(parser)
+    parser.add_argument('--requests', type=int, default=100, help='requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=1, help='parallel requests (HTTP mode)')
+    parser.add_argument('--url', help='base URL of a running server; default is the in-process test client')
+    parser.add_argument('--no-seed', action='store_true', help='reuse tenants already seeded with the same --seed')
+    parser.add_argument('--cached', action='store_true', help='let repeated GETs be answered from the response cache')
+    parser.add_argument('--only', help='comma separated substrings of the endpoints to run')
+    parser.add_argument('--output', help='result file (default bench/results/<commit>.json)')
+    parser.add_argument('--compare', help='earlier result file to compare p95 against')
+    args = parser.parse_args()
+    
+    if not os.environ.get('DATABASE_URL'):
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='crm-bench-'), 'bench.db')
+    if not args.url:
+        os.environ.setdefault('JOB_MAX_ACTIVE_PER_USER', str(10 ** 9))
+    
+    from app import app, db, QueryCounter, User
+    
+    with app.app_context():
+        if args.no_seed:
+            tenants = [
+                {'id': user.id, 'email': user.email, 'customers': len(user.customers), 'contacts': len(user.contacts),
+                 'deals': len(user.deals), 'tasks': len(user.tasks)}
+                for user in User.query.filter(User.email.like(f'bench-{args.seed}-%')).order_by(User.id)
+            ]
+            if not tenants:
+                raise SystemExit('No seeded tenants found; run without --no-seed or run bench/seed.py first')
+        else:
+            tenants = seeding.seed(**seeding.seed_options(args))
+        db.session.remove()
+    
+    driver = HttpDriver(args.url) if args.url else TestClientDriver(app, QueryCounter)
+    ctx = Context(driver, tenants, random.Random(args.seed), args.cached)
+    
+    selected = scenarios()
+    if args.only:
+        patterns = [pattern.strip() for pattern in args.only.split(',')]
+        selected = {name: build for name, build in selected.items() if any(pattern in name for pattern in patterns)}
+    
+    results = {
+        'commit': git_commit(),
+        'timestamp': datetime.datetime.utcnow().isoformat(),
+        'database': app.config['SQLALCHEMY_DATABASE_URI'].split(':', 1)[0],
+        'mode': 'http' if args.url else 'test_client',
+        'concurrency': args.concurrency,
+        'cached': args.cached,
+        'data': seeding.seed_options(args),
+        'endpoints': {},
+    }
+    
+    print(f'{"endpoint":32} {"p50":>9} {"p95":>9} {"p99":>9} {"req/s":>8} {"queries":>8} {"errors":>6}')
+    for name, build in selected.items():
+        requests = min(args.requests, SLOW_SCENARIOS.get(name, args.requests))
+        stats = run_scenario(ctx, build, requests, args.concurrency if args.url else 1)
+        results['endpoints'][name] = stats
+        queries = stats['queries_per_request'] if stats['queries_per_request'] is not None else '-'
+        print(f'{name:32} {stats["p50_ms"]:9.2f} {stats["p95_ms"]:9.2f} {stats["p99_ms"]:9.2f} '
+              f'{stats["throughput_rps"]:8.1f} {queries:>8} {stats["errors"]:6}')
+    
+    output = args.output or os.path.join(BENCH_DIR, 'results', f'{results["commit"]}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'\nSaved {output}')
+    
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""Benchmark password hashing and /api/auth/login throughput.
+
+Part one times a single verification per hashing method on one thread, which
+gives hashes per second per core. Part two runs a login storm against the
+app through Flask's test client, with more client threads than hashing
+workers. It reports logins per second and per core, how many logins were
+shed with 503, and the latency of an authenticated API call made during
+the storm.
+
+    python bench/passwords.py [--seconds 10] [--clients 16]
+
+Hashing settings come from the usual PASSWORD_* environment variables.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='crm-bench-'), 'bench.db'))
+
+from werkzeug.security import generate_password_hash
+
+import app as crm
+
+PASSWORD = 'correct horse battery staple'
+
+def per_core(method_hash, seconds=2):
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds or count < 3:
+        crm.verify_password(method_hash, PASSWORD)
+        count += 1
+    return count / (time.perf_counter() - start)
+
+def hashing_table():
+    print('Verifications per second on one core')
+    methods = {
+        'sha256 (legacy)': generate_password_hash(PASSWORD, method='sha256'),
+        f"pbkdf2 x{crm.app.config['PASSWORD_PBKDF2_ITERATIONS']}": None,
+        f"scrypt N={crm.app.config['PASSWORD_SCRYPT_N']}": None,
+    }
+    with crm.app.app_context():
+        for name in list(methods)[1:]:
+            crm.app.config['PASSWORD_HASH_METHOD'] = name.split()[0]
+            methods[name] = crm.hash_password(PASSWORD)
+        crm.app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+    
+    for name, method_hash in methods.items():
+        rate = per_core(method_hash)
+        print(f'  {name:24} {rate:10.1f}/s   {1000 / rate:8.2f} ms each')
+
+def login_storm(seconds, clients):
+    with crm.app.app_context():
+        crm.db.session.add(crm.User(name='Bench', email='storm@example.com', password=crm.hash_password(PASSWORD)))
+        crm.db.session.commit()
+    
+    client = crm.app.test_client()
+    token = client.post('/api/auth/login', json={'email': 'storm@example.com', 'password': PASSWORD}).get_json()['token']
+    
+    results = {'ok': 0, 'shed': 0, 'failed': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+    
+    def storm():
+        storm_client = crm.app.test_client()
+        while time.perf_counter() < deadline:
+            status = storm_client.post('/api/auth/login', json={'email': 'storm@example.com', 'password': PASSWORD}).status_code
+            key = 'ok' if status == 200 else 'shed' if status == 503 else 'failed'
+            with lock:
+                results[key] += 1
+    
+    api_latencies = []
+    
+    def api_traffic():
+        api_client = crm.app.test_client()
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            api_client.get('/api/customers', headers={'Authorization': 'Bearer ' + token})
+            api_latencies.append(time.perf_counter() - start)
+            time.sleep(0.01)
+    
+    threads = [threading.Thread(target=storm) for _ in range(clients)] + [threading.Thread(target=api_traffic)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    
+    cores = min(os.cpu_count() or 1, crm.app.config['PASSWORD_HASH_WORKERS'])
+    rate = results['ok'] / elapsed
+    print(f"\nLogin storm: {clients} clients, {crm.app.config['PASSWORD_HASH_WORKERS']} hash workers, "
+          f"queue {crm.app.config['PASSWORD_HASH_QUEUE']}, {crm.password_method()}")
+    print(f"  logins        {results['ok']} ok, {results['shed']} shed (503), {results['failed']} failed")
+    print(f'  throughput    {rate:.1f}/s, {rate / cores:.1f}/s per core ({cores} cores used)')
+    if api_latencies:
+        api_latencies.sort()
+        print(f'  /api/customers during storm: p50 {statistics.median(api_latencies) * 1000:.1f} ms, '
+              f'p95 {api_latencies[int(len(api_latencies) * 0.95) - 1] * 1000:.1f} ms')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--clients', type=int, default=16)
+    args = parser.parse_args()
+    
+    hashing_table()
+    login_storm(args.seconds, args.clients)
+
+if __name__ == '__main__':
+    main()
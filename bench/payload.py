@@ -0,0 +1,113 @@
+"""Measure bytes on the wire for a full deal list in each format and content coding.
+
+Seeds one user with 10k deals spread over 1k customers into an in-memory
+SQLite database, then pages through /api/deals with Flask's test client in
+the default and compact formats, with each content coding the server
+offers (br only when brotli is installed). Reports the total response body
+bytes and the time to fetch every page, and checks that the compact pages
+expand back to the default ones:
+
+    python bench/payload.py [deals] [customers]
+"""
+import datetime
+import gzip
+import json
+import os
+import sys
+import time
+
+os.environ['DATABASE_URL'] = 'sqlite://'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import app as crm
+from app import app, db, Customer, Deal, User
+
+PASSWORD = 'bench-password'
+STAGES = ('prospect', 'negotiation', 'proposal', 'won', 'lost')
+
+def seed(deals, customers):
+    user = User(name='bench', email='bench@example.com', password=crm.hash_password(PASSWORD))
+    db.session.add(user)
+    db.session.flush()
+    
+    now = datetime.datetime.utcnow()
+    db.session.execute(db.insert(Customer), [
+        {'name': f'Customer {i} S.A.', 'company': f'Company {i % 200}', 'email': f'c{i}@example.com',
+         'phone': '555-0100', 'status': 'new', 'notes': '', 'user_id': user.id,
+         'created_at': now, 'updated_at': now}
+        for i in range(customers)
+    ])
+    db.session.execute(db.insert(Deal), [
+        {'title': f'Deal {i}', 'value': round(1000 + i * 12.5, 2), 'stage': STAGES[i % len(STAGES)],
+         'close_date': datetime.date(2026, 1, 1) + datetime.timedelta(days=i % 365), 'notes': '',
+         'customer_id': i % customers + 1, 'user_id': user.id,
+         'created_at': now + datetime.timedelta(seconds=i), 'updated_at': now}
+        for i in range(deals)
+    ])
+    db.session.commit()
+
+def expand(page):
+    items = []
+    for values in page['rows']:
+        item = dict(zip(page['columns'], values))
+        if 'customers' in page:
+            item['customer_name'] = page['customers'][str(item['customer_id'])]
+        items.append(item)
+    return items
+
+def fetch_all(client, headers, list_format, coding):
+    """Every page of /api/deals; returns (wire bytes, seconds, decoded items)."""
+    headers = {**headers, 'Accept-Encoding': coding}
+    query = f'/api/deals?limit={app.config["MAX_PAGE_SIZE"]}&format={list_format}'
+    cursor = None
+    wire_bytes = 0
+    seconds = 0
+    items = []
+    while True:
+        start = time.perf_counter()
+        response = client.get(query + (f'&cursor={cursor}' if cursor else ''), headers=headers)
+        seconds += time.perf_counter() - start
+        assert response.status_code == 200, response.status_code
+        assert response.headers.get('Content-Encoding', 'identity') == coding, response.headers
+        wire_bytes += len(response.get_data())
+        
+        # The test client does not decode, so undo the coding here
+        body = response.get_data()
+        if coding == 'gzip':
+            body = gzip.decompress(body)
+        elif coding == 'br':
+            body = crm.brotli.decompress(body)
+        page = json.loads(body)
+        items.extend(expand(page) if list_format == 'compact' else page)
+        
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            return wire_bytes, seconds, items
+
+def main():
+    deals = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    customers = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    codings = ['identity', 'gzip'] + (['br'] if crm.brotli else [])
+    
+    with app.app_context():
+        seed(deals, customers)
+    
+    client = app.test_client()
+    token = client.post('/api/auth/login', json={'email': 'bench@example.com', 'password': PASSWORD}).get_json()['token']
+    headers = {'Authorization': 'Bearer ' + token}
+    
+    print(f'{deals} deals over {customers} customers, json backend: {"orjson" if crm.orjson else "json"}')
+    print(f'{"format":8} {"coding":9} {"bytes":>12} {"vs json":>8} {"time":>9}')
+    baseline_bytes = baseline_items = None
+    for list_format in ('json', 'compact'):
+        for coding in codings:
+            # Cleared so every run serializes and compresses instead of reusing cached bodies
+            crm.response_cache.clear()
+            wire_bytes, seconds, items = fetch_all(client, headers, list_format, coding)
+            if baseline_items is None:
+                baseline_bytes, baseline_items = wire_bytes, items
+            assert items == baseline_items, f'{list_format}/{coding} pages differ from json/identity'
+            print(f'{list_format:8} {coding:9} {wire_bytes:12,} {baseline_bytes / wire_bytes:7.1f}x {seconds * 1000:7.1f}ms')
+
+if __name__ == '__main__':
+    main()
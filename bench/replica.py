@@ -0,0 +1,168 @@
+"""Check read-replica routing and time list reads with and without a replica.
+
+Two SQLite files stand in for the primary and its replica. The primary is
+seeded and copied to the replica with SQLite's backup API, which plays the
+part of replication; between copies the replica lags. The script checks that
+a user sees their own write right after making it (reads stick to the
+primary), sees the lagging replica once REPLICA_STICKY_SECONDS have passed,
+and sees the write again after the next copy. It then times list reads while
+a writer thread keeps creating customers, first routed to the replica and
+then with routing turned off:
+
+    python bench/replica.py --seconds 10 --sticky-seconds 1
+
+Against Postgres, point DATABASE_URL and DATABASE_REPLICA_URLS at a real
+primary and streaming replica and run only the timing part with --no-check.
+"""
+import argparse
+import datetime
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..'))
+
+import seed as seeding
+from load import git_commit, percentile, uncached
+
+PATHS = ('/api/customers?limit=50', '/api/deals?limit=50', '/api/tasks?limit=50', '/api/dashboard')
+
+def replicate(primary, replica):
+    """Copy the primary database file over the replica, like a replication catch-up."""
+    source = sqlite3.connect(primary)
+    target = sqlite3.connect(replica)
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+        target.close()
+
+def login(client, email, password):
+    token = client.post('/api/auth/login', json={'email': email, 'password': password}).get_json()['token']
+    return {'Authorization': 'Bearer ' + token}
+
+def check_routing(crm, primary, replica, sticky_seconds):
+    """Walk one write through the sticky window; return {step: customers seen}."""
+    client = crm.app.test_client()
+    client.post('/api/auth/register', json={'name': 'Replica', 'email': 'replica@example.com', 'password': 'replica'})
+    headers = login(client, 'replica@example.com', 'replica')
+    
+    def visible():
+        return len(client.get('/api/customers', headers=headers).get_json())
+    
+    client.post('/api/customers', headers=headers, json={
+        'name': 'Fresh', 'company': 'Bench', 'email': 'fresh@example.com', 'status': 'new'
+    })
+    seen = {'after_write': visible()}
+    time.sleep(sticky_seconds + 0.5)
+    seen['after_window'] = visible()
+    replicate(primary, replica)
+    seen['after_replication'] = visible()
+    
+    expected = {'after_write': 1, 'after_window': 0, 'after_replication': 1}
+    for step, count in seen.items():
+        print(f'  {step:18} {count} customer(s) visible, expected {expected[step]}')
+    if seen != expected:
+        raise SystemExit('Replica routing check failed')
+    return seen
+
+def time_reads(crm, email, seconds):
+    """List reads from one client while another keeps writing; returns read latency stats."""
+    read_client = crm.app.test_client()
+    write_client = crm.app.test_client()
+    read_headers = login(read_client, email, seeding.BENCH_PASSWORD)
+    write_headers = login(write_client, 'replica@example.com', 'replica')
+    
+    deadline = time.perf_counter() + seconds
+    writes = 0
+    
+    def writer():
+        nonlocal writes
+        while time.perf_counter() < deadline:
+            response = write_client.post('/api/customers', headers=write_headers, json={
+                'name': f'Writer {writes}', 'company': 'Bench', 'email': f'writer{writes}@example.com', 'status': 'new'
+            })
+            writes += response.status_code == 201
+    
+    thread = threading.Thread(target=writer)
+    thread.start()
+    latencies = []
+    errors = 0
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        # Uncached, so the reads reach whichever database they are routed to
+        status = read_client.get(uncached(PATHS[len(latencies) % len(PATHS)]), headers=read_headers).status_code
+        if status >= 500:
+            errors += 1
+        else:
+            latencies.append(time.perf_counter() - start)
+    thread.join()
+    
+    latencies.sort()
+    return {
+        'reads': len(latencies),
+        'errors': errors,
+        'writes': writes,
+        'throughput_rps': round(len(latencies) / seconds, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2) if latencies else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    seeding.add_arguments(parser)
+    parser.set_defaults(users=5, customers=5000, contacts=2000, deals=2000, tasks=2000)
+    parser.add_argument('--seconds', type=float, default=10, help='duration of each timed run')
+    parser.add_argument('--sticky-seconds', type=float, default=1)
+    parser.add_argument('--no-check', action='store_true', help='skip the routing check (for non-SQLite databases)')
+    parser.add_argument('--output', help='result file (default bench/results/replica-<commit>.json)')
+    args = parser.parse_args()
+    
+    directory = tempfile.mkdtemp(prefix='crm-bench-')
+    primary = os.path.join(directory, 'primary.db')
+    replica = os.path.join(directory, 'replica.db')
+    os.environ.setdefault('DATABASE_URL', 'sqlite:///' + primary)
+    os.environ.setdefault('DATABASE_REPLICA_URLS', 'sqlite:///' + replica)
+    os.environ['REPLICA_STICKY_SECONDS'] = str(args.sticky_seconds)
+    os.environ['CACHE_BACKEND'] = 'sqlite'
+    os.environ.setdefault('CACHE_PATH', os.path.join(directory, 'cache.sqlite3'))
+    
+    import app as crm
+    with crm.app.app_context():
+        tenants = seeding.seed(**seeding.seed_options(args))
+    
+    results = {
+        'commit': git_commit(),
+        'timestamp': datetime.datetime.utcnow().isoformat(),
+        'sticky_seconds': args.sticky_seconds,
+        'seconds': args.seconds,
+        'paths': PATHS,
+    }
+    if not args.no_check:
+        replicate(primary, replica)
+        print('Routing check')
+        results['check'] = check_routing(crm, primary, replica, args.sticky_seconds)
+    
+    print(f'\n{"reads":8} {"req/s":>9} {"p50":>9} {"p95":>9} {"errors":>7} {"writes":>7}')
+    replica_binds = list(crm.REPLICA_BINDS)
+    for name in ('replica', 'primary'):
+        # Emptying the bind list turns routing off without reloading the app
+        crm.REPLICA_BINDS[:] = replica_binds if name == 'replica' else []
+        stats = results[name] = time_reads(crm, tenants[0]['email'], args.seconds)
+        print(f'{name:8} {stats["throughput_rps"]:9.1f} {stats["p50_ms"] or 0:9.1f} '
+              f'{stats["p95_ms"] or 0:9.1f} {stats["errors"]:7} {stats["writes"]:7}')
+    crm.REPLICA_BINDS[:] = replica_binds
+    
+    output = args.output or os.path.join(BENCH_DIR, 'results', f'replica-{results["commit"]}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'\nSaved {output}')
+
+if __name__ == '__main__':
+    main()
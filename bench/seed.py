@@ -0,0 +1,197 @@
+"""Synthetic multi-tenant data generator for benchmarks.
+
+Rows are spread across users with a Zipf-like skew, so a few tenants own
+most of the data the way they do in production, while the long tail owns
+a handful of records each. Generation is deterministic for a given --seed.
+
+Seed the database named by DATABASE_URL (SQLite or Postgres):
+
+    DATABASE_URL=sqlite:////tmp/bench.db python bench/seed.py --customers 20000
+
+Every generated user can log in with BENCH_PASSWORD.
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+BENCH_PASSWORD = 'bench-password'
+
+CUSTOMER_STATUSES = (('new', 5), ('contacted', 3), ('qualified', 2))
+DEAL_STAGES = (('prospect', 4), ('negotiation', 3), ('proposal', 2), ('won', 2), ('lost', 1))
+TASK_STATUSES = (('pending', 5), ('in_progress', 2), ('completed', 3))
+TASK_PRIORITIES = (('low', 2), ('medium', 5), ('high', 2))
+TASK_RELATED = (('customer', 4), ('contact', 2), ('deal', 3), ('', 1))
+
+FIRST_NAMES = ('Ana', 'Luis', 'María', 'José', 'Carmen', 'Jorge', 'Lucía', 'Pedro', 'Elena', 'Diego')
+LAST_NAMES = ('García', 'Rodríguez', 'López', 'Martínez', 'Pérez', 'Sánchez', 'Romero', 'Torres')
+COMPANY_WORDS = ('Andes', 'Pacífico', 'Solar', 'Norte', 'Vértice', 'Delta', 'Cumbre', 'Río')
+COMPANY_SUFFIXES = ('S.A.', 'Ltda.', 'Group', 'Tech', 'Logística', 'Consultores')
+DEAL_WORDS = ('Licencia', 'Renovación', 'Implementación', 'Soporte', 'Migración', 'Consultoría')
+TASK_WORDS = ('Llamar a', 'Enviar propuesta a', 'Reunión con', 'Seguimiento de', 'Revisar contrato de')
+
+def zipf_split(total, buckets, skew):
+    """Split total items into buckets with weights 1/rank**skew; every bucket gets at least one."""
+    weights = [1 / (rank ** skew) for rank in range(1, buckets + 1)]
+    scale = max(total - buckets, 0) / sum(weights)
+    counts = [1 + int(weight * scale) for weight in weights]
+    counts[0] += max(total - sum(counts), 0)
+    return counts
+
+def pick(rng, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights)[0]
+
+def person(rng):
+    return f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+
+def moment(rng, now, days=365):
+    # Recent records are more common than old ones
+    return now - datetime.timedelta(days=days * rng.random() ** 2, seconds=rng.randrange(86400))
+
+def seed(users=20, customers=2000, contacts=4000, deals=3000, tasks=5000, skew=1.1, seed=42, batch_size=1000):
+    """Insert synthetic tenants and their records; return [{'id', 'email', <entity>: count}] per user."""
+    from app import db, hash_password, rebuild_pipeline_summary, User, Customer, Contact, Deal, Task
+    
+    rng = random.Random(seed)
+    now = datetime.datetime.utcnow()
+    password = hash_password(BENCH_PASSWORD)
+    
+    def insert(model, rows):
+        for start in range(0, len(rows), batch_size):
+            db.session.execute(db.insert(model), rows[start:start + batch_size])
+    
+    def owned_ids(model, user_id):
+        return [row.id for row in db.session.query(model.id).filter(model.user_id == user_id).order_by(model.id)]
+    
+    tenants = []
+    splits = zip(*(zipf_split(total, users, skew) for total in (customers, contacts, deals, tasks)))
+    for index, (n_customers, n_contacts, n_deals, n_tasks) in enumerate(splits):
+        email = f'bench-{seed}-{index}@example.com'
+        user = User(name=person(rng), email=email, password=password)
+        db.session.add(user)
+        db.session.flush()
+        
+        rows = []
+        for _ in range(n_customers):
+            created_at = moment(rng, now)
+            name = person(rng)
+            rows.append({
+                'name': name,
+                'company': f'{rng.choice(COMPANY_WORDS)} {rng.choice(COMPANY_SUFFIXES)}',
+                'email': name.lower().replace(' ', '.') + f'{rng.randrange(1000)}@example.com',
+                'phone': f'+56 9 {rng.randrange(10000000, 99999999)}',
+                'status': pick(rng, CUSTOMER_STATUSES),
+                'notes': rng.choice(('', '', 'Cliente referido', 'Interesado en plan anual')),
+                'created_at': created_at,
+                'updated_at': created_at,
+                'user_id': user.id,
+            })
+        insert(Customer, rows)
+        customer_ids = owned_ids(Customer, user.id)
+        
+        def customer_id():
+            # Some customers accumulate most of the contacts and deals
+            return customer_ids[min(int(rng.paretovariate(1.5)) - 1, len(customer_ids) - 1)]
+        
+        rows = []
+        for _ in range(n_contacts):
+            created_at = moment(rng, now)
+            name = person(rng)
+            rows.append({
+                'name': name,
+                'position': rng.choice(('Gerente', 'CTO', 'Compras', 'Ventas', '')),
+                'email': name.lower().replace(' ', '.') + f'{rng.randrange(1000)}@example.com',
+                'phone': f'+56 9 {rng.randrange(10000000, 99999999)}',
+                'notes': '',
+                'customer_id': customer_id(),
+                'created_at': created_at,
+                'updated_at': created_at,
+                'user_id': user.id,
+            })
+        insert(Contact, rows)
+        
+        rows = []
+        for _ in range(n_deals):
+            created_at = moment(rng, now)
+            rows.append({
+                'title': f'{rng.choice(DEAL_WORDS)} {rng.choice(COMPANY_WORDS)}',
+                'value': round(rng.lognormvariate(8, 1.2), 2),
+                'stage': pick(rng, DEAL_STAGES),
+                'close_date': (created_at + datetime.timedelta(days=rng.randrange(120))).date(),
+                'notes': '',
+                'customer_id': customer_id(),
+                'created_at': created_at,
+                'updated_at': created_at,
+                'user_id': user.id,
+            })
+        insert(Deal, rows)
+        # Bulk inserts skip the ORM events that keep the pipeline summary current
+        rebuild_pipeline_summary(db.session.connection(), user.id)
+        
+        related_ids = {
+            'customer': customer_ids,
+            'contact': owned_ids(Contact, user.id),
+            'deal': owned_ids(Deal, user.id),
+        }
+        rows = []
+        for _ in range(n_tasks):
+            created_at = moment(rng, now)
+            related_type = pick(rng, TASK_RELATED)
+            if not related_ids.get(related_type):
+                related_type = ''
+            related_id = rng.choice(related_ids[related_type]) if related_type else None
+            rows.append({
+                'title': f'{rng.choice(TASK_WORDS)} {person(rng)}',
+                'related_type': related_type,
+                'related_id': related_id,
+                'due_date': (now + datetime.timedelta(days=rng.randrange(-30, 60))).date(),
+                'priority': pick(rng, TASK_PRIORITIES),
+                'status': pick(rng, TASK_STATUSES),
+                'description': '',
+                'created_at': created_at,
+                'updated_at': created_at,
+                'user_id': user.id,
+            })
+        insert(Task, rows)
+        db.session.commit()
+        
+        tenants.append({
+            'id': user.id,
+            'email': email,
+            'customers': n_customers,
+            'contacts': n_contacts,
+            'deals': n_deals,
+            'tasks': n_tasks,
+        })
+    
+    return tenants
+
+def add_arguments(parser):
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--customers', type=int, default=2000)
+    parser.add_argument('--contacts', type=int, default=4000)
+    parser.add_argument('--deals', type=int, default=3000)
+    parser.add_argument('--tasks', type=int, default=5000)
+    parser.add_argument('--skew', type=float, default=1.1, help='Zipf exponent of rows per user')
+    parser.add_argument('--seed', type=int, default=42)
+
+def seed_options(args):
+    return {name: getattr(args, name) for name in ('users', 'customers', 'contacts', 'deals', 'tasks', 'skew', 'seed')}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_arguments(parser)
+    args = parser.parse_args()
+    
+    from app import app
+    with app.app_context():
+        tenants = seed(**seed_options(args))
+    
+    print(f'Seeded {len(tenants)} users; largest tenant:', tenants[0])
+
+if __name__ == '__main__':
+    main()
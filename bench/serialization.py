@@ -0,0 +1,124 @@
+"""Micro-benchmark: hand-built response dicts vs. the precompiled serializers.
+
+Seeds 50k customers and 50k deals into an in-memory SQLite database and times
+building the JSON body of a full list both ways:
+
+  legacy      ORM instances, one hand-built dict per row, stdlib json
+  serializer  row tuples of the needed columns, Serializer.dicts(), dumps()
+
+Run from the repository root:
+
+    python bench/serialization.py [rows] [repeat]
+
+dumps() uses orjson when it is installed; run once with and once without it
+to see how much of the gain comes from the encoder.
+"""
+import datetime
+import json
+import os
+import sys
+import time
+
+os.environ['DATABASE_URL'] = 'sqlite://'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import app as crm
+from app import app, db, Customer, Deal, User
+
+def seed(rows):
+    user = User(name='bench', email='bench@example.com', password='-')
+    db.session.add(user)
+    db.session.flush()
+    
+    now = datetime.datetime.utcnow()
+    db.session.execute(db.insert(Customer), [
+        {'name': f'Customer {i}', 'company': f'Company {i % 500}', 'email': f'c{i}@example.com',
+         'phone': '555-0100', 'status': 'active', 'notes': 'Seeded for the benchmark',
+         'user_id': user.id, 'created_at': now, 'updated_at': now}
+        for i in range(rows)
+    ])
+    db.session.execute(db.insert(Deal), [
+        {'title': f'Deal {i}', 'value': i * 10.5, 'stage': 'negotiation',
+         'close_date': datetime.date(2026, 1, 1) + datetime.timedelta(days=i % 365), 'notes': '',
+         'customer_id': i + 1, 'user_id': user.id, 'created_at': now, 'updated_at': now}
+        for i in range(rows)
+    ])
+    db.session.commit()
+    return user.id
+
+def legacy_customers(user_id):
+    customers = Customer.query.filter_by(user_id=user_id).order_by(Customer.created_at, Customer.id).all()
+    return json.dumps([{
+        'id': customer.id,
+        'name': customer.name,
+        'company': customer.company,
+        'email': customer.email,
+        'phone': customer.phone,
+        'status': customer.status,
+        'notes': customer.notes,
+        'created_at': customer.created_at.isoformat(),
+        'updated_at': customer.updated_at.isoformat()
+    } for customer in customers]).encode()
+
+def serializer_customers(user_id):
+    fields = crm.CUSTOMER_FIELDS
+    rows = db.session.query(*crm.CUSTOMER_SERIALIZER.columns(fields)).filter(
+        Customer.user_id == user_id
+    ).order_by(Customer.created_at, Customer.id).all()
+    return crm.dumps(crm.CUSTOMER_SERIALIZER.dicts(rows, fields))
+
+def legacy_deals(user_id):
+    deals = Deal.query.options(
+        db.joinedload(Deal.customer).load_only(Customer.name)
+    ).filter_by(user_id=user_id).order_by(Deal.created_at, Deal.id).all()
+    return json.dumps([{
+        'id': deal.id,
+        'title': deal.title,
+        'value': deal.value,
+        'stage': deal.stage,
+        'close_date': deal.close_date.isoformat() if deal.close_date else None,
+        'notes': deal.notes,
+        'customer_id': deal.customer_id,
+        'customer_name': deal.customer.name,
+        'created_at': deal.created_at.isoformat(),
+        'updated_at': deal.updated_at.isoformat()
+    } for deal in deals]).encode()
+
+def serializer_deals(user_id):
+    fields = crm.DEAL_FIELDS
+    rows = db.session.query(*crm.DEAL_SERIALIZER.columns(fields)).join(
+        Customer, Deal.customer_id == Customer.id
+    ).add_columns(Customer.name.label('customer_name')).filter(
+        Deal.user_id == user_id
+    ).order_by(Deal.created_at, Deal.id).all()
+    return crm.dumps(crm.DEAL_SERIALIZER.dicts(rows, fields))
+
+def measure(f, user_id, repeat):
+    timings = []
+    for _ in range(repeat):
+        db.session.expunge_all()
+        start = time.perf_counter()
+        body = f(user_id)
+        timings.append(time.perf_counter() - start)
+    return min(timings), len(body)
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    
+    with app.app_context():
+        user_id = seed(rows)
+        print(f'{rows} rows per list, best of {repeat}, json backend: {"orjson" if crm.orjson else "json"}')
+        
+        for name, legacy, current in (
+            ('customers', legacy_customers, serializer_customers),
+            ('deals', legacy_deals, serializer_deals),
+        ):
+            assert json.loads(legacy(user_id)) == json.loads(current(user_id))
+            legacy_time, size = measure(legacy, user_id, repeat)
+            current_time, _ = measure(current, user_id, repeat)
+            print(f'{name:10} legacy {legacy_time * 1000:8.1f} ms   serializer {current_time * 1000:8.1f} ms'
+                  f'   x{legacy_time / current_time:.1f}   ({size / 1024 / 1024:.1f} MiB)')
+
+if __name__ == '__main__':
+    main()
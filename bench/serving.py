@@ -0,0 +1,165 @@
+"""Compare concurrent-request throughput of the WSGI and ASGI serving modes.
+
+Seeds a database, then for each mode starts the server as a subprocess,
+gunicorn app:app with sync workers or uvicorn asgi:application. It drives
+authenticated GET requests from 100-1000 concurrent asyncio clients and
+reports throughput, latency percentiles and errors per concurrency level:
+
+    DATABASE_URL=postgresql://localhost/crm_bench python bench/serving.py --workers 4
+    python bench/serving.py --levels 100,250,500,1000 --seconds 10
+
+Each request gets a query parameter of its own, so the versioned response
+cache does not answer it and both modes run the list and dashboard queries.
+
+SQLite works too but serializes at the database, so the gap between the
+modes shows best on Postgres, where queries wait on the network.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.join(BENCH_DIR, '..')
+sys.path.insert(0, ROOT_DIR)
+
+import seed as seeding
+from load import git_commit, percentile, uncached
+
+PATHS = ('/api/customers?limit=50', '/api/deals?limit=50', '/api/tasks?limit=50', '/api/dashboard')
+
+SERVERS = {
+    'wsgi': lambda port, workers: ['gunicorn', 'app:app', '-b', f'127.0.0.1:{port}', '-w', str(workers), '--backlog', '4096'],
+    'asgi': lambda port, workers: ['uvicorn', 'asgi:application', '--host', '127.0.0.1', '--port', str(port),
+                                   '--workers', str(workers), '--backlog', '4096', '--no-access-log'],
+}
+
+def start_server(mode, port, workers):
+    process = subprocess.Popen(SERVERS[mode](port, workers), cwd=ROOT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/login', timeout=1).read()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise SystemExit(f'{mode} server did not start')
+
+def login(port, email):
+    request = urllib.request.Request(
+        f'http://127.0.0.1:{port}/api/auth/login',
+        data=json.dumps({'email': email, 'password': seeding.BENCH_PASSWORD}).encode(),
+        headers={'Content-Type': 'application/json'}
+    )
+    return json.loads(urllib.request.urlopen(request).read())['token']
+
+async def fetch(port, path, token):
+    """One GET on a fresh connection; returns the status code."""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        writer.write((
+            f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nAuthorization: Bearer {token}\r\n'
+            'Connection: close\r\n\r\n'
+        ).encode())
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+async def drive(port, tokens, concurrency, seconds):
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + seconds
+    
+    async def client(index):
+        nonlocal errors
+        token = tokens[index % len(tokens)]
+        request_number = index
+        while time.perf_counter() < deadline:
+            path = uncached(PATHS[request_number % len(PATHS)])
+            request_number += 1
+            start = time.perf_counter()
+            try:
+                status = await asyncio.wait_for(fetch(port, path, token), timeout=60)
+            except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+                status = 599
+            if status >= 400:
+                errors += 1
+            else:
+                latencies.append(time.perf_counter() - start)
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(client(index) for index in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    
+    latencies.sort()
+    return {
+        'requests': len(latencies) + errors,
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    seeding.add_arguments(parser)
+    parser.add_argument('--modes', default='wsgi,asgi')
+    parser.add_argument('--levels', default='100,250,500,1000', help='comma separated client counts')
+    parser.add_argument('--seconds', type=float, default=10, help='duration of each level')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--output', help='result file (default bench/results/serving-<commit>.json)')
+    args = parser.parse_args()
+    
+    if not os.environ.get('DATABASE_URL'):
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='crm-bench-'), 'bench.db')
+    
+    from app import app
+    with app.app_context():
+        tenants = seeding.seed(**seeding.seed_options(args))
+    
+    levels = [int(level) for level in args.levels.split(',')]
+    results = {
+        'commit': git_commit(),
+        'timestamp': datetime.datetime.utcnow().isoformat(),
+        'database': app.config['SQLALCHEMY_DATABASE_URI'].split(':', 1)[0],
+        'workers': args.workers,
+        'seconds_per_level': args.seconds,
+        'paths': PATHS,
+        'modes': {},
+    }
+    
+    print(f'{"mode":6} {"clients":>8} {"req/s":>9} {"p50":>9} {"p95":>9} {"p99":>9} {"errors":>7}')
+    for mode in args.modes.split(','):
+        process = start_server(mode, args.port, args.workers)
+        try:
+            tokens = [login(args.port, tenant['email']) for tenant in tenants[:10]]
+            results['modes'][mode] = {}
+            for level in levels:
+                stats = asyncio.run(drive(args.port, tokens, level, args.seconds))
+                results['modes'][mode][level] = stats
+                print(f'{mode:6} {level:8} {stats["throughput_rps"]:9.1f} {stats["p50_ms"] or 0:9.1f} '
+                      f'{stats["p95_ms"] or 0:9.1f} {stats["p99_ms"] or 0:9.1f} {stats["errors"]:7}')
+        finally:
+            process.terminate()
+            process.wait()
+    
+    output = args.output or os.path.join(BENCH_DIR, 'results', f'serving-{results["commit"]}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'\nSaved {output}')
+
+if __name__ == '__main__':
+    main()
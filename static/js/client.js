@@ -60,6 +60,42 @@ async function logout() {
 
 // API Helper Functions
 async function fetchApi(endpoint, method = 'GET', data = null) {
+    const result = await requestApi(endpoint, method, data);
+    return result ? result.data : undefined;
+}
+
+// Turn a ?format=compact page back into one object per row
+function expandCompactPage(page) {
+    return page.rows.map(values => {
+        const item = {};
+        page.columns.forEach((column, index) => {
+            item[column] = values[index];
+        });
+        if (page.customers) {
+            item.customer_name = page.customers[item.customer_id];
+        }
+        return item;
+    });
+}
+
+// Fetch every page of a cursor-paginated list endpoint, calling onPage with each batch
+async function fetchPages(endpoint, onPage) {
+    // The compact layout sends each column name and customer name once per page
+    const compactEndpoint = `${endpoint}${endpoint.includes('?') ? '&' : '?'}format=compact`;
+    let cursor = null;
+    
+    do {
+        const pageEndpoint = cursor ? `${compactEndpoint}&cursor=${encodeURIComponent(cursor)}` : compactEndpoint;
+        const result = await requestApi(pageEndpoint);
+        
+        if (!result) return;
+        
+        onPage(expandCompactPage(result.data));
+        cursor = result.headers.get('X-Next-Cursor');
+    } while (cursor);
+}
+
+async function requestApi(endpoint, method = 'GET', data = null) {
     const token = localStorage.getItem('authToken');
     
     if (!token) {
@@ -87,7 +123,7 @@ async function fetchApi(endpoint, method = 'GET', data = null) {
             throw new Error(responseData.error || 'Error en la solicitud');
         }
         
-        return responseData;
+        return { data: responseData, headers: response.headers };
     } catch (error) {
         console.error(`API error (${endpoint}):`, error);
         
@@ -182,44 +218,23 @@ function setupModal(triggerButtonId, modalId) {
 // Customers Functions
 async function loadCustomers() {
     try {
-        const customers = await fetchApi('customers');
         const tableBody = document.getElementById('customers-table-body');
         
         if (!tableBody) return;
         
         tableBody.innerHTML = '';
+        let total = 0;
         
-        if (customers.length === 0) {
+        await fetchPages('customers', customers => {
+            total += customers.length;
+            tableBody.insertAdjacentHTML('beforeend', customers.map(customerRow).join(''));
+        });
+        
+        if (total === 0) {
             tableBody.innerHTML = '<tr><td colspan="6" class="text-center">No hay clientes. ¡Añade tu primer cliente!</td></tr>';
             return;
         }
         
-        customers.forEach(customer => {
-            let statusText = '';
-            switch(customer.status) {
-                case 'new': statusText = 'Nuevo'; break;
-                case 'contacted': statusText = 'Contactado'; break;
-                case 'qualified': statusText = 'Calificado'; break;
-                default: statusText = customer.status;
-            }
-            
-            const row = `
-                <tr data-id="${customer.id}">
-                    <td>${customer.name}</td>
-                    <td>${customer.company}</td>
-                    <td>${customer.email}</td>
-                    <td>${customer.phone || '-'}</td>
-                    <td>${statusText}</td>
-                    <td>
-                        <button class="btn btn-small edit-customer">Editar</button>
-                        <button class="btn btn-small btn-danger delete-customer">Eliminar</button>
-                    </td>
-                </tr>
-            `;
-            
-            tableBody.innerHTML += row;
-        });
-        
         // Add event listeners to edit/delete buttons
         setupCustomerActions();
         
@@ -228,6 +243,30 @@ async function loadCustomers() {
     }
 }
 
+function customerRow(customer) {
+    let statusText = '';
+    switch(customer.status) {
+        case 'new': statusText = 'Nuevo'; break;
+        case 'contacted': statusText = 'Contactado'; break;
+        case 'qualified': statusText = 'Calificado'; break;
+        default: statusText = customer.status;
+    }
+    
+    return `
+        <tr data-id="${customer.id}">
+            <td>${customer.name}</td>
+            <td>${customer.company}</td>
+            <td>${customer.email}</td>
+            <td>${customer.phone || '-'}</td>
+            <td>${statusText}</td>
+            <td>
+                <button class="btn btn-small edit-customer">Editar</button>
+                <button class="btn btn-small btn-danger delete-customer">Eliminar</button>
+            </td>
+        </tr>
+    `;
+}
+
 function setupCustomerActions() {
     // Edit customer
     document.querySelectorAll('.edit-customer').forEach(button => {
@@ -247,7 +286,7 @@ function setupCustomerActions() {
             const row = button.closest('tr');
             const customerId = row.getAttribute('data-id');
             
-            if (confirm('¿Estás seguro de que deseas eliminar este cliente?')) {
+            if (confirm('¿Estás seguro de que deseas eliminar este cliente? También se eliminarán sus contactos, oportunidades y tareas relacionadas.')) {
                 try {
                     await fetchApi(`customers/${customerId}`, 'DELETE');
                     await loadCustomers(); // Reload the list
@@ -297,36 +336,23 @@ function setupCustomerForm() {
 // Contacts Functions
 async function loadContacts() {
     try {
-        const contacts = await fetchApi('contacts');
         const tableBody = document.querySelector('#contacts .table-container tbody');
         
         if (!tableBody) return;
         
         tableBody.innerHTML = '';
+        let total = 0;
         
-        if (contacts.length === 0) {
+        await fetchPages('contacts', contacts => {
+            total += contacts.length;
+            tableBody.insertAdjacentHTML('beforeend', contacts.map(contactRow).join(''));
+        });
+        
+        if (total === 0) {
             tableBody.innerHTML = '<tr><td colspan="6" class="text-center">No hay contactos. ¡Añade tu primer contacto!</td></tr>';
             return;
         }
         
-        contacts.forEach(contact => {
-            const row = `
-                <tr data-id="${contact.id}">
-                    <td>${contact.name}</td>
-                    <td>${contact.customer_name}</td>
-                    <td>${contact.email}</td>
-                    <td>${contact.phone || '-'}</td>
-                    <td>${contact.position || '-'}</td>
-                    <td>
-                        <button class="btn btn-small edit-contact">Editar</button>
-                        <button class="btn btn-small btn-danger delete-contact">Eliminar</button>
-                    </td>
-                </tr>
-            `;
-            
-            tableBody.innerHTML += row;
-        });
-        
         // Setup contact actions
         setupContactActions();
         
@@ -335,6 +361,22 @@ async function loadContacts() {
     }
 }
 
+function contactRow(contact) {
+    return `
+        <tr data-id="${contact.id}">
+            <td>${contact.name}</td>
+            <td>${contact.customer_name}</td>
+            <td>${contact.email}</td>
+            <td>${contact.phone || '-'}</td>
+            <td>${contact.position || '-'}</td>
+            <td>
+                <button class="btn btn-small edit-contact">Editar</button>
+                <button class="btn btn-small btn-danger delete-contact">Eliminar</button>
+            </td>
+        </tr>
+    `;
+}
+
 function setupContactActions() {
     // Similar to customer actions
     document.querySelectorAll('.edit-contact').forEach(button => {
@@ -362,26 +404,52 @@ function setupContactActions() {
     });
 }
 
+// Customer picker: fills select with the customers whose name starts with what is
+// typed in searchInput. Returns a function that refreshes the options right away.
+function setupCustomerPicker(searchInput, select, placeholder) {
+    let timer = null;
+    let latestLookup = 0;
+    
+    const refresh = async () => {
+        const lookup = ++latestLookup;
+        const prefix = searchInput.value;
+        
+        try {
+            const customers = await fetchApi(`customers/lookup?prefix=${encodeURIComponent(prefix)}`);
+            
+            // Ignore answers that arrive after a newer keystroke's
+            if (!customers || lookup !== latestLookup) return;
+            
+            const options = customers.map(customer => `<option value="${customer.id}">${customer.name} (${customer.company})</option>`);
+            select.innerHTML = `<option value="">${placeholder}</option>` + options.join('');
+            
+            if (prefix.trim() && customers.length > 0) {
+                select.value = customers[0].id;
+            }
+        } catch (error) {
+            console.error('Error looking up customers:', error);
+        }
+    };
+    
+    searchInput.addEventListener('input', () => {
+        clearTimeout(timer);
+        timer = setTimeout(refresh, 150);
+    });
+    
+    return refresh;
+}
+
 // Setup contact form
 async function setupContactForm() {
     const form = document.getElementById('contact-form');
     const customerSelect = document.getElementById('contact-customer');
+    const customerSearch = document.getElementById('contact-customer-search');
     
-    if (!form || !customerSelect) return;
+    if (!form || !customerSelect || !customerSearch) return;
     
-    // Load customers for the dropdown
-    try {
-        const customers = await fetchApi('customers');
-        
-        customerSelect.innerHTML = '<option value="">Seleccionar cliente...</option>';
-        
-        customers.forEach(customer => {
-            const option = `<option value="${customer.id}">${customer.name} (${customer.company})</option>`;
-            customerSelect.innerHTML += option;
-        });
-    } catch (error) {
-        console.error('Error loading customers for contact form:', error);
-    }
+    // Offer the customers matching what is typed instead of loading them all
+    const refreshCustomers = setupCustomerPicker(customerSearch, customerSelect, 'Seleccionar cliente...');
+    await refreshCustomers();
     
     form.addEventListener('submit', async (e) => {
         e.preventDefault();
@@ -415,46 +483,23 @@ async function setupContactForm() {
 // Deals Functions
 async function loadDeals() {
     try {
-        const deals = await fetchApi('deals');
         const tableBody = document.querySelector('#deals .table-container tbody');
         
         if (!tableBody) return;
         
         tableBody.innerHTML = '';
+        let total = 0;
         
-        if (deals.length === 0) {
+        await fetchPages('deals', deals => {
+            total += deals.length;
+            tableBody.insertAdjacentHTML('beforeend', deals.map(dealRow).join(''));
+        });
+        
+        if (total === 0) {
             tableBody.innerHTML = '<tr><td colspan="6" class="text-center">No hay oportunidades. ¡Añade tu primera oportunidad!</td></tr>';
             return;
         }
         
-        deals.forEach(deal => {
-            let stageText = '';
-            switch(deal.stage) {
-                case 'prospect': stageText = 'Prospecto'; break;
-                case 'negotiation': stageText = 'Negociación'; break;
-                case 'proposal': stageText = 'Propuesta'; break;
-                case 'won': stageText = 'Ganada'; break;
-                case 'lost': stageText = 'Perdida'; break;
-                default: stageText = deal.stage;
-            }
-            
-            const row = `
-                <tr data-id="${deal.id}">
-                    <td>${deal.title}</td>
-                    <td>${deal.customer_name}</td>
-                    <td>$${deal.value.toFixed(2)}</td>
-                    <td>${stageText}</td>
-                    <td>${deal.close_date || '-'}</td>
-                    <td>
-                        <button class="btn btn-small edit-deal">Editar</button>
-                        <button class="btn btn-small btn-danger delete-deal">Eliminar</button>
-                    </td>
-                </tr>
-            `;
-            
-            tableBody.innerHTML += row;
-        });
-        
         // Setup deal actions
         setupDealActions();
         
@@ -463,6 +508,32 @@ async function loadDeals() {
     }
 }
 
+function dealRow(deal) {
+    let stageText = '';
+    switch(deal.stage) {
+        case 'prospect': stageText = 'Prospecto'; break;
+        case 'negotiation': stageText = 'Negociación'; break;
+        case 'proposal': stageText = 'Propuesta'; break;
+        case 'won': stageText = 'Ganada'; break;
+        case 'lost': stageText = 'Perdida'; break;
+        default: stageText = deal.stage;
+    }
+    
+    return `
+        <tr data-id="${deal.id}">
+            <td>${deal.title}</td>
+            <td>${deal.customer_name}</td>
+            <td>$${deal.value.toFixed(2)}</td>
+            <td>${stageText}</td>
+            <td>${deal.close_date || '-'}</td>
+            <td>
+                <button class="btn btn-small edit-deal">Editar</button>
+                <button class="btn btn-small btn-danger delete-deal">Eliminar</button>
+            </td>
+        </tr>
+    `;
+}
+
 function setupDealActions() {
     // Similar to customer/contact actions
     document.querySelectorAll('.edit-deal').forEach(button => {
@@ -494,22 +565,13 @@ function setupDealActions() {
 async function setupDealForm() {
     const form = document.getElementById('deal-form');
     const customerSelect = document.getElementById('deal-customer');
+    const customerSearch = document.getElementById('deal-customer-search');
     
-    if (!form || !customerSelect) return;
+    if (!form || !customerSelect || !customerSearch) return;
     
-    // Load customers for the dropdown
-    try {
-        const customers = await fetchApi('customers');
-        
-        customerSelect.innerHTML = '<option value="">Seleccionar cliente...</option>';
-        
-        customers.forEach(customer => {
-            const option = `<option value="${customer.id}">${customer.name} (${customer.company})</option>`;
-            customerSelect.innerHTML += option;
-        });
-    } catch (error) {
-        console.error('Error loading customers for deal form:', error);
-    }
+    // Offer the customers matching what is typed instead of loading them all
+    const refreshCustomers = setupCustomerPicker(customerSearch, customerSelect, 'Seleccionar cliente...');
+    await refreshCustomers();
     
     form.addEventListener('submit', async (e) => {
         e.preventDefault();
@@ -543,54 +605,23 @@ async function setupDealForm() {
 // Tasks Functions
 async function loadTasks() {
     try {
-        const tasks = await fetchApi('tasks');
         const tableBody = document.querySelector('#tasks .table-container tbody');
         
         if (!tableBody) return;
         
         tableBody.innerHTML = '';
+        let total = 0;
+        
+        await fetchPages('tasks', tasks => {
+            total += tasks.length;
+            tableBody.insertAdjacentHTML('beforeend', tasks.map(taskRow).join(''));
+        });
         
-        if (tasks.length === 0) {
+        if (total === 0) {
             tableBody.innerHTML = '<tr><td colspan="6" class="text-center">No hay tareas. ¡Añade tu primera tarea!</td></tr>';
             return;
         }
         
-        tasks.forEach(task => {
-            let priorityText = '';
-            switch(task.priority) {
-                case 'low': priorityText = 'Baja'; break;
-                case 'medium': priorityText = 'Media'; break;
-                case 'high': priorityText = 'Alta'; break;
-                default: priorityText = task.priority;
-            }
-            
-            let statusText = '';
-            switch(task.status) {
-                case 'pending': statusText = 'Pendiente'; break;
-                case 'in_progress': statusText = 'En Progreso'; break;
-                case 'completed': statusText = 'Completada'; break;
-                default: statusText = task.status;
-            }
-            
-            const relatedText = task.related_name ? `${task.related_name}` : 'General';
-            
-            const row = `
-                <tr data-id="${task.id}">
-                    <td>${task.title}</td>
-                    <td>${relatedText}</td>
-                    <td>${task.due_date}</td>
-                    <td>${priorityText}</td>
-                    <td>${statusText}</td>
-                    <td>
-                        <button class="btn btn-small edit-task">Editar</button>
-                        <button class="btn btn-small btn-danger delete-task">Eliminar</button>
-                    </td>
-                </tr>
-            `;
-            
-            tableBody.innerHTML += row;
-        });
-        
         // Setup task actions
         setupTaskActions();
         
@@ -599,6 +630,40 @@ async function loadTasks() {
     }
 }
 
+function taskRow(task) {
+    let priorityText = '';
+    switch(task.priority) {
+        case 'low': priorityText = 'Baja'; break;
+        case 'medium': priorityText = 'Media'; break;
+        case 'high': priorityText = 'Alta'; break;
+        default: priorityText = task.priority;
+    }
+    
+    let statusText = '';
+    switch(task.status) {
+        case 'pending': statusText = 'Pendiente'; break;
+        case 'in_progress': statusText = 'En Progreso'; break;
+        case 'completed': statusText = 'Completada'; break;
+        default: statusText = task.status;
+    }
+    
+    const relatedText = task.related_name ? `${task.related_name}` : 'General';
+    
+    return `
+        <tr data-id="${task.id}">
+            <td>${task.title}</td>
+            <td>${relatedText}</td>
+            <td>${task.due_date}</td>
+            <td>${priorityText}</td>
+            <td>${statusText}</td>
+            <td>
+                <button class="btn btn-small edit-task">Editar</button>
+                <button class="btn btn-small btn-danger delete-task">Eliminar</button>
+            </td>
+        </tr>
+    `;
+}
+
 function setupTaskActions() {
     // Similar to other entity actions
     document.querySelectorAll('.edit-task').forEach(button => {
@@ -631,8 +696,11 @@ async function setupTaskForm() {
     const form = document.getElementById('task-form');
     const relatedTypeSelect = document.getElementById('task-related-type');
     const relatedIdSelect = document.getElementById('task-related-id');
+    const relatedSearch = document.getElementById('task-related-search');
     
-    if (!form || !relatedTypeSelect || !relatedIdSelect) return;
+    if (!form || !relatedTypeSelect || !relatedIdSelect || !relatedSearch) return;
+    
+    const refreshCustomers = setupCustomerPicker(relatedSearch, relatedIdSelect, 'Seleccionar...');
     
     // Set today as the minimum date for due date
     const dueDateInput = document.getElementById('task-due-date');
@@ -647,32 +715,26 @@ async function setupTaskForm() {
         const relatedType = relatedTypeSelect.value;
         
         relatedIdSelect.innerHTML = '<option value="">Seleccionar...</option>';
+        relatedSearch.value = '';
+        relatedSearch.style.display = relatedType === 'customer' ? '' : 'none';
         
         if (!relatedType) return; // If general task, no need to load anything
         
         try {
-            let items = [];
+            const appendOptions = (items, label) => {
+                const options = items.map(item => `<option value="${item.id}">${label(item)}</option>`);
+                relatedIdSelect.insertAdjacentHTML('beforeend', options.join(''));
+            };
             
             if (relatedType === 'customer') {
-                items = await fetchApi('customers');
-                
-                items.forEach(item => {
-                    const option = `<option value="${item.id}">${item.name} (${item.company})</option>`;
-                    relatedIdSelect.innerHTML += option;
-                });
+                await refreshCustomers();
             } else if (relatedType === 'contact') {
-                items = await fetchApi('contacts');
-                
-                items.forEach(item => {
-                    const option = `<option value="${item.id}">${item.name} (${item.customer_name})</option>`;
-                    relatedIdSelect.innerHTML += option;
+                await fetchPages('contacts?fields=id,name,customer_name', items => {
+                    appendOptions(items, item => `${item.name} (${item.customer_name})`);
                 });
             } else if (relatedType === 'deal') {
-                items = await fetchApi('deals');
-                
-                items.forEach(item => {
-                    const option = `<option value="${item.id}">${item.title} (${item.customer_name})</option>`;
-                    relatedIdSelect.innerHTML += option;
+                await fetchPages('deals?fields=id,title,customer_name', items => {
+                    appendOptions(items, item => `${item.title} (${item.customer_name})`);
                 });
             }
         } catch (error) {
@@ -0,0 +1,65 @@
+import itertools
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The app reads its configuration when it is imported, so the test database
+# and cheap password hashes are set up first
+TEST_DIR = tempfile.mkdtemp(prefix='crm-test-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(TEST_DIR, 'crm.db')
+os.environ['CACHE_PATH'] = os.path.join(TEST_DIR, 'cache.sqlite3')
+os.environ['PASSWORD_SCRYPT_N'] = '1024'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import app as crm
+
+USER_NUMBERS = itertools.count(1)
+
+class ApiClient:
+    """Test client that sends one user's bearer token with every request."""
+    
+    def __init__(self, client, token, user_id):
+        self.client = client
+        self.token = token
+        self.user_id = user_id
+    
+    def request(self, method, path, headers=None, **kwargs):
+        headers = {'Authorization': 'Bearer ' + self.token, **(headers or {})}
+        return getattr(self.client, method)(path, headers=headers, **kwargs)
+    
+    def get(self, path, **kwargs):
+        return self.request('get', path, **kwargs)
+    
+    def post(self, path, **kwargs):
+        return self.request('post', path, **kwargs)
+    
+    def put(self, path, **kwargs):
+        return self.request('put', path, **kwargs)
+    
+    def delete(self, path, **kwargs):
+        return self.request('delete', path, **kwargs)
+    
+    def create(self, entity, **values):
+        """POST a new record and return its JSON, failing the test on an error."""
+        response = self.post(f'/api/{entity}', json=values)
+        assert response.status_code == 201, response.get_json()
+        return response.get_json()
+
+def register_user():
+    client = crm.app.test_client()
+    email = f'user{next(USER_NUMBERS)}@example.com'
+    client.post('/api/auth/register', json={'name': 'Test', 'email': email, 'password': 'secret'})
+    body = client.post('/api/auth/login', json={'email': email, 'password': 'secret'}).get_json()
+    return ApiClient(client, body['token'], body['user']['id'])
+
+@pytest.fixture
+def api():
+    """A newly registered user, so every test starts with empty collections."""
+    return register_user()
+
+@pytest.fixture
+def other_api():
+    """A second user, for checking that one user's writes leave another's data alone."""
+    return register_user()
@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip('aiosqlite')
+pytest.importorskip('greenlet')
+
+import app as crm
+
+@pytest.fixture(scope='module')
+def asgi():
+    # Importing asgi makes password hashing wait in the event loop, which
+    # the WSGI test client used by the other modules has none of
+    wait_for_result = crm.wait_for_result
+    import asgi
+    yield asgi
+    crm.wait_for_result = wait_for_result
+
+def run(asgi, scope, *messages):
+    """Call the ASGI application with messages queued on receive; return what it sent."""
+    async def call():
+        inbox = list(messages)
+        sent = []
+        
+        async def receive():
+            return inbox.pop(0)
+        
+        async def send(message):
+            sent.append(message)
+        
+        await asgi.application(scope, receive, send)
+        return sent
+    return asyncio.run(call())
+
+def test_lifespan_completes_startup_and_shutdown(asgi):
+    sent = run(asgi, {'type': 'lifespan'}, {'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'})
+    assert sent == [{'type': 'lifespan.startup.complete'}, {'type': 'lifespan.shutdown.complete'}]
+
+def test_websocket_connections_are_refused(asgi):
+    sent = run(asgi, {'type': 'websocket', 'path': '/api/sync'}, {'type': 'websocket.connect'})
+    assert sent == [{'type': 'websocket.close', 'code': 1003}]
+
+def test_http_requests_are_served(asgi):
+    scope = {'type': 'http', 'method': 'GET', 'path': '/api/customers', 'query_string': b'', 'headers': []}
+    sent = run(asgi, scope, {'type': 'http.request', 'body': b''})
+    assert sent[0]['type'] == 'http.response.start'
+    assert sent[0]['status'] == 401
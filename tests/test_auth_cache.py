@@ -0,0 +1,33 @@
+import app as crm
+from app import db, QueryCounter, User
+
+def current_user(api):
+    response = api.get('/api/auth/user')
+    return response.status_code, response.get_json()
+
+def test_authenticated_user_is_cached(api):
+    current_user(api)
+    
+    with QueryCounter() as queries:
+        assert current_user(api)[0] == 200
+    
+    assert queries.count == 0
+
+def test_renamed_user_is_read_again(api):
+    assert current_user(api)[1]['name'] == 'Test'
+    
+    with crm.app.app_context():
+        db.session.get(User, api.user_id).name = 'Renamed'
+        db.session.commit()
+    
+    status, body = current_user(api)
+    assert (status, body['name']) == (200, 'Renamed')
+
+def test_deleted_user_token_is_rejected(api):
+    assert current_user(api)[0] == 200
+    
+    with crm.app.app_context():
+        db.session.delete(db.session.get(User, api.user_id))
+        db.session.commit()
+    
+    assert current_user(api) == (401, {'error': 'Token is invalid!'})
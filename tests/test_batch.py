@@ -0,0 +1,69 @@
+import app as crm
+
+def batch(api, *operations):
+    return api.post('/api/batch', json={'operations': list(operations)})
+
+def names(api, entity):
+    return sorted(record.get('name') or record.get('title') for record in api.get(f'/api/{entity}').get_json())
+
+def test_successful_batch_reports_every_operation(api):
+    customer = api.create('customers', name='Acme', company='Co', email='a@example.com')
+    deal = api.create('deals', title='Old', value=10, customer_id=customer['id'])
+    
+    response = batch(
+        api,
+        {'op': 'create', 'entity': 'contacts', 'data': {'name': 'Luis', 'email': 'l@example.com', 'customer_id': customer['id']}},
+        {'op': 'update', 'entity': 'customers', 'id': customer['id'], 'data': {'name': 'Acme 2'}},
+        {'op': 'delete', 'entity': 'deals', 'id': deal['id']},
+    )
+    
+    assert response.status_code == 200, response.get_json()
+    results = response.get_json()['results']
+    assert [(result['index'], result['op'], result['status']) for result in results] == [
+        (0, 'create', 201), (1, 'update', 200), (2, 'delete', 200)
+    ]
+    assert results[1]['id'] == customer['id'] and results[2]['id'] == deal['id']
+    assert names(api, 'contacts') == ['Luis']
+    assert names(api, 'customers') == ['Acme 2']
+    assert names(api, 'deals') == []
+
+def test_one_failing_operation_rejects_the_whole_batch(api, other_api):
+    customer = api.create('customers', name='Acme', company='Co', email='a@example.com')
+    foreign = other_api.create('customers', name='Other', company='Co', email='o@example.com')
+    
+    response = batch(
+        api,
+        {'op': 'create', 'entity': 'customers', 'data': {'name': 'New', 'company': 'Co', 'email': 'n@example.com'}},
+        {'op': 'update', 'entity': 'customers', 'id': customer['id'], 'data': {'name': 'Changed'}},
+        {'op': 'create', 'entity': 'deals', 'data': {'title': 'D', 'value': 1, 'customer_id': foreign['id']}},
+        {'op': 'delete', 'entity': 'tasks', 'id': 999999},
+        {'op': 'create', 'entity': 'contacts', 'data': {'name': 'No email'}},
+        {'op': 'explode', 'entity': 'customers'},
+    )
+    
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Batch rejected', 'errors': [
+        {'index': 2, 'error': 'Customer not found', 'status': 404},
+        {'index': 3, 'error': 'Task not found', 'status': 404},
+        {'index': 4, 'error': 'Missing required fields', 'status': 400},
+        {'index': 5, 'error': 'Unknown op', 'status': 400},
+    ]}
+    # The valid operations were not applied either
+    assert names(api, 'customers') == ['Acme']
+    assert names(other_api, 'customers') == ['Other']
+
+def test_records_of_other_users_are_not_found(api, other_api):
+    foreign = other_api.create('customers', name='Other', company='Co', email='o@example.com')
+    
+    response = batch(api, {'op': 'update', 'entity': 'customers', 'id': foreign['id'], 'data': {'name': 'Mine'}})
+    
+    assert response.get_json()['errors'] == [{'index': 0, 'error': 'Customer not found', 'status': 404}]
+    assert names(other_api, 'customers') == ['Other']
+
+def test_operation_limits(api, monkeypatch):
+    assert batch(api).get_json() == {'error': 'Missing operations'}
+    
+    monkeypatch.setitem(crm.app.config, 'BATCH_MAX_OPERATIONS', 2)
+    operation = {'op': 'delete', 'entity': 'tasks', 'id': 1}
+    response = batch(api, operation, operation, operation)
+    assert (response.status_code, response.get_json()) == (400, {'error': 'Too many operations'})
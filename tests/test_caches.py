@@ -0,0 +1,73 @@
+import sqlite3
+
+import pytest
+
+import app as crm
+from app import BroadcastCache, SharedCacheStore, SQLiteCache, TTLCache
+
+class LockedStore:
+    """A SharedCacheStore whose file is always locked by another process."""
+    
+    def connection(self):
+        return self
+    
+    def execute(self, *args):
+        raise sqlite3.OperationalError('database is locked')
+
+def test_memory_cache_evicts_by_total_bytes():
+    cache = TTLCache(maxsize=100, ttl=60, maxbytes=10)
+    cache.set('a', b'1234')
+    cache.set('b', b'1234')
+    cache.get('a')
+    cache.set('c', b'1234')
+    
+    # b was least recently used; a and c fit in the budget
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (b'1234', b'1234')
+
+def test_memory_cache_counts_replaced_values_once():
+    cache = TTLCache(maxsize=100, ttl=60, maxbytes=10, sizeof=lambda value: len(value[0]))
+    for _ in range(5):
+        cache.set('a', (b'12345', []))
+    cache.set('b', (b'12345', []))
+    
+    assert cache.get('a') == (b'12345', [])
+    assert cache.get('b') == (b'12345', [])
+
+def test_shared_cache_prunes_by_total_bytes(tmp_path):
+    cache = SQLiteCache('test', SharedCacheStore(str(tmp_path / 'cache.sqlite3')), maxsize=100, ttl=60, maxbytes=1000)
+    for key in range(10):
+        cache.set(key, b'x' * 300)
+    cache.prune(cache.store.connection())
+    
+    stored = cache.store.connection().execute('SELECT sum(length(value)) FROM cache_entry WHERE cache = ?', ('test',))
+    assert stored.fetchone()[0] <= 1000
+    assert cache.get(9) == b'x' * 300
+    assert cache.get(0) is None
+
+@pytest.mark.parametrize('action', ['get', 'set', 'delete', 'clear'])
+def test_shared_cache_counts_a_locked_file_as_an_error(action):
+    cache = SQLiteCache('test', LockedStore())
+    args = {'get': ('key',), 'set': ('key', 'value'), 'delete': ('key',), 'clear': ()}[action]
+    
+    getattr(cache, action)(*args)
+    
+    assert cache.errors == 1
+
+def test_broadcast_delete_with_a_locked_log_still_drops_the_local_entry():
+    cache = BroadcastCache('test', LockedStore())
+    TTLCache.set(cache, repr('key'), 'value')
+    
+    cache.delete('key')
+    
+    assert TTLCache.get(cache, repr('key')) is None
+    assert cache.errors == 1
+
+def test_write_succeeds_when_invalidation_fails(api, monkeypatch):
+    monkeypatch.setattr(crm, 'customer_lookup_cache', SQLiteCache('customer_lookup', LockedStore()))
+    customer = api.create('customers', name='Acme', company='Acme', email='acme@example.com')
+    
+    response = api.put(f'/api/customers/{customer["id"]}', json={'name': 'Acme 2'})
+    
+    assert response.status_code == 200
+    assert crm.customer_lookup_cache.errors >= 1
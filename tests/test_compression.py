@@ -0,0 +1,82 @@
+import gzip
+import json
+
+import pytest
+
+import app as crm
+
+GZIP = {'Accept-Encoding': 'gzip'}
+
+@pytest.fixture
+def customers(api):
+    return [
+        api.create('customers', name=f'Customer {number}', company='Co', email=f'c{number}@example.com')
+        for number in range(20)
+    ]
+
+def test_small_response_is_not_compressed(api):
+    api.create('customers', name='Acme', company='Co', email='a@example.com')
+    
+    response = api.get('/api/customers', headers=GZIP)
+    
+    assert len(response.get_data()) < crm.app.config['COMPRESS_MIN_SIZE']
+    assert 'Content-Encoding' not in response.headers
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+def test_large_response_is_gzipped(api, customers):
+    plain = api.get('/api/customers')
+    compressed = api.get('/api/customers', headers=GZIP)
+    
+    assert len(plain.get_data()) >= crm.app.config['COMPRESS_MIN_SIZE']
+    assert 'Content-Encoding' not in plain.headers
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    assert len(compressed.get_data()) < len(plain.get_data())
+    assert gzip.decompress(compressed.get_data()) == plain.get_data()
+
+def test_not_modified_is_not_compressed(api, customers):
+    etag = api.get('/api/customers', headers=GZIP).headers['ETag']
+    
+    response = api.get('/api/customers', headers={**GZIP, 'If-None-Match': etag})
+    
+    assert response.status_code == 304
+    assert 'Content-Encoding' not in response.headers
+
+def expand(body):
+    """Turn a ?format=compact body back into the objects ?format=json returns."""
+    items = [dict(zip(body['columns'], row)) for row in body['rows']]
+    if 'customers' in body:
+        for item in items:
+            item['customer_name'] = body['customers'][str(item['customer_id'])]
+    return items
+
+@pytest.mark.parametrize('entity', ['customers', 'contacts', 'deals', 'tasks'])
+def test_compact_format_has_the_same_records(api, entity):
+    customers = [api.create('customers', name=name, company='Co', email=f'{name}@example.com') for name in ('a', 'b')]
+    for number, customer in enumerate(customers * 2):
+        api.create('contacts', name=f'Contact {number}', email=f'{number}@example.com', customer_id=customer['id'])
+        api.create('deals', title=f'Deal {number}', value=100 + number, customer_id=customer['id'])
+        api.create('tasks', title=f'Task {number}', due_date='2030-01-01', related_type='customer', related_id=customer['id'])
+    
+    records = api.get(f'/api/{entity}').get_json()
+    body = api.get(f'/api/{entity}', query_string={'format': 'compact'}).get_json()
+    
+    assert len(body['rows']) == len(records)
+    assert expand(body) == records
+
+def test_compact_format_sends_each_customer_name_once(api):
+    customer = api.create('customers', name='Acme', company='Co', email='a@example.com')
+    for number in range(3):
+        api.create('contacts', name=f'Contact {number}', email=f'{number}@example.com', customer_id=customer['id'])
+    
+    body = api.get('/api/contacts', query_string={'format': 'compact'}).get_json()
+    
+    assert 'customer_name' not in body['columns']
+    assert body['customers'] == {str(customer['id']): 'Acme'}
+    assert json.dumps(body).count('Acme') == 1
+
+def test_unknown_format_is_rejected(api):
+    response = api.get('/api/customers', query_string={'format': 'xml'})
+    
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Unsupported format'}
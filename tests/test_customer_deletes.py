@@ -0,0 +1,110 @@
+import threading
+
+import pytest
+
+import app as crm
+import worker
+
+@pytest.fixture(autouse=True)
+def no_sync_lag(monkeypatch):
+    monkeypatch.setitem(crm.app.config, 'SYNC_LAG_SECONDS', 0)
+
+def create_customer(api, name):
+    """A customer with a contact, a deal and a task on each of them; returns the ids by entity."""
+    customer = api.create('customers', name=name, company='Co', email=f'{name}@example.com')
+    contact = api.create('contacts', name='Luis', email=f'luis.{name}@example.com', customer_id=customer['id'])
+    deal = api.create('deals', title='License', value=100, stage='proposal', customer_id=customer['id'])
+    tasks = [
+        api.create('tasks', title='Call', due_date='2030-01-01', related_type=related_type, related_id=record['id'])
+        for related_type, record in (('customer', customer), ('contact', contact), ('deal', deal))
+    ]
+    return {
+        'customers': {customer['id']},
+        'contacts': {contact['id']},
+        'deals': {deal['id']},
+        'tasks': {task['id'] for task in tasks},
+    }
+
+def remaining(api):
+    return {
+        entity: {record['id'] for record in api.get(f'/api/{entity}').get_json()}
+        for entity in ('customers', 'contacts', 'deals', 'tasks')
+    }
+
+def tombstones(api):
+    deleted = {}
+    for record in api.get('/api/sync').get_json()['deleted']:
+        deleted.setdefault(record['entity'], set()).add(record['id'])
+    return deleted
+
+def proposal_stage(api):
+    stages = api.get('/api/analytics/pipeline').get_json()['stages']
+    return next((stage['count'], stage['value']) for stage in stages if stage['stage'] == 'proposal')
+
+def test_delete_customer_removes_related_records(api):
+    deleted = create_customer(api, 'gone')
+    kept = create_customer(api, 'kept')
+    
+    response = api.delete(f'/api/customers/{next(iter(deleted["customers"]))}')
+    
+    assert response.status_code == 200
+    assert response.get_json()['deleted'] == {'customers': 1, 'contacts': 1, 'deals': 1, 'tasks': 3}
+    assert remaining(api) == kept
+    assert tombstones(api) == deleted
+    assert proposal_stage(api) == (1, 100)
+
+def test_delete_missing_customer(api, other_api):
+    customer = other_api.create('customers', name='Other', company='Co', email='other@example.com')
+    
+    assert api.delete(f'/api/customers/{customer["id"]}').status_code == 404
+    assert api.delete('/api/customers/999999').status_code == 404
+    assert [record['id'] for record in other_api.get('/api/customers').get_json()] == [customer['id']]
+
+def test_bulk_delete_customers(api, other_api):
+    first = create_customer(api, 'first')
+    second = create_customer(api, 'second')
+    kept = create_customer(api, 'kept')
+    other = other_api.create('customers', name='Other', company='Co', email='other@example.com')
+    ids = sorted(first['customers'] | second['customers'])
+    
+    response = api.post('/api/customers/delete', json={'ids': ids + [other['id']]})
+    
+    assert response.status_code == 200
+    assert response.get_json() == {
+        'deleted': {'customers': 2, 'contacts': 2, 'deals': 2, 'tasks': 6},
+        'not_found': [other['id']],
+    }
+    assert remaining(api) == kept
+    assert tombstones(api) == {entity: first[entity] | second[entity] for entity in first}
+    assert proposal_stage(api) == (1, 100)
+    assert [record['id'] for record in other_api.get('/api/customers').get_json()] == [other['id']]
+
+def test_bulk_delete_in_chunks(api, monkeypatch):
+    monkeypatch.setitem(crm.app.config, 'CUSTOMER_DELETE_CHUNK_SIZE', 1)
+    deleted = [create_customer(api, name) for name in ('a', 'b', 'c')]
+    ids = [next(iter(records['customers'])) for records in deleted]
+    
+    response = api.post('/api/customers/delete', json={'ids': ids})
+    
+    assert response.get_json()['deleted'] == {'customers': 3, 'contacts': 3, 'deals': 3, 'tasks': 9}
+    assert remaining(api) == {'customers': set(), 'contacts': set(), 'deals': set(), 'tasks': set()}
+    assert proposal_stage(api) == (0, 0)
+
+def test_bulk_delete_over_limit_needs_a_job(api, monkeypatch):
+    monkeypatch.setitem(crm.app.config, 'CUSTOMER_DELETE_MAX_IDS', 1)
+    deleted = create_customer(api, 'first')
+    kept = create_customer(api, 'kept')
+    
+    response = api.post('/api/customers/delete', json={'ids': [1, 2]})
+    assert response.status_code == 400
+    
+    job = api.post('/api/jobs', json={'kind': 'delete_customers', 'params': {'ids': sorted(deleted['customers'])}})
+    assert job.status_code == 202, job.get_json()
+    worker.work('test', threading.Event(), burst=True)
+    
+    assert remaining(api) == kept
+    assert tombstones(api) == deleted
+
+@pytest.mark.parametrize('body', [{}, {'ids': []}, {'ids': 'x'}, {'ids': ['x']}])
+def test_bulk_delete_rejects_bad_ids(api, body):
+    assert api.post('/api/customers/delete', json=body).status_code == 400
@@ -0,0 +1,51 @@
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
+
+import app as crm
+
+NAMES = ('Álvaro Pérez', 'álvaro Ruiz', 'Alba Gómez', 'Ñandú SA', 'ñu Logística', 'Nadia Torres', 'Straße GmbH')
+
+@pytest.fixture
+def customers(api):
+    for name in NAMES:
+        api.create('customers', name=name, company='Co', email='c@example.com')
+    return api
+
+def lookup(api, prefix):
+    response = api.get('/api/customers/lookup', query_string={'prefix': prefix})
+    assert response.status_code == 200
+    return [item['name'] for item in response.get_json()]
+
+@pytest.mark.parametrize('prefix, names', [
+    ('á', ['Álvaro Pérez', 'álvaro Ruiz']),
+    ('Á', ['Álvaro Pérez', 'álvaro Ruiz']),
+    ('ÁLVARO R', ['álvaro Ruiz']),
+    ('álvaro ', ['Álvaro Pérez', 'álvaro Ruiz']),
+    ('a', ['Alba Gómez']),
+    ('ñ', ['Ñandú SA', 'ñu Logística']),
+    ('Ñ', ['Ñandú SA', 'ñu Logística']),
+    ('n', ['Nadia Torres']),
+    ('STRASSE', ['Straße GmbH']),
+])
+def test_lookup_folds_case_beyond_ascii(customers, prefix, names):
+    assert lookup(customers, prefix) == names
+
+def test_lookup_follows_renames(customers):
+    [customer] = [item for item in customers.get('/api/customers').get_json() if item['name'] == 'Nadia Torres']
+    response = customers.put(f'/api/customers/{customer["id"]}', json={'name': 'Óscar Torres'})
+    assert response.status_code == 200
+    
+    assert lookup(customers, 'ó') == ['Óscar Torres']
+    assert lookup(customers, 'n') == []
+
+def test_imported_customers_are_found(api):
+    body = 'name,company,email\nÉmile Durand,Co,e@example.com\n'
+    response = api.post('/api/import/customers', data=body, content_type='text/csv')
+    assert response.status_code == 200, response.get_json()
+    
+    assert lookup(api, 'É') == ['Émile Durand']
+
+def test_name_key_sorts_by_code_point_on_postgres():
+    ddl = str(CreateTable(crm.Customer.__table__).compile(dialect=postgresql.dialect()))
+    assert 'name_key TEXT COLLATE "C"' in ddl
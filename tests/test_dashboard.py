@@ -0,0 +1,60 @@
+import datetime
+
+def dashboard(api):
+    response = api.get('/api/dashboard')
+    assert response.status_code == 200
+    return response.get_json()
+
+def totals(api):
+    body = dashboard(api)
+    return {key: body[key] for key in ('customer_count', 'open_deals', 'month_revenue', 'pending_tasks')}
+
+def test_writes_refresh_the_cached_dashboard(api):
+    assert totals(api) == {'customer_count': 0, 'open_deals': 0, 'month_revenue': 0, 'pending_tasks': 0}
+    today = datetime.date.today().isoformat()
+    
+    customer = api.create('customers', name='Acme', company='Acme', email='acme@example.com')
+    assert totals(api)['customer_count'] == 1
+    
+    deal = api.create('deals', title='License', value=100, stage='negotiation', close_date=today, customer_id=customer['id'])
+    assert totals(api)['open_deals'] == 1
+    
+    api.put(f'/api/deals/{deal["id"]}', json={'stage': 'won'})
+    assert totals(api) == {'customer_count': 1, 'open_deals': 0, 'month_revenue': 100, 'pending_tasks': 0}
+    
+    task = api.create('tasks', title='Call', due_date=today, related_type='customer', related_id=customer['id'])
+    assert totals(api)['pending_tasks'] == 1
+    
+    api.put(f'/api/tasks/{task["id"]}', json={'status': 'completed'})
+    assert totals(api)['pending_tasks'] == 0
+    
+    api.delete(f'/api/deals/{deal["id"]}')
+    assert totals(api)['month_revenue'] == 0
+
+def test_batch_and_import_refresh_the_cached_dashboard(api):
+    dashboard(api)
+    
+    api.post('/api/import/customers', data='name,company,email\nAcme,Co,a@example.com\n', content_type='text/csv')
+    assert totals(api)['customer_count'] == 1
+    
+    api.post('/api/batch', json={'operations': [
+        {'op': 'create', 'entity': 'customers', 'data': {'name': 'Beta', 'company': 'Co', 'email': 'b@example.com'}}
+    ]})
+    assert totals(api)['customer_count'] == 2
+
+def test_recent_activity_lists_new_records(api):
+    customer = api.create('customers', name='Acme', company='Acme', email='acme@example.com')
+    api.create('deals', title='License', value=100, customer_id=customer['id'])
+    
+    messages = [activity['message'] for activity in dashboard(api)['recent_activities']]
+    
+    assert 'Se agregó el cliente Acme' in messages
+    assert 'Se creó la oportunidad License por $100.0' in messages
+
+def test_other_users_writes_keep_the_cached_dashboard(api, other_api):
+    etag = api.get('/api/dashboard').headers['ETag']
+    
+    other_api.create('customers', name='Other', company='Co', email='o@example.com')
+    
+    assert api.get('/api/dashboard').headers['ETag'] == etag
+    assert totals(api)['customer_count'] == 0
@@ -0,0 +1,38 @@
+import pytest
+
+@pytest.fixture
+def deal(api):
+    customer = api.create('customers', name='Acme', company='Acme', email='acme@example.com')
+    return api.create('deals', title='Renewal', value=100, stage='won', customer_id=customer['id'])
+
+def stored_value(api, deal):
+    """The deal's value in the list and in the pipeline summary kept alongside it."""
+    listed = {item['id']: item['value'] for item in api.get('/api/deals').get_json()}
+    stages = {stage['stage']: stage['value'] for stage in api.get('/api/analytics/pipeline').get_json()['stages']}
+    return listed[deal['id']], stages['won']
+
+def test_update_parses_string_value(api, deal):
+    response = api.put(f'/api/deals/{deal["id"]}', json={'value': '250'})
+    assert response.status_code == 200, response.get_json()
+    assert stored_value(api, deal) == (250.0, 250.0)
+
+def test_update_rejects_invalid_value(api, deal):
+    response = api.put(f'/api/deals/{deal["id"]}', json={'value': 'abc'})
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Invalid value'
+    assert stored_value(api, deal) == (100.0, 100.0)
+
+def test_batch_update_parses_string_value(api, deal):
+    response = api.post('/api/batch', json={'operations': [
+        {'op': 'update', 'entity': 'deals', 'id': deal['id'], 'data': {'value': '250'}}
+    ]})
+    assert response.status_code == 200, response.get_json()
+    assert stored_value(api, deal) == (250.0, 250.0)
+
+def test_batch_update_rejects_invalid_value(api, deal):
+    response = api.post('/api/batch', json={'operations': [
+        {'op': 'update', 'entity': 'deals', 'id': deal['id'], 'data': {'value': 'abc'}}
+    ]})
+    assert response.status_code == 400
+    assert response.get_json()['errors'] == [{'index': 0, 'error': 'Invalid value', 'status': 400}]
+    assert stored_value(api, deal) == (100.0, 100.0)
@@ -0,0 +1,62 @@
+import pytest
+
+import app as crm
+
+VERSIONED_PATHS = {
+    'customers': '/api/customers',
+    'contacts': '/api/contacts',
+    'deals': '/api/deals',
+    'tasks': '/api/tasks',
+    'dashboard': '/api/dashboard',
+    'pipeline': '/api/analytics/pipeline',
+}
+
+@pytest.fixture
+def records(api):
+    customer = api.create('customers', name='Acme', company='Co', email='a@example.com')
+    return api, {
+        'customers': customer,
+        'contacts': api.create('contacts', name='Luis', email='l@example.com', customer_id=customer['id']),
+        'deals': api.create('deals', title='License', value=100, customer_id=customer['id']),
+        'tasks': api.create('tasks', title='Call', due_date='2030-01-01', related_type='customer', related_id=customer['id']),
+    }
+
+UPDATES = {
+    'customers': {'name': 'Acme 2'},
+    'contacts': {'position': 'CTO'},
+    'deals': {'value': 200},
+    'tasks': {'status': 'completed'},
+}
+
+@pytest.mark.parametrize('name', VERSIONED_PATHS)
+def test_unchanged_collection_is_not_modified(records, name):
+    api, _ = records
+    response = api.get(VERSIONED_PATHS[name])
+    assert response.status_code == 200
+    
+    again = api.get(VERSIONED_PATHS[name], headers={'If-None-Match': response.headers['ETag']})
+    
+    assert again.status_code == 304
+    assert again.get_data() == b''
+    assert again.headers['ETag'] == response.headers['ETag']
+
+@pytest.mark.parametrize('name', VERSIONED_PATHS)
+@pytest.mark.parametrize('entity', UPDATES)
+def test_etag_follows_the_collections_a_view_depends_on(records, name, entity):
+    api, created = records
+    etag = api.get(VERSIONED_PATHS[name]).headers['ETag']
+    
+    assert api.put(f'/api/{entity}/{created[entity]["id"]}', json=UPDATES[entity]).status_code == 200
+    response = api.get(VERSIONED_PATHS[name], headers={'If-None-Match': etag})
+    
+    expected = 200 if entity in crm.COLLECTION_DEPENDENCIES[name] else 304
+    assert response.status_code == expected
+
+@pytest.mark.parametrize('name', VERSIONED_PATHS)
+def test_query_string_is_part_of_the_etag(records, name):
+    api, _ = records
+    etag = api.get(VERSIONED_PATHS[name]).headers['ETag']
+    
+    response = api.get(VERSIONED_PATHS[name] + '?limit=1', headers={'If-None-Match': etag})
+    
+    assert response.status_code == 200
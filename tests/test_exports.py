@@ -0,0 +1,73 @@
+import csv
+import gzip
+import io
+import json
+import os
+import threading
+import zlib
+
+import pytest
+
+import app as crm
+import worker
+
+@pytest.fixture
+def customers(api, monkeypatch):
+    monkeypatch.setitem(crm.app.config, 'EXPORT_CHUNK_SIZE', 2)
+    for n in range(5):
+        api.create('customers', name=f'Customer {n}', company='Co', email=f'c{n}@example.com')
+    return api
+
+def export(api, export_format='csv', coding='identity'):
+    return api.get(f'/api/export/customers?format={export_format}', headers={'Accept-Encoding': coding}, buffered=False)
+
+def test_gzip_export_streams_chunk_by_chunk(api, monkeypatch):
+    monkeypatch.setitem(crm.app.config, 'EXPORT_CHUNK_SIZE', 100)
+    with crm.app.app_context():
+        crm.db.session.execute(crm.db.insert(crm.Customer), [
+            {'name': f'Customer {n}', 'company': 'Co', 'email': f'c{n}@example.com', 'notes': os.urandom(32).hex(),
+             'user_id': api.user_id}
+            for n in range(3000)
+        ])
+        crm.db.session.commit()
+    
+    response = export(api, coding='gzip')
+    
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in response.headers
+    
+    # Each chunk of rows decodes on its own, before the rest is read
+    decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    parts = [decoder.decompress(chunk) for chunk in response.response]
+    response.close()
+    assert len([part for part in parts if part]) > 1
+    assert b''.join(parts) == export(api).get_data()
+
+def test_gzip_export_matches_the_plain_one(customers):
+    plain = export(customers).get_data()
+    compressed = export(customers, coding='gzip').get_data()
+    
+    assert gzip.decompress(compressed) == plain
+    rows = list(csv.DictReader(io.StringIO(plain.decode())))
+    assert [row['name'] for row in rows] == [f'Customer {n}' for n in range(5)]
+
+def test_ndjson_export_is_compressed_too(customers):
+    response = export(customers, 'ndjson', 'gzip')
+    
+    assert response.headers['Content-Encoding'] == 'gzip'
+    lines = gzip.decompress(response.get_data()).splitlines()
+    assert [json.loads(line)['name'] for line in lines] == [f'Customer {n}' for n in range(5)]
+
+def test_export_job_output_is_sent_compressed(customers):
+    job = customers.post('/api/jobs', json={'kind': 'export', 'params': {'entity': 'customers', 'format': 'csv'}}).get_json()
+    worker.work('test', threading.Event(), burst=True)
+    path = f'/api/jobs/{job["id"]}/output'
+    
+    compressed = customers.get(path, headers={'Accept-Encoding': 'gzip'})
+    plain = customers.get(path, headers={'Accept-Encoding': 'identity'})
+    
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Encoding' not in plain.headers
+    assert gzip.decompress(compressed.get_data()) == plain.get_data() == export(customers).get_data()
@@ -0,0 +1,55 @@
+import threading
+
+import pytest
+
+import worker
+
+def import_csv(api, body, path='/api/import/customers'):
+    return api.post(path, data=body, content_type='text/csv')
+
+def customer_rows(count):
+    return b''.join(f'Customer {n},Co,c{n}@example.com\n'.encode() for n in range(count))
+
+def test_invalid_utf8_is_rejected_with_the_row(api):
+    body = b'name,company,email\n' + customer_rows(2) + b'Bad \xff\xfe,Co,bad@example.com\n'
+    response = import_csv(api, body)
+    
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Row 3: invalid UTF-8'
+
+def test_malformed_csv_is_rejected_with_the_row(api):
+    body = b'name,company,email\nAcme,Co,a@example.com\n"' + b'x' * 200000 + b'",Co,b@example.com\n'
+    response = import_csv(api, body)
+    
+    assert response.status_code == 400
+    assert response.get_json()['error'].startswith('Row 2: field larger than field limit')
+
+def test_batches_before_the_bad_row_stay_imported(api, monkeypatch):
+    monkeypatch.setitem(worker.crm.app.config, 'IMPORT_BATCH_SIZE', 2)
+    body = b'name,company,email\n' + customer_rows(2) + b'\xff,Co,bad@example.com\n'
+    
+    assert import_csv(api, body).status_code == 400
+    assert len(api.get('/api/customers').get_json()) == 2
+
+def test_import_job_with_invalid_utf8_fails_without_retrying(api):
+    response = import_csv(api, b'name,company,email\n\xff,Co,bad@example.com\n', '/api/jobs/import/customers')
+    assert response.status_code == 202, response.get_json()
+    job_id = response.get_json()['id']
+    
+    worker.work('test', threading.Event(), burst=True)
+    
+    job = api.get(f'/api/jobs/{job_id}').get_json()
+    assert (job['status'], job['attempts'], job['error']) == ('failed', 1, 'Row 1: invalid UTF-8')
+
+@pytest.mark.parametrize('value', ['nan', 'inf', '-inf', 'NaN'])
+def test_non_finite_deal_values_are_rejected(api, value):
+    customer = api.create('customers', name='Acme', company='Acme', email='acme@example.com')
+    
+    response = api.post('/api/deals', json={'title': 'Deal', 'value': value, 'customer_id': customer['id']})
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Invalid value'
+    
+    deal = api.create('deals', title='Deal', value=100, customer_id=customer['id'])
+    response = api.put(f'/api/deals/{deal["id"]}', json={'value': value})
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Invalid value'
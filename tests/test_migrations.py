@@ -0,0 +1,129 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+import app as crm
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Tables as the app created them before schema migrations existed
+BASELINE_SCHEMA = '''
+CREATE TABLE user (
+    id INTEGER NOT NULL, name VARCHAR(100) NOT NULL, email VARCHAR(100) NOT NULL,
+    password VARCHAR(200) NOT NULL, created_at DATETIME,
+    PRIMARY KEY (id), UNIQUE (email)
+);
+CREATE TABLE customer (
+    id INTEGER NOT NULL, name VARCHAR(100) NOT NULL, company VARCHAR(100) NOT NULL,
+    email VARCHAR(100) NOT NULL, phone VARCHAR(20), status VARCHAR(20), notes TEXT,
+    created_at DATETIME, user_id INTEGER NOT NULL,
+    PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES user (id)
+);
+CREATE TABLE contact (
+    id INTEGER NOT NULL, name VARCHAR(100) NOT NULL, position VARCHAR(100),
+    email VARCHAR(100) NOT NULL, phone VARCHAR(20), notes TEXT, created_at DATETIME,
+    customer_id INTEGER NOT NULL, user_id INTEGER NOT NULL,
+    PRIMARY KEY (id), FOREIGN KEY(customer_id) REFERENCES customer (id), FOREIGN KEY(user_id) REFERENCES user (id)
+);
+CREATE TABLE deal (
+    id INTEGER NOT NULL, title VARCHAR(100) NOT NULL, value FLOAT NOT NULL, stage VARCHAR(20),
+    close_date DATE, notes TEXT, created_at DATETIME, customer_id INTEGER NOT NULL, user_id INTEGER NOT NULL,
+    PRIMARY KEY (id), FOREIGN KEY(customer_id) REFERENCES customer (id), FOREIGN KEY(user_id) REFERENCES user (id)
+);
+CREATE TABLE task (
+    id INTEGER NOT NULL, title VARCHAR(100) NOT NULL, related_type VARCHAR(20), related_id INTEGER,
+    due_date DATE NOT NULL, priority VARCHAR(20), status VARCHAR(20), description TEXT,
+    created_at DATETIME, user_id INTEGER NOT NULL,
+    PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES user (id)
+);
+INSERT INTO user VALUES (1, 'Ana', 'ana@example.com', 'x', '2024-01-01 00:00:00');
+INSERT INTO customer VALUES (1, 'Acme', 'Acme SA', 'acme@example.com', '', 'new', '', '2024-01-02 00:00:00', 1);
+INSERT INTO contact VALUES (1, 'Luis', 'CTO', 'luis@example.com', '', '', '2024-01-03 00:00:00', 1, 1);
+INSERT INTO deal VALUES (1, 'License', 250.0, 'won', '2024-02-01', '', '2024-01-04 00:00:00', 1, 1);
+INSERT INTO task VALUES (1, 'Call', 'deal', 1, '2024-02-01', 'high', 'pending', '', '2024-01-05 00:00:00', 1);
+'''
+
+def start_app(database):
+    """Import the app in a new process against database, the way a server worker starts."""
+    env = {**os.environ, 'DATABASE_URL': f'sqlite:///{database}', 'CACHE_PATH': f'{database}.cache'}
+    return subprocess.Popen([sys.executable, '-c', 'import app'], cwd=ROOT_DIR, env=env,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+def assert_started(process):
+    _, stderr = process.communicate(timeout=120)
+    assert process.returncode == 0, stderr
+
+def model_indexes():
+    return {index.name for model in (crm.Customer, crm.Contact, crm.Deal, crm.Task) for index in model.__table__.indexes}
+
+def assert_current_schema(database):
+    with sqlite3.connect(database) as connection:
+        versions = [version for version, in connection.execute('SELECT version FROM schema_version ORDER BY version')]
+        indexes = {name for name, in connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert versions == sorted(crm.MIGRATIONS)
+    assert model_indexes() <= indexes
+
+def test_upgrade_from_baseline_schema(tmp_path):
+    database = tmp_path / 'baseline.db'
+    with sqlite3.connect(database) as connection:
+        connection.executescript(BASELINE_SCHEMA)
+    
+    assert_started(start_app(database))
+    
+    assert_current_schema(database)
+    with sqlite3.connect(database) as connection:
+        for table in ('customer', 'contact', 'deal', 'task'):
+            assert connection.execute(f'SELECT count(*) FROM {table} WHERE updated_at = created_at').fetchone() == (1,)
+        assert connection.execute("SELECT rowid FROM customer_search WHERE customer_search MATCH 'acme'").fetchall() == [(1,)]
+        assert connection.execute('SELECT stage, deal_count, total_value FROM pipeline_summary').fetchall() == [('won', 1, 250.0)]
+        assert connection.execute('SELECT name_key FROM customer').fetchall() == [('acme',)]
+
+def test_fresh_database(tmp_path):
+    database = tmp_path / 'fresh.db'
+    
+    assert_started(start_app(database))
+    
+    assert_current_schema(database)
+
+def test_restart_applies_nothing_twice(tmp_path):
+    database = tmp_path / 'restart.db'
+    assert_started(start_app(database))
+    
+    assert_started(start_app(database))
+    
+    assert_current_schema(database)
+
+def test_migrations_can_run_again(api):
+    api.create('customers', name='Acme', company='Acme SA', email='acme@example.com')
+    
+    with crm.app.app_context(), crm.db.engine.begin() as connection:
+        for version in sorted(crm.MIGRATIONS):
+            crm.MIGRATIONS[version](connection)
+    
+    assert [customer['name'] for customer in api.get('/api/customers').get_json()] == ['Acme']
+    assert api.get('/api/search?q=acme').get_json()[0]['label'] == 'Acme'
+
+def test_workers_starting_together(tmp_path):
+    database = tmp_path / 'workers.db'
+    
+    for process in [start_app(database) for _ in range(4)]:
+        assert_started(process)
+    
+    assert_current_schema(database)
+
+def test_postgres_schema_lock_lifts_the_statement_timeout():
+    class Connection:
+        dialect = type('Dialect', (), {'name': 'postgresql'})
+        statements = []
+        
+        def execute(self, statement):
+            self.statements.append(str(statement))
+    
+    connection = Connection()
+    crm.lock_schema(connection)
+    
+    assert connection.statements == [
+        f'SET LOCAL statement_timeout = {crm.SCHEMA_LOCK_TIMEOUT_MS}',
+        'SELECT pg_advisory_xact_lock(4242)',
+    ]
@@ -0,0 +1,56 @@
+import itertools
+
+from werkzeug.security import generate_password_hash
+
+import app as crm
+from app import db, User
+
+EMAILS = (f'legacy{number}@example.com' for number in itertools.count(1))
+
+def create_user(password_hash):
+    email = next(EMAILS)
+    with crm.app.app_context():
+        db.session.add(User(name='Legacy', email=email, password=password_hash))
+        db.session.commit()
+    return email
+
+def stored_hash(email):
+    with crm.app.app_context():
+        return User.query.filter_by(email=email).one().password
+
+def login(email, password):
+    return crm.app.test_client().post('/api/auth/login', json={'email': email, 'password': password})
+
+def test_new_hashes_use_scrypt():
+    stored = crm.hash_password('secret')
+    
+    assert stored.startswith('scrypt:1024:8:1$')
+    assert crm.verify_password(stored, 'secret')
+    assert not crm.verify_password(stored, 'wrong')
+
+def test_legacy_sha256_hash_is_upgraded_on_login():
+    email = create_user(generate_password_hash('secret', method='sha256'))
+    
+    assert login(email, 'secret').status_code == 200
+    
+    upgraded = stored_hash(email)
+    assert upgraded.startswith(crm.password_method() + '$')
+    assert login(email, 'secret').status_code == 200
+    assert stored_hash(email) == upgraded
+
+def test_failed_login_keeps_legacy_hash():
+    legacy = generate_password_hash('secret', method='sha256')
+    email = create_user(legacy)
+    
+    assert login(email, 'wrong').status_code == 401
+    
+    assert stored_hash(email) == legacy
+
+def test_hash_with_older_cost_is_upgraded(monkeypatch):
+    monkeypatch.setitem(crm.app.config, 'PASSWORD_SCRYPT_N', 512)
+    email = create_user(crm.hash_password('secret'))
+    monkeypatch.setitem(crm.app.config, 'PASSWORD_SCRYPT_N', 1024)
+    
+    assert login(email, 'secret').status_code == 200
+    
+    assert stored_hash(email).startswith('scrypt:1024:8:1$')
@@ -0,0 +1,41 @@
+import pytest
+
+from app import QueryCounter
+
+LIST_PATHS = ('/api/customers', '/api/contacts', '/api/deals', '/api/tasks', '/api/dashboard')
+
+def seed_records(api, count):
+    """Create count customers, each with a contact, a deal and a task related to each of them."""
+    for index in range(count):
+        customer = api.create('customers', name=f'Customer {index}', company='Acme', email=f'c{index}@example.com')
+        contact = api.create('contacts', name=f'Contact {index}', email=f'p{index}@example.com', customer_id=customer['id'])
+        deal = api.create('deals', title=f'Deal {index}', value=100, stage='negotiation', customer_id=customer['id'])
+        for related_type, related in (('customer', customer), ('contact', contact), ('deal', deal)):
+            api.create('tasks', title=f'Task {index}', due_date='2030-01-01',
+                       related_type=related_type, related_id=related['id'])
+
+def queries_for(api, path):
+    with QueryCounter() as queries:
+        response = api.get(path)
+    assert response.status_code == 200
+    return queries.count
+
+@pytest.mark.parametrize('path', LIST_PATHS)
+def test_query_count_does_not_grow_with_rows(api, path):
+    seed_records(api, 2)
+    few = queries_for(api, path)
+    
+    seed_records(api, 20)
+    many = queries_for(api, path)
+    
+    assert many == few
+
+def test_unchanged_collection_is_answered_from_versions_alone(api):
+    seed_records(api, 3)
+    etag = api.get('/api/tasks').headers['ETag']
+    
+    with QueryCounter() as queries:
+        response = api.get('/api/tasks', headers={'If-None-Match': etag})
+    
+    assert response.status_code == 304
+    assert queries.count == 1
@@ -0,0 +1,60 @@
+import re
+
+import pytest
+
+from app import app, db, QueryCounter
+from test_query_counts import seed_records
+
+BASE_TABLES = ('customer', 'contact', 'deal', 'task')
+
+def executed_plans(api, path):
+    """Run a GET and return [(statement, plan details)] for what it executed, on SQLite."""
+    with QueryCounter() as queries:
+        response = api.get(path)
+    assert response.status_code == 200
+    
+    plans = []
+    with app.app_context(), db.engine.connect() as connection:
+        for statement, parameters in queries.statements:
+            rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)
+            plans.append((statement, [row[3] for row in rows]))
+    return plans
+
+@pytest.fixture
+def seeded(api):
+    seed_records(api, 3)
+    return api
+
+@pytest.mark.parametrize('path, table', [
+    ('/api/customers', 'customer'),
+    ('/api/customers?status=new', 'customer'),
+    ('/api/customers/lookup?prefix=cus', 'customer'),
+    ('/api/contacts', 'contact'),
+    ('/api/deals', 'deal'),
+    ('/api/deals?stage=won', 'deal'),
+    ('/api/tasks', 'task'),
+    ('/api/tasks?status=pending', 'task'),
+    ('/api/sync', 'customer'),
+    ('/api/sync', 'deal'),
+])
+def test_list_queries_search_user_indexes(seeded, path, table):
+    plans = [details for statement, details in executed_plans(seeded, path) if re.search(rf'FROM {table}\b', statement)]
+    assert plans
+    
+    for details in plans:
+        assert any(re.match(rf'SEARCH {table} USING (COVERING )?INDEX ix_{table}_user_', step) for step in details), details
+        assert not any(step.startswith(f'SCAN {table}') for step in details), details
+        assert 'USE TEMP B-TREE FOR ORDER BY' not in details, details
+
+def test_dashboard_scans_no_table(seeded):
+    for statement, details in executed_plans(seeded, '/api/dashboard'):
+        for table in BASE_TABLES:
+            assert f'SCAN {table}' not in details, (statement, details)
+
+def test_search_starts_from_the_full_text_index(seeded):
+    [(statement, details)] = executed_plans(seeded, '/api/search?q=customer')
+    
+    for table in BASE_TABLES:
+        # Each table's rows are looked up by rowid from its FTS matches, never walked by user
+        match = details.index(next(step for step in details if step.startswith(f'SCAN {table}_search VIRTUAL TABLE')))
+        assert details[match + 1] == f'SEARCH {table} USING INTEGER PRIMARY KEY (rowid=?)', details
@@ -0,0 +1,27 @@
+import os
+import subprocess
+import sys
+
+from test_migrations import ROOT_DIR
+
+def import_app(tmp_path, cache_backend):
+    """Import the app in a new process with a replica configured; return the process."""
+    env = {
+        **os.environ,
+        'DATABASE_URL': f'sqlite:///{tmp_path / "primary.db"}',
+        'DATABASE_REPLICA_URLS': f'sqlite:///{tmp_path / "replica.db"}',
+        'CACHE_BACKEND': cache_backend,
+        'CACHE_PATH': str(tmp_path / 'cache.sqlite3'),
+    }
+    code = 'import app; print(type(app.primary_sticky_cache).__name__)'
+    return subprocess.run([sys.executable, '-c', code], cwd=ROOT_DIR, env=env, capture_output=True, text=True, timeout=120)
+
+def test_replicas_require_the_shared_cache(tmp_path):
+    process = import_app(tmp_path, 'memory')
+    assert process.returncode != 0
+    assert 'DATABASE_REPLICA_URLS requires CACHE_BACKEND=sqlite' in process.stderr
+
+def test_replicas_start_with_the_shared_cache(tmp_path):
+    process = import_app(tmp_path, 'sqlite')
+    assert process.returncode == 0, process.stderr
+    assert process.stdout.strip() == 'SQLiteCache'
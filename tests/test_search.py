@@ -0,0 +1,19 @@
+import pytest
+
+@pytest.mark.parametrize('cursor', ['-5', 'abc'])
+def test_invalid_cursor_is_rejected(api, cursor):
+    response = api.get('/api/search', query_string={'q': 'acme', 'cursor': cursor})
+    
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Invalid cursor'
+
+def test_cursor_pages_through_matches(api):
+    for n in range(3):
+        api.create('customers', name=f'Acme {n}', company='Acme', email=f'acme{n}@example.com')
+    
+    first = api.get('/api/search', query_string={'q': 'acme', 'limit': 2})
+    second = api.get('/api/search', query_string={'q': 'acme', 'limit': 2, 'cursor': first.headers['X-Next-Cursor']})
+    
+    labels = [match['label'] for match in first.get_json() + second.get_json()]
+    assert sorted(labels) == ['Acme 0', 'Acme 1', 'Acme 2']
+    assert 'X-Next-Cursor' not in second.headers
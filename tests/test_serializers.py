@@ -0,0 +1,21 @@
+import itertools
+from collections import namedtuple
+
+from app import CUSTOMER_FIELDS, Customer, Serializer
+
+def test_plan_cache_keeps_the_most_recent_orderings():
+    serializer = Serializer(Customer, CUSTOMER_FIELDS)
+    fields = ('id', 'name', 'company', 'email', 'phone', 'status')
+    row = namedtuple('Row', fields)(1, 'Acme', 'Acme SA', 'acme@example.com', '', 'new')
+    
+    for ordering in itertools.permutations(fields):
+        assert serializer.rows([row], ordering) == [tuple(getattr(row, field) for field in ordering)]
+    
+    assert len(serializer._plans._data) == Serializer.PLAN_CACHE_SIZE
+
+def test_fields_come_back_in_the_requested_order(api):
+    api.create('customers', name='Acme', company='Acme SA', email='acme@example.com')
+    
+    [customer] = api.get('/api/customers?fields=email,name').get_json()
+    
+    assert list(customer) == ['email', 'name']
@@ -0,0 +1,33 @@
+import pytest
+
+import app as crm
+
+@pytest.fixture(autouse=True)
+def no_sync_lag(monkeypatch):
+    monkeypatch.setitem(crm.app.config, 'SYNC_LAG_SECONDS', 0)
+
+def test_sync_leaves_out_names_of_other_records(api):
+    customer = api.create('customers', name='Old', company='Acme', email='acme@example.com')
+    api.create('contacts', name='Luis', email='luis@example.com', customer_id=customer['id'])
+    api.create('deals', title='License', value=100, customer_id=customer['id'])
+    api.create('tasks', title='Call', due_date='2026-01-01', related_type='customer', related_id=customer['id'])
+    
+    body = api.get('/api/sync').get_json()
+    
+    assert [contact['customer_id'] for contact in body['contacts']] == [customer['id']]
+    assert [deal['customer_id'] for deal in body['deals']] == [customer['id']]
+    assert [(task['related_type'], task['related_id']) for task in body['tasks']] == [('customer', customer['id'])]
+    for entity in ('customers', 'contacts', 'deals', 'tasks'):
+        for record in body[entity]:
+            assert not set(crm.DERIVED_FIELDS) & set(record), record
+
+def test_sync_after_rename_returns_the_new_name(api):
+    customer = api.create('customers', name='Old', company='Acme', email='acme@example.com')
+    api.create('contacts', name='Luis', email='luis@example.com', customer_id=customer['id'])
+    cursor = api.get('/api/sync').get_json()['cursor']
+    
+    api.put(f'/api/customers/{customer["id"]}', json={'name': 'New'})
+    body = api.get('/api/sync', query_string={'since': cursor}).get_json()
+    
+    assert [record['name'] for record in body['customers']] == ['New']
+    assert body['contacts'] == []
@@ -0,0 +1,59 @@
+"""Background job worker: runs the jobs submitted through /api/jobs.
+
+    python worker.py [--concurrency 2] [--burst]
+
+Run it next to the web process (see procfile.txt). Each thread claims one
+due job at a time from the configured broker, so a worker process never runs
+more than JOB_WORKER_CONCURRENCY jobs at once; start more processes to run
+more. SIGTERM and SIGINT let the running jobs finish before exiting.
+"""
+import argparse
+import os
+import signal
+import socket
+import threading
+
+import app as crm
+
+def work(worker_id, stop, burst):
+    """Claim and run jobs until stop is set, or, with burst, until none is due."""
+    while not stop.is_set():
+        try:
+            with crm.app.app_context():
+                job_id = crm.job_broker.claim(worker_id)
+                if job_id is not None:
+                    crm.run_job(job_id)
+        except Exception:
+            # Usually the database being unreachable; try again after a pause
+            crm.app.logger.exception('Worker %s could not run a job', worker_id)
+            job_id = None
+
+        if job_id is None:
+            if burst:
+                return
+            stop.wait(crm.app.config['JOB_POLL_INTERVAL'])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=crm.app.config['JOB_WORKER_CONCURRENCY'])
+    parser.add_argument('--burst', action='store_true', help='exit once no job is due')
+    args = parser.parse_args()
+
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stop.set())
+
+    name = f'{socket.gethostname()}:{os.getpid()}'
+    threads = [
+        threading.Thread(target=work, args=(f'{name}:{index}', stop, args.burst))
+        for index in range(args.concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        # Joined with a timeout so the main thread keeps handling signals
+        while thread.is_alive():
+            thread.join(1)
+
+if __name__ == '__main__':
+    main()